@@ -0,0 +1,150 @@
+from fastapi import APIRouter
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+import itertools
+import os
+import threading
+import time
+import numpy as np
+
+router = APIRouter()
+
+# Answer cache settings:
+#   ANSWER_CACHE_SIZE       answers kept, least recently used evicted first (0 disables)
+#   ANSWER_CACHE_THRESHOLD  cosine similarity at which a question counts as a repeat
+#   ANSWER_CACHE_TTL        seconds an answer may be served from the cache
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    sources: List[str]
+    filenames: frozenset
+    created_at: float
+    # Seconds the answer took to produce, i.e. what a hit saves
+    cost: float
+
+
+class AnswerCache:
+    """
+    Chat answers keyed by the question's embedding. A lookup returns the
+    answer of the most similar cached question when its cosine similarity
+    reaches the threshold; entries expire after the TTL and are dropped as
+    soon as a document they were answered from is deleted or re-uploaded.
+    """
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE,
+                 threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._vectors = {}
+        self._ids = itertools.count()
+        # Stacked unit vectors for the current entries, rebuilt after changes
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so answers generated from documents
+        # that changed meanwhile are not stored
+        self.version = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, key):
+        del self._entries[key]
+        del self._vectors[key]
+        self._matrix = None
+
+    def lookup(self, vector) -> Optional[CachedAnswer]:
+        """Return the cached answer for the closest question, if close enough."""
+        if self.max_entries <= 0:
+            return None
+        query = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl]:
+                self._drop(key)
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_keys = list(self._entries)
+                    self._matrix = np.stack([self._vectors[key] for key in self._matrix_keys])
+                similarities = self._matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = self._matrix_keys[best]
+                    self._entries.move_to_end(key)
+                    entry = self._entries[key]
+                    self.hits += 1
+                    self.saved_seconds += entry.cost
+                    return entry
+            self.misses += 1
+            return None
+
+    def put(self, vector, answer: str, sources: List[str], filenames: Iterable[str],
+            cost: float, version: int):
+        """
+        Cache an answer. version is the cache version read before retrieval;
+        the answer is discarded if documents were invalidated since then.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            key = next(self._ids)
+            self._entries[key] = CachedAnswer(answer, list(sources), frozenset(filenames), time.time(), cost)
+            self._vectors[key] = self._unit(vector)
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_documents(self, filenames: Iterable[str]):
+        """Drop every answer that used one of these documents as context."""
+        filenames = set(filenames)
+        with self._lock:
+            self.version += 1
+            for key in [key for key, entry in self._entries.items() if entry.filenames & filenames]:
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._vectors.clear()
+            self._matrix = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+        }
+
+
+answer_cache = AnswerCache()
+
+
+@router.get("")
+async def get_answer_cache_stats():
+    return answer_cache.stats()
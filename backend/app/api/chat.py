@@ -1,7 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from google import genai
-from app.api.pdf_upload import db, embed_fn
+from app.api.gemini_client import gemini
+from app.api.vector_store import embed_fn
+from app.api.retrieval import search_many
+from app.api.answer_cache import CachedAnswer, answer_cache
+from app.api.embedding_dispatcher import estimate_tokens
+from app.api.metrics import Gauge, chat_requests_total, chat_stream_ttfb_seconds, timed, tokens_total
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import os
+import threading
+import time
 import logging
 
 # Configure logging
@@ -10,54 +24,416 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Chat pipeline limits. Blocking stages (embedding, Chroma query, Gemini
+# generation) run on a dedicated bounded executor so they never stall the
+# event loop; requests beyond CHAT_MAX_PENDING are rejected instead of queued.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "32"))
+CHAT_MAX_PENDING = int(os.getenv("CHAT_MAX_PENDING", "256"))
+CHAT_RETRIEVAL_TIMEOUT = float(os.getenv("CHAT_RETRIEVAL_TIMEOUT", "15"))
+CHAT_GENERATION_TIMEOUT = float(os.getenv("CHAT_GENERATION_TIMEOUT", "60"))
+# /api/chat/batch: most questions per request and generations in flight per batch
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "100"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
+chat_executor = ThreadPoolExecutor(
+    max_workers=CHAT_MAX_CONCURRENCY,
+    thread_name_prefix="chat"
+)
+
+_pending_lock = threading.Lock()
+_pending_requests = 0
+
+Gauge("rag_chat_requests_in_flight", "Chat requests being processed", lambda: _pending_requests)
+
+# Time to first answer token of recent streamed answers, in milliseconds
+STREAM_TTFB_SAMPLES = 1000
+_stream_ttfb_ms = deque(maxlen=STREAM_TTFB_SAMPLES)
+
+
 class Query(BaseModel):
     query: str
 
+
+class BatchQuery(BaseModel):
+    queries: List[str]
+
+
+@dataclass
+class Retrieval:
+    embedding: list
+    results: Optional[dict] = None
+    cached: Optional[CachedAnswer] = None
+    # Answer cache version the results were retrieved under
+    cache_version: int = 0
+
+
+def retrieve_context(query_text: str) -> Retrieval:
+    """
+    Blocking retrieval stage: embed the query, then either find a cached
+    answer to a near-identical question or search the collection and the
+    keyword index.
+    """
+    return retrieve_contexts([query_text])[0]
+
+
+def retrieve_contexts(query_texts: List[str]) -> List[Retrieval]:
+    """retrieve_context for several questions with one embedding call and one search."""
+    with timed("chat", "embed"):
+        query_embeddings = embed_fn.embed_queries(query_texts)
+
+    retrievals = []
+    uncached = []
+    for i, query_embedding in enumerate(query_embeddings):
+        cached = answer_cache.lookup(query_embedding)
+        retrievals.append(Retrieval(query_embedding, cached=cached))
+        if not cached:
+            uncached.append(i)
+
+    cache_version = answer_cache.version
+    # Get relevant documents
+    results = search_many(
+        [query_embeddings[i] for i in uncached],
+        [query_texts[i] for i in uncached]
+    )
+    for i, result in zip(uncached, results):
+        retrievals[i].results = result
+        retrievals[i].cache_version = cache_version
+    return retrievals
+
+
+def cache_answer(retrieval: Retrieval, answer: str, sources, started: float):
+    """Remember an answer together with the documents it was based on."""
+    filenames = [meta.get("filename", meta["source"]) for meta in retrieval.results["metadatas"][0]]
+    answer_cache.put(
+        retrieval.embedding, answer, sources, filenames,
+        cost=time.perf_counter() - started,
+        version=retrieval.cache_version
+    )
+
+
+def generate_answer(prompt: str) -> str:
+    """Blocking generation stage: call Gemini with the prepared prompt."""
+    with timed("chat", "generate"):
+        response = gemini.get().models.generate_content(
+            model="gemini-2.0-flash",
+            contents=prompt
+        )
+    tokens_total.inc(estimate_tokens(prompt), "prompt")
+    tokens_total.inc(estimate_tokens(response.text or ""), "answer")
+    return response.text
+
+
+def stream_answer(prompt: str, emit, cancelled: threading.Event):
+    """Blocking streaming generation: pass answer text to emit as it arrives."""
+    tokens_total.inc(estimate_tokens(prompt), "prompt")
+    with timed("chat", "generate"):
+        for chunk in gemini.get().models.generate_content_stream(
+            model="gemini-2.0-flash",
+            contents=prompt
+        ):
+            if cancelled.is_set():
+                # The client went away; stop reading so the stream is closed
+                break
+            if chunk.text:
+                tokens_total.inc(estimate_tokens(chunk.text), "answer")
+                emit(chunk.text)
+
+
+def build_prompt(question: str, results) -> str:
+    # Prepare context from retrieved documents
+    context = "\n\n".join(results["documents"][0])
+    return f"""Answer the following question based on the provided context. If the context doesn't contain relevant information, say so.
+
+Context: {context}
+
+Question: {question}"""
+
+
+def acquire_slot():
+    """Count a chat request as pending, or reject it when too many are."""
+    global _pending_requests
+    with _pending_lock:
+        if _pending_requests >= CHAT_MAX_PENDING:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many chat requests in progress. Please try again."
+            )
+        _pending_requests += 1
+
+
+def release_slot():
+    global _pending_requests
+    with _pending_lock:
+        _pending_requests -= 1
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    A streaming response that holds a pending-request slot until it has
+    been sent or abandoned. The slot is released here rather than in the
+    body generator, which never runs if the client leaves before the first
+    chunk is requested.
+    """
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            release_slot()
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def run_stage(stage: str, timeout: float, func, *args):
+    """Run a blocking pipeline stage on the chat executor with a timeout."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(chat_executor, func, *args),
+            timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Chat {stage} stage timed out after {timeout}s")
+        raise HTTPException(
+            status_code=504,
+            detail=f"Timed out during {stage}"
+        )
+
+
 @router.post("")
 async def chat(query: Query):
     if not query.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
-    
+
+    started = time.perf_counter()
+    acquire_slot()
     try:
-        # Switch embedding function to query mode
-        embed_fn.document_mode = False
-        
-        # Get relevant documents
-        results = db.query(
-            query_texts=[query.query],
-            n_results=3,
-            include=["documents", "metadatas"]
+        # Get relevant documents, or a cached answer to the same question
+        retrieval = await run_stage(
+            "retrieval", CHAT_RETRIEVAL_TIMEOUT, retrieve_context, query.query
         )
-        
-        # Switch back to document mode
-        embed_fn.document_mode = True
-        
+        if retrieval.cached:
+            chat_requests_total.inc(1, "chat", "cached")
+            return {
+                "answer": retrieval.cached.answer,
+                "sources": retrieval.cached.sources
+            }
+
+        results = retrieval.results
         if not results["documents"][0]:
+            chat_requests_total.inc(1, "chat", "no_context")
             return {"answer": "No relevant information found in the documents."}
-        
-        # Prepare context from retrieved documents
-        context = "\n\n".join(results["documents"][0])
-        sources = [meta["source"] for meta in results["metadatas"][0]]
-        
-        # Prepare prompt
-        prompt = f"""Answer the following question based on the provided context. If the context doesn't contain relevant information, say so.
 
-Context: {context}
+        sources = [meta["source"] for meta in results["metadatas"][0]]
+        prompt = build_prompt(query.query, results)
 
-Question: {query.query}"""
-        
         # Generate response using Gemini
-        client = genai.Client()
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
+        answer = await run_stage(
+            "generation", CHAT_GENERATION_TIMEOUT, generate_answer, prompt
         )
-        
+        cache_answer(retrieval, answer, sources, started)
+        chat_requests_total.inc(1, "chat", "answered")
+
         return {
-            "answer": response.text,
+            "answer": answer,
             "sources": sources
         }
-    
+
+    except HTTPException:
+        chat_requests_total.inc(1, "chat", "error")
+        raise
     except Exception as e:
+        chat_requests_total.inc(1, "chat", "error")
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        release_slot()
+
+
+@router.post("/batch")
+async def chat_batch(batch: BatchQuery):
+    """
+    Answer several questions in one request. All questions are embedded in
+    one call and searched in one multi-query search; answers are then
+    generated with at most CHAT_BATCH_CONCURRENCY in flight. Results come
+    back in request order, each with either an answer or its own error.
+    """
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="At least one query is required")
+    if len(batch.queries) > CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {CHAT_BATCH_MAX_QUESTIONS} queries are allowed per batch"
+        )
+
+    started = time.perf_counter()
+    acquire_slot()
+    try:
+        # Repeated questions are answered once
+        questions = list(dict.fromkeys(q for q in batch.queries if q.strip()))
+        retrievals = {}
+        if questions:
+            retrievals = dict(zip(questions, await run_stage(
+                "retrieval", CHAT_RETRIEVAL_TIMEOUT, retrieve_contexts, questions
+            )))
+
+        semaphore = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+
+        async def answer(question: str) -> dict:
+            retrieval = retrievals[question]
+            if retrieval.cached:
+                chat_requests_total.inc(1, "batch", "cached")
+                return {"answer": retrieval.cached.answer, "sources": retrieval.cached.sources}
+            results = retrieval.results
+            if not results["documents"][0]:
+                chat_requests_total.inc(1, "batch", "no_context")
+                return {"answer": "No relevant information found in the documents."}
+
+            sources = [meta["source"] for meta in results["metadatas"][0]]
+            try:
+                async with semaphore:
+                    text = await run_stage(
+                        "generation", CHAT_GENERATION_TIMEOUT, generate_answer,
+                        build_prompt(question, results)
+                    )
+            except HTTPException as e:
+                chat_requests_total.inc(1, "batch", "error")
+                return {"error": e.detail, "status": e.status_code}
+            except Exception as e:
+                chat_requests_total.inc(1, "batch", "error")
+                logger.error(f"Error in chat batch: {str(e)}", exc_info=True)
+                return {"error": str(e), "status": 500}
+            cache_answer(retrieval, text, sources, started)
+            chat_requests_total.inc(1, "batch", "answered")
+            return {"answer": text, "sources": sources}
+
+        answers = dict(zip(questions, await asyncio.gather(*[answer(q) for q in questions])))
+        return {
+            "results": [
+                {"query": q, **answers[q]} if q in answers
+                else {"query": q, "error": "Query cannot be empty", "status": 400}
+                for q in batch.queries
+            ]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat batch endpoint: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        release_slot()
+
+
+async def answer_events(request: Request, question: str, started: float):
+    """
+    Server-sent events for one question: a `sources` event once retrieval
+    finishes, `token` events as Gemini generates the answer, then `done`
+    (or `error`). Generation runs on the chat executor and stops as soon as
+    the client disconnects.
+    """
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    outcome = "error"
+    try:
+        try:
+            retrieval = await run_stage(
+                "retrieval", CHAT_RETRIEVAL_TIMEOUT, retrieve_context, question
+            )
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail, "status": e.status_code})
+            return
+
+        if retrieval.cached:
+            # A repeated question is answered in one go from the cache
+            yield sse_event("sources", {"sources": retrieval.cached.sources})
+            yield sse_event("token", {"text": retrieval.cached.answer})
+            outcome = "cached"
+            yield sse_event("done", {"ttfb_ms": (time.perf_counter() - started) * 1000, "cached": True})
+            return
+
+        results = retrieval.results
+        if not results["documents"][0]:
+            yield sse_event("sources", {"sources": []})
+            yield sse_event("token", {"text": "No relevant information found in the documents."})
+            outcome = "no_context"
+            yield sse_event("done", {"ttfb_ms": None})
+            return
+
+        sources = [meta["source"] for meta in results["metadatas"][0]]
+        yield sse_event("sources", {"sources": sources})
+
+        answer = []
+        tokens = asyncio.Queue()
+        generation = loop.run_in_executor(
+            chat_executor,
+            stream_answer,
+            build_prompt(question, results),
+            lambda text: loop.call_soon_threadsafe(tokens.put_nowait, text),
+            cancelled
+        )
+        generation.add_done_callback(lambda _: loop.call_soon_threadsafe(tokens.put_nowait, None))
+
+        deadline = loop.time() + CHAT_GENERATION_TIMEOUT
+        ttfb_ms = None
+        while True:
+            try:
+                text = await asyncio.wait_for(tokens.get(), timeout=max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                logger.error(f"Chat generation stage timed out after {CHAT_GENERATION_TIMEOUT}s")
+                yield sse_event("error", {"detail": "Timed out during generation", "status": 504})
+                return
+            if text is None:
+                break
+            if await request.is_disconnected():
+                logger.info("Chat client disconnected, cancelling generation")
+                outcome = "disconnected"
+                return
+            if ttfb_ms is None:
+                ttfb_ms = (time.perf_counter() - started) * 1000
+                _stream_ttfb_ms.append(ttfb_ms)
+                chat_stream_ttfb_seconds.observe(ttfb_ms / 1000)
+                logger.info(f"Chat stream time to first token: {ttfb_ms:.0f}ms")
+            answer.append(text)
+            yield sse_event("token", {"text": text})
+
+        error = generation.exception()
+        if error:
+            logger.error(f"Error in chat stream: {str(error)}", exc_info=error)
+            yield sse_event("error", {"detail": str(error), "status": 500})
+            return
+        cache_answer(retrieval, "".join(answer), sources, started)
+        outcome = "answered"
+        yield sse_event("done", {"ttfb_ms": ttfb_ms})
+    finally:
+        cancelled.set()
+        chat_requests_total.inc(1, "stream", outcome)
+
+
+@router.post("/stream")
+async def chat_stream(query: Query, request: Request):
+    """Streaming variant of POST /api/chat using server-sent events."""
+    started = time.perf_counter()
+    if not query.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    acquire_slot()
+    return SlotStreamingResponse(
+        answer_events(request, query.query, started),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stream/stats")
+async def chat_stream_stats():
+    """Time-to-first-token percentiles over recent streamed answers."""
+    samples = sorted(_stream_ttfb_ms)
+    if not samples:
+        return {"count": 0, "ttfb_ms_p50": None, "ttfb_ms_p95": None}
+    return {
+        "count": len(samples),
+        "ttfb_ms_p50": samples[len(samples) // 2],
+        "ttfb_ms_p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+import os
+import re
+import numpy as np
+
+# Chunking settings:
+#   CHUNK_STRATEGY        'words'     500-word windows per page (original behaviour)
+#                         'tokens'    token-budgeted windows that span pages
+#                         'sentences' sentence and heading aware chunks that span pages
+#   CHUNK_MAX_TOKENS      token budget per chunk for 'tokens' and 'sentences'
+#   CHUNK_OVERLAP_TOKENS  tokens repeated at the start of the next chunk
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "words").lower()
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+
+STRATEGIES = ("words", "tokens", "sentences")
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+HEADING = re.compile(r"^(#{1,6}\s+\S.*|\d+(\.\d+)*\.?\s+[A-Z].*|[A-Z0-9][A-Z0-9 ,:&'-]+)$")
+HEADING_MAX_WORDS = 10
+
+
+@dataclass
+class Chunk:
+    text: str
+    page_start: int
+    page_end: int
+    token_count: Optional[int] = None
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens; counted on first use when the chunker did not already know them."""
+        if self.token_count is None:
+            self.token_count = int(token_costs(self.text.split()).sum())
+        return self.token_count
+
+
+def token_costs(words: List[str]) -> np.ndarray:
+    """Estimated embedding tokens per word (about four characters per token)."""
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    return np.maximum(1, (lengths + 3) // 4)
+
+
+def word_windows(count: int, max_length: int = 500, overlap: int = 50) -> List[Tuple[int, int]]:
+    """(start, end) word ranges of overlapping windows over `count` words."""
+    if overlap >= max_length:
+        raise ValueError("overlap must be smaller than max_length")
+    return [(start, min(start + max_length, count)) for start in range(0, count, max_length - overlap)]
+
+
+def chunk_text(text, max_length=500, overlap=50):
+    """Splits text into chunks with optional overlap."""
+    words = text.split()
+    return [' '.join(words[start:end]) for start, end in word_windows(len(words), max_length, overlap)]
+
+
+def is_heading(line: str) -> bool:
+    return len(line.split()) <= HEADING_MAX_WORDS and not line.endswith((".", ",", ";")) and bool(HEADING.match(line))
+
+
+def sentence_units(text: str) -> Iterator[Tuple[str, bool]]:
+    """Split page text into (unit, is_heading) pairs of sentences and headings."""
+    paragraph = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if is_heading(line):
+            if paragraph:
+                yield from ((s, False) for s in SENTENCE_BREAK.split(' '.join(paragraph)))
+                paragraph = []
+            yield line, True
+        else:
+            paragraph.append(line)
+    if paragraph:
+        yield from ((s, False) for s in SENTENCE_BREAK.split(' '.join(paragraph)))
+
+
+class UnitPacker:
+    """
+    Packs a stream of text units (words or sentences) into chunks of at most
+    max_tokens, repeating up to overlap_tokens of trailing units in the next
+    chunk and starting a new chunk at every heading. Window boundaries are
+    found with cumulative sums and binary search rather than per unit.
+    """
+    def __init__(self, max_tokens: int, overlap_tokens: int):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.units: List[str] = []
+        self.costs: List[int] = []
+        self.pages: List[int] = []
+        self.headings: List[int] = []
+
+    def add(self, units: List[str], costs, page: int, headings: Iterable[int] = ()):
+        offset = len(self.units)
+        self.units.extend(units)
+        self.costs.extend(costs)
+        self.pages.extend([page] * len(units))
+        self.headings.extend(offset + i for i in headings)
+
+    def drain(self, final: bool = False) -> Iterator[Chunk]:
+        """Emit every complete chunk; with final=True also emit the remainder."""
+        if not self.units:
+            return
+        cumulative = np.cumsum(self.costs)
+        headings = np.asarray(self.headings, dtype=np.int64)
+        count = len(self.units)
+        start = 0
+        while start < count:
+            base = cumulative[start - 1] if start else 0
+            end = max(start + 1, int(np.searchsorted(cumulative, base + self.max_tokens, side="right")))
+            # Never run past the next heading
+            after = headings[headings > start]
+            if len(after) and after[0] < end:
+                end = int(after[0])
+            if end >= count and not final:
+                break
+            yield Chunk(
+                text=' '.join(self.units[start:end]),
+                page_start=self.pages[start],
+                page_end=self.pages[end - 1],
+                token_count=int(cumulative[end - 1] - base),
+            )
+            if end >= count:
+                start = count
+                break
+            if len(after) and after[0] == end:
+                # A new section starts here; do not carry the old one over
+                start = end
+            else:
+                overlap_from = int(np.searchsorted(cumulative, cumulative[end - 1] - self.overlap_tokens, side="left")) + 1
+                start = max(start + 1, min(overlap_from, end))
+
+        del self.units[:start]
+        del self.costs[:start]
+        del self.pages[:start]
+        self.headings = [h - start for h in self.headings if h >= start]
+
+
+def iter_chunks(pages: Iterable[Tuple[int, str]], strategy: str = CHUNK_STRATEGY,
+                max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[Chunk]:
+    """
+    Turn a stream of (page_number, text) pairs into chunks as pages arrive.
+
+    'words' reproduces chunk_text page by page. 'tokens' and 'sentences'
+    fill chunks up to a token budget and may span pages; page_start and
+    page_end record which pages a chunk covers.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown CHUNK_STRATEGY setting: {strategy}")
+
+    if strategy == "words":
+        # Ingestion does not need token counts here, so they are left to Chunk.tokens
+        for page, text in pages:
+            for chunk in chunk_text(text):
+                yield Chunk(chunk, page, page)
+        return
+
+    packer = UnitPacker(max_tokens, overlap_tokens)
+    for page, text in pages:
+        if strategy == "tokens":
+            words = text.split()
+            packer.add(words, token_costs(words).tolist(), page)
+        else:
+            units, costs, headings = [], [], []
+            for unit, heading in sentence_units(text):
+                words = unit.split()
+                unit_costs = token_costs(words)
+                if unit_costs.sum() > max_tokens:
+                    # Sentences longer than the budget fall back to words
+                    units.extend(words)
+                    costs.extend(unit_costs.tolist())
+                    continue
+                if heading:
+                    headings.append(len(units))
+                units.append(unit)
+                costs.append(int(unit_costs.sum()))
+            packer.add(units, costs, page, headings)
+        yield from packer.drain()
+    yield from packer.drain(final=True)
@@ -0,0 +1,475 @@
+from typing import Dict, Iterable, List, Optional, Set
+import fcntl
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from .vector_store import VECTOR_STORE, CHROMA_PERSIST_DIR, DATA_DIR, chroma_client, db
+from .keyword_index import keyword_index
+from .metrics import chunks_total
+
+logger = logging.getLogger(__name__)
+
+# The document index maps documents to their chunk ids so deletes touch only
+# that document's chunks instead of scanning the collection. It lives next to
+# a persistent vector store, in DATA_DIR for a remote one (so startup does not
+# rebuild it from the whole collection), or in memory alongside an in-memory one.
+def default_index_path(vector_store: str = VECTOR_STORE) -> str:
+    if vector_store == "persistent":
+        return os.path.join(CHROMA_PERSIST_DIR, "documents.sqlite3")
+    if vector_store == "memory":
+        return ":memory:"
+    return os.path.join(DATA_DIR, "documents.sqlite3")
+
+
+DOCUMENT_INDEX_PATH = os.getenv("DOCUMENT_INDEX_PATH", default_index_path())
+
+# Server workers hold this lock shared while they run; offline writers such
+# as the bulk indexer hold it exclusively, so the two never write the stores
+# at the same time. Only processes on the same host are covered.
+STORE_LOCK_PATH = None if DOCUMENT_INDEX_PATH == ":memory:" else f"{DOCUMENT_INDEX_PATH}.lock"
+
+# Legacy chunks only carry a "name (Page N, Chunk M)" source string
+SOURCE_PATTERN = re.compile(r"^(?P<filename>.*) \(Page (?P<page>\d+), Chunk (?P<chunk>\d+)\)$")
+
+
+def document_id(filename: str) -> str:
+    """Stable identifier for a document, derived from its filename."""
+    return uuid.uuid5(uuid.NAMESPACE_URL, filename).hex
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's or page's text, used to find content an earlier version already has."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_metadata(filename: str, page: int, chunk: int, job_id: Optional[str] = None,
+                   page_end: Optional[int] = None, text_hash: Optional[str] = None) -> Dict:
+    """Structured metadata stored with every chunk; page_end is the last page it covers."""
+    metadata = {
+        "source": f"{filename} (Page {page}, Chunk {chunk})",
+        "doc_id": document_id(filename),
+        "filename": filename,
+        "page": page,
+        "page_end": page_end or page,
+        "chunk": chunk,
+    }
+    if job_id:
+        metadata["job_id"] = job_id
+    if text_hash:
+        metadata["content_hash"] = text_hash
+    return metadata
+
+
+DOCUMENT_COLUMNS = (
+    "filename", "doc_id", "fingerprint", "page_hashes", "job_id", "chunk_count",
+    "updated_at", "status", "pages", "bytes", "created_at",
+)
+# Catalog orderings; each ends in filename so keys are unique for pagination
+DOCUMENT_ORDERS = {
+    "name": "filename",
+    "recent": "updated_at DESC, filename DESC",
+}
+
+
+class VersionConflict(Exception):
+    """Raised when the chunks a new version reuses stopped being live before it was committed."""
+
+
+class DocumentDeleted(VersionConflict):
+    """Raised when a document was deleted while a new version of it was being ingested."""
+
+
+class StoreInUse(Exception):
+    """Raised when another process holds the store lock in a conflicting mode."""
+
+
+def lock_store(exclusive: bool, path: Optional[str] = STORE_LOCK_PATH):
+    """
+    Take the store lock for as long as the returned file stays open: shared
+    for a server worker, exclusive for an offline writer. Raises StoreInUse
+    if it is held the other way. An in-memory index needs no lock (None).
+    """
+    if path is None:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        if exclusive:
+            raise StoreInUse(f"The store is in use by a running server ({path}); stop it first")
+        raise StoreInUse(f"The store is being written by an offline indexer ({path}); wait for it to finish")
+    return lock_file
+
+
+class DocumentIndex:
+    """
+    SQLite table of (chunk id, document, job) rows indexed by document and
+    job, plus one row per document describing its live version.
+
+    Chunks written by an ingest are staged (live = 0) until commit_version()
+    swaps the new version in, in one transaction that also retires the
+    chunks it replaced; retrieval skips chunks that are not live, so queries
+    see either the old version or the new one, never a mix.
+    """
+    def __init__(self, path: str = DOCUMENT_INDEX_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY, doc_id TEXT NOT NULL, filename TEXT NOT NULL, job_id TEXT,"
+            " live INTEGER NOT NULL DEFAULT 1, content_hash TEXT)"
+        )
+        # Indexes created before versions were tracked
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(chunks)")}
+        for column, definition in (("live", "INTEGER NOT NULL DEFAULT 1"), ("content_hash", "TEXT")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE chunks ADD COLUMN {column} {definition}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_filename ON chunks (filename)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_job ON chunks (job_id)")
+        # The catalog: one row per document, kept up to date by ingest and delete
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " filename TEXT PRIMARY KEY, doc_id TEXT NOT NULL, fingerprint TEXT, page_hashes TEXT,"
+            " job_id TEXT, chunk_count INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'ready', pages INTEGER, bytes INTEGER, created_at REAL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(documents)")}
+        for column, definition in (
+            ("status", "TEXT NOT NULL DEFAULT 'ready'"), ("pages", "INTEGER"),
+            ("bytes", "INTEGER"), ("created_at", "REAL"),
+        ):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE documents ADD COLUMN {column} {definition}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_updated ON documents (updated_at, filename)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_status ON documents (status, filename)")
+        # Chunks of the collection whose metadata names no document, so a
+        # rebuild that left them out still counts as complete
+        self._db.execute("CREATE TABLE IF NOT EXISTS skipped_chunks (chunk_id TEXT PRIMARY KEY)")
+        self._db.commit()
+
+    def add_chunks(self, ids: List[str], metadatas: List[Dict], live: bool = True):
+        """Record chunks; with live=False they stay hidden until their job's version is committed."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, doc_id, filename, job_id, live, content_hash)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (chunk_id, meta["doc_id"], meta["filename"], meta.get("job_id"), int(live),
+                     meta.get("content_hash"))
+                    for chunk_id, meta in zip(ids, metadatas)
+                ]
+            )
+            self._db.commit()
+
+    def live_chunk_hashes(self, filename: str) -> Dict[str, List[str]]:
+        """Content hash -> ids of the live chunks of a document that have one."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT content_hash, chunk_id FROM chunks"
+                " WHERE filename = ? AND live = 1 AND content_hash IS NOT NULL",
+                (filename,)
+            ).fetchall()
+        hashes: Dict[str, List[str]] = {}
+        for text_hash, chunk_id in rows:
+            hashes.setdefault(text_hash, []).append(chunk_id)
+        return hashes
+
+    def hidden_chunk_ids(self, ids: Iterable[str]) -> Set[str]:
+        """The ids among ids that are staged or retired rather than live."""
+        ids = list(ids)
+        hidden = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT chunk_id FROM chunks WHERE live = 0 AND chunk_id IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                hidden.update(row[0] for row in rows)
+        return hidden
+
+    def document(self, filename: str) -> Optional[Dict]:
+        """A document's catalog entry, with the fingerprint and page hashes of its live version."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents WHERE filename = ?", (filename,)
+            ).fetchone()
+        if row is None:
+            return None
+        document = dict(zip(DOCUMENT_COLUMNS, row))
+        document["page_hashes"] = json.loads(document["page_hashes"] or "[]")
+        return document
+
+    def begin_version(self, filename: str, job_id: str):
+        """List a document as processing (or updating, if it has a live version) while a job ingests it."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO documents (filename, doc_id, job_id, status, updated_at, created_at)"
+                " VALUES (?, ?, ?, 'processing', ?, ?)"
+                " ON CONFLICT (filename) DO UPDATE SET"
+                " status = CASE WHEN chunk_count > 0 THEN 'updating' ELSE 'processing' END",
+                (filename, document_id(filename), job_id, now, now)
+            )
+            self._db.commit()
+
+    def settle_version(self, filename: str):
+        """
+        Once a job stops without committing a new version, list the document
+        as ready if it has a live version and as failed otherwise.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE documents SET status = CASE WHEN chunk_count > 0 THEN 'ready' ELSE 'error' END"
+                " WHERE filename = ?",
+                (filename,)
+            )
+            self._db.commit()
+
+    def list_documents(self, limit: int = 50, after: Optional[tuple] = None, order: str = "name",
+                       status: Optional[str] = None, prefix: Optional[str] = None) -> List[Dict]:
+        """
+        One page of the catalog, using keyset pagination: after is the sort
+        key of the last document on the previous page, so every page is an
+        index range scan however deep it is. order is 'name' (by filename)
+        or 'recent' (most recently ingested first).
+        """
+        if order not in DOCUMENT_ORDERS:
+            raise ValueError(f"Unknown document order: {order}")
+        conditions, parameters = [], []
+        if status:
+            conditions.append("status = ?")
+            parameters.append(status)
+        if prefix:
+            # A range on the primary key rather than LIKE, so the index is used
+            conditions.append("filename >= ? AND filename < ?")
+            parameters.extend([prefix, prefix + "\U0010ffff"])
+        if after is not None:
+            if order == "name":
+                conditions.append("filename > ?")
+                parameters.append(after[0])
+            else:
+                conditions.append("(updated_at, filename) < (?, ?)")
+                parameters.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents {where}"
+                f" ORDER BY {DOCUMENT_ORDERS[order]} LIMIT ?",
+                (*parameters, limit)
+            ).fetchall()
+        return [dict(zip(DOCUMENT_COLUMNS, row)) for row in rows]
+
+    def document_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def catalog(self) -> List[Dict]:
+        """Every catalog entry as stored, page hashes still JSON-encoded."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents ORDER BY filename"
+            ).fetchall()
+        return [dict(zip(DOCUMENT_COLUMNS, row)) for row in rows]
+
+    def restore_catalog(self, documents: List[Dict]):
+        """Write catalog entries as returned by catalog(), replacing those of the same documents."""
+        with self._lock:
+            try:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO documents ({', '.join(DOCUMENT_COLUMNS)})"
+                    f" VALUES ({', '.join('?' * len(DOCUMENT_COLUMNS))})",
+                    [tuple(document[column] for column in DOCUMENT_COLUMNS) for document in documents]
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+
+    def backfill_catalog(self) -> int:
+        """List documents that have live chunks but no catalog entry; returns how many were added."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO documents (filename, doc_id, chunk_count, updated_at, created_at)"
+                " SELECT filename, MIN(doc_id), COUNT(*), ?, ? FROM chunks WHERE live = 1 GROUP BY filename",
+                (now, now)
+            )
+            self._db.commit()
+        return cursor.rowcount
+
+    def commit_version(self, filename: str, job_id: str, reused_ids: List[str],
+                       fingerprint: Optional[str], page_hashes: List[str],
+                       size: Optional[int] = None) -> List[str]:
+        """
+        Make a job's staged chunks, together with the earlier chunks it
+        reused, the live version of a document in one transaction. The
+        chunks they replace are retired and their ids returned so they can
+        be deleted from the stores.
+        """
+        reused = set(reused_ids)
+        with self._lock:
+            try:
+                # begin_version listed the document; it is gone if deleted since
+                listed = self._db.execute("SELECT 1 FROM documents WHERE filename = ?", (filename,)).fetchone()
+                if listed is None:
+                    raise DocumentDeleted(f"'{filename}' was deleted while it was being ingested")
+                rows = self._db.execute(
+                    "SELECT chunk_id, live FROM chunks WHERE filename = ?"
+                    " AND ((live = 1 AND (job_id IS NULL OR job_id != ?)) OR (live = 0 AND job_id IS NULL))",
+                    (filename, job_id)
+                ).fetchall()
+                stale = [row[0] for row in rows if row[0] not in reused]
+                still_live = {row[0] for row in rows if row[1]}
+                if not reused <= still_live:
+                    # Another upload of the same file was swapped in meanwhile
+                    raise VersionConflict(f"'{filename}' was replaced while it was being ingested")
+                self._db.executemany(
+                    "UPDATE chunks SET live = 0, job_id = NULL WHERE chunk_id = ?", [(chunk_id,) for chunk_id in stale]
+                )
+                self._db.executemany(
+                    "UPDATE chunks SET job_id = ? WHERE chunk_id = ?", [(job_id, chunk_id) for chunk_id in reused]
+                )
+                self._db.execute("UPDATE chunks SET live = 1 WHERE job_id = ?", (job_id,))
+                chunk_count = self._db.execute(
+                    "SELECT COUNT(*) FROM chunks WHERE filename = ? AND live = 1", (filename,)
+                ).fetchone()[0]
+                now = time.time()
+                self._db.execute(
+                    "INSERT INTO documents (filename, doc_id, fingerprint, page_hashes, job_id, chunk_count,"
+                    " updated_at, status, pages, bytes, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, 'ready', ?, ?, ?)"
+                    " ON CONFLICT (filename) DO UPDATE SET fingerprint = excluded.fingerprint,"
+                    " page_hashes = excluded.page_hashes, job_id = excluded.job_id,"
+                    " chunk_count = excluded.chunk_count, updated_at = excluded.updated_at,"
+                    " status = 'ready', pages = excluded.pages, bytes = excluded.bytes",
+                    (filename, document_id(filename), fingerprint, json.dumps(page_hashes),
+                     job_id, chunk_count, now, len(page_hashes), size, now)
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+        return stale
+
+    def remove_document(self, filename: str):
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            self._db.commit()
+
+    def chunk_ids(self, filename: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT chunk_id FROM chunks WHERE filename = ?", (filename,)).fetchall()
+        return [row[0] for row in rows]
+
+    def job_chunk_ids(self, job_id: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT chunk_id FROM chunks WHERE job_id = ?", (job_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def remove_chunks(self, ids: List[str]):
+        rows = [(chunk_id,) for chunk_id in ids]
+        with self._lock:
+            self._db.executemany("DELETE FROM chunks WHERE chunk_id = ?", rows)
+            self._db.executemany("DELETE FROM skipped_chunks WHERE chunk_id = ?", rows)
+            self._db.commit()
+
+    def skip_chunks(self, ids: List[str]):
+        """Record chunks of the collection that belong to no document."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO skipped_chunks (chunk_id) VALUES (?)", [(chunk_id,) for chunk_id in ids]
+            )
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def skipped_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM skipped_chunks").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM chunks")
+            self._db.execute("DELETE FROM documents")
+            self._db.execute("DELETE FROM skipped_chunks")
+            self._db.commit()
+
+
+document_index = DocumentIndex()
+
+
+def delete_chunks(ids: List[str]):
+    """Delete chunks from the collection, the document index and the keyword index."""
+    for start in range(0, len(ids), chroma_client.max_batch_size):
+        db.delete(ids=ids[start:start + chroma_client.max_batch_size])
+    document_index.remove_chunks(ids)
+    keyword_index.remove_chunks(ids)
+    chunks_total.inc(len(ids), "deleted")
+
+
+def rebuild_document_index(page_size: int = 5000):
+    """
+    Rebuild the document index from the collection when the two disagree,
+    upgrading legacy chunks that only have a "source" string to structured
+    metadata on the way. This is a one-off full pass over the metadata.
+    Catalog entries are recreated from the chunks, without page counts or
+    sizes, which the next upload of each document fills in. Chunks with
+    no recognisable document are recorded as skipped, so they do not set
+    off another rebuild at the next start.
+    """
+    total = db.count()
+    if total == document_index.count() + document_index.skipped_count():
+        # Indexes written before the catalog existed only need it filled in
+        if total and not document_index.document_count():
+            logger.info(f"Listed {document_index.backfill_catalog()} documents in the catalog")
+        return
+
+    logger.info(f"Rebuilding document index from {total} chunks")
+    document_index.clear()
+    migrated = skipped = 0
+    for offset in range(0, total, page_size):
+        results = db.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids, metadatas = [], []
+        legacy_ids, legacy_metadatas = [], []
+        skipped_ids = []
+        for chunk_id, metadata in zip(results["ids"], results["metadatas"]):
+            metadata = metadata or {}
+            if "filename" not in metadata:
+                match = SOURCE_PATTERN.match(metadata.get("source", ""))
+                if not match:
+                    logger.warning(f"Chunk {chunk_id} has no recognisable source, skipping")
+                    skipped_ids.append(chunk_id)
+                    continue
+                metadata = {
+                    **metadata,
+                    **chunk_metadata(match["filename"], int(match["page"]), int(match["chunk"]))
+                }
+                legacy_ids.append(chunk_id)
+                legacy_metadatas.append(metadata)
+            ids.append(chunk_id)
+            metadatas.append(metadata)
+
+        if legacy_ids:
+            db.update(ids=legacy_ids, metadatas=legacy_metadatas)
+            migrated += len(legacy_ids)
+        document_index.add_chunks(ids, metadatas)
+        document_index.skip_chunks(skipped_ids)
+        skipped += len(skipped_ids)
+
+    document_index.backfill_catalog()
+    logger.info(f"Document index rebuilt, {migrated} legacy chunks migrated, {skipped} skipped")
@@ -1,38 +1,96 @@
-from fastapi import APIRouter, HTTPException
-from app.api.pdf_upload import db
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional
+from app.api.answer_cache import answer_cache
+from app.api.document_index import DOCUMENT_ORDERS, delete_chunks, document_index
+from app.api.jobs import job_store
+import base64
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(order: str, document: Dict) -> str:
+    key = [document["filename"]] if order == "name" else [document["updated_at"], document["filename"]]
+    return base64.urlsafe_b64encode(json.dumps([order, key]).encode()).decode()
+
+
+def decode_cursor(order: str, cursor: str) -> tuple:
+    try:
+        cursor_order, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_order != order:
+        raise HTTPException(status_code=400, detail="Cursor belongs to a different order")
+    return tuple(key)
+
+
+def catalog_entry(document: Dict) -> Dict:
+    return {
+        "filename": document["filename"],
+        "doc_id": document["doc_id"],
+        "status": document["status"],
+        "pages": document["pages"],
+        "chunks": document["chunk_count"],
+        "bytes": document["bytes"],
+        "created_at": document["created_at"],
+        "updated_at": document["updated_at"],
+    }
+
+
+# List the document catalog a page at a time. Pass the returned next_cursor
+# to get the following page; it is null on the last one.
+@router.get("")
+async def list_documents(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: str = Query("name", enum=list(DOCUMENT_ORDERS)),
+    status: Optional[str] = None,
+    prefix: Optional[str] = None,
+):
+    after = decode_cursor(order, cursor) if cursor else None
+    documents = await run_in_threadpool(
+        document_index.list_documents, limit + 1, after, order, status, prefix
+    )
+    next_cursor = encode_cursor(order, documents[limit - 1]) if len(documents) > limit else None
+    return {
+        "documents": [catalog_entry(document) for document in documents[:limit]],
+        "next_cursor": next_cursor,
+    }
+
+
+def cancel_ingests(filename: str) -> int:
+    """Cancel the jobs still ingesting a document; returns how many."""
+    jobs = [job for job in job_store.active_jobs() if job["filename"] == filename]
+    return sum(job_store.cancel(job["id"]) for job in jobs)
+
 
 @router.delete("/{document_name}")
 async def delete_document(document_name: str):
     try:
-        # Get all documents
-        results = db.get()
-        
-        if not results or len(results["ids"]) == 0:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Document '{document_name}' not found"
-            )
-        
-        # Find all chunks that belong to this document
-        chunk_ids = []
-        for idx, metadata in enumerate(results["metadatas"]):
-            source = metadata.get("source", "")
-            if source.startswith(document_name + " (Page"):
-                chunk_ids.append(results["ids"][idx])
+        # Stop uploads of this document first, so they write no more chunks
+        # and do not list it again once they finish
+        cancelled = await run_in_threadpool(cancel_ingests, document_name)
+
+        # Look up this document's chunks in the document index
+        chunk_ids = await run_in_threadpool(document_index.chunk_ids, document_name)
         
-        if not chunk_ids:
+        # Uploads that failed are listed in the catalog without any chunks
+        if not cancelled and not chunk_ids and document_index.document(document_name) is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"Document '{document_name}' not found"
             )
         
         # Delete all chunks associated with this document
-        db.delete(
-            ids=chunk_ids
-        )
+        await run_in_threadpool(delete_chunks, chunk_ids)
+        document_index.remove_document(document_name)
+        answer_cache.invalidate_documents([document_name])
         
         return {"message": f"Document '{document_name}' successfully deleted"}
         
@@ -0,0 +1,142 @@
+from fastapi import APIRouter
+from collections import OrderedDict
+from typing import List, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+router = APIRouter()
+
+# Cache settings. EMBEDDING_CACHE_SIZE is the number of vectors kept in the
+# in-process LRU tier (0 disables it); EMBEDDING_CACHE_PATH enables an
+# on-disk SQLite tier that survives restarts and is shared across workers.
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, task_type, sha256(text)),
+    with an in-process LRU tier in front of an optional SQLite tier.
+    """
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, db_path: Optional[str] = EMBEDDING_CACHE_PATH):
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, task_type TEXT NOT NULL, text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL, PRIMARY KEY (model, task_type, text_hash))"
+            )
+            self._db.commit()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.api_seconds = 0.0
+
+    def _remember(self, key, vector):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, task_type: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached vectors; returns None in place of every miss."""
+        keys = [(model, task_type, text_hash(text)) for text in texts]
+        found = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.memory_hits += 1
+
+            pending = [i for i, vector in enumerate(found) if vector is None]
+            if pending and self._db is not None:
+                hashes = list({keys[i][2] for i in pending})
+                rows = {}
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(hashes), 500):
+                    part = hashes[start:start + 500]
+                    cursor = self._db.execute(
+                        "SELECT text_hash, vector FROM embeddings WHERE model = ? AND task_type = ?"
+                        f" AND text_hash IN ({','.join('?' * len(part))})",
+                        [model, task_type, *part]
+                    )
+                    rows.update(cursor.fetchall())
+                for i in pending:
+                    blob = rows.get(keys[i][2])
+                    if blob is not None:
+                        found[i] = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(keys[i], found[i])
+                        self.disk_hits += 1
+
+            self.misses += sum(1 for vector in found if vector is None)
+        return found
+
+    def put_many(self, model: str, task_type: str, texts: List[str], vectors):
+        """Store freshly computed vectors in every enabled tier."""
+        entries = [
+            ((model, task_type, text_hash(text)), np.asarray(vector, dtype=np.float32))
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            for key, vector in entries:
+                self._remember(key, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, task_type, text_hash, vector) VALUES (?, ?, ?, ?)",
+                    [(*key, vector.tobytes()) for key, vector in entries]
+                )
+                self._db.commit()
+
+    def record_api_call(self, seconds: float):
+        with self._lock:
+            self.api_calls += 1
+            self.api_seconds += seconds
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "api_calls": self.api_calls,
+            "api_seconds": self.api_seconds,
+        }
+
+
+embedding_cache = EmbeddingCache()
+
+
+@router.get("")
+async def get_embedding_cache_stats():
+    return embedding_cache.stats()
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+import os
+import random
+import threading
+import time
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Dispatcher settings:
+#   EMBEDDING_BATCH_SIZE    texts per embedding request (API limit is 100)
+#   EMBEDDING_BATCH_TOKENS  estimated tokens per embedding request
+#   EMBEDDING_CONCURRENCY   embedding requests in flight, shared by all callers
+#   EMBEDDING_RPM / EMBEDDING_TPM  request and token budgets per minute
+#   EMBEDDING_MAX_RETRIES   retries on 429/5xx and network errors
+#   EMBEDDING_RETRY_DELAY   base backoff delay in seconds
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "20000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "1500"))
+EMBEDDING_TPM = float(os.getenv("EMBEDDING_TPM", "1000000"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_RETRY_DELAY = float(os.getenv("EMBEDDING_RETRY_DELAY", "1"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors and network failures are worth retrying."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class RateLimiter:
+    """Token buckets enforcing requests-per-minute and tokens-per-minute budgets."""
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self._lock = threading.Lock()
+        self._request_rate = requests_per_minute / 60
+        self._token_rate = tokens_per_minute / 60
+        self._request_capacity = requests_per_minute
+        self._token_capacity = tokens_per_minute
+        self._requests = requests_per_minute
+        self._tokens = tokens_per_minute
+        self._updated = time.monotonic()
+
+    def acquire(self, tokens: int):
+        """Block until one request carrying `tokens` tokens fits both budgets."""
+        tokens = min(tokens, self._token_capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated
+                self._updated = now
+                self._requests = min(self._request_capacity, self._requests + elapsed * self._request_rate)
+                self._tokens = min(self._token_capacity, self._tokens + elapsed * self._token_rate)
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) / self._request_rate,
+                    (tokens - self._tokens) / self._token_rate
+                )
+            time.sleep(wait)
+
+
+class EmbeddingDispatcher:
+    """
+    Splits texts into API-sized batches and keeps several batches in flight,
+    within a shared rate limit and with jittered exponential backoff.
+    """
+    def __init__(self, concurrency: int = EMBEDDING_CONCURRENCY,
+                 batch_size: int = EMBEDDING_BATCH_SIZE,
+                 batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+                 requests_per_minute: float = EMBEDDING_RPM,
+                 tokens_per_minute: float = EMBEDDING_TPM,
+                 max_retries: int = EMBEDDING_MAX_RETRIES,
+                 retry_delay: float = EMBEDDING_RETRY_DELAY):
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+
+    def batches(self, texts: List[str]) -> List[List[str]]:
+        """Group texts into batches bounded by count and estimated tokens."""
+        batches = []
+        current = []
+        current_tokens = 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.batch_size or current_tokens + tokens > self.batch_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _call(self, batch: List[str], task_type: str, embed_batch: Callable):
+        tokens = sum(estimate_tokens(text) for text in batch)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                return embed_batch(batch, task_type)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.retry_delay * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning(f"Embedding request failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: List[str], task_type: str, embed_batch: Callable) -> List:
+        """
+        Embed texts with embed_batch(batch, task_type), returning vectors in
+        input order. A single batch runs on the calling thread so short
+        requests such as chat queries never wait behind ingest traffic.
+        """
+        batches = self.batches(texts)
+        if len(batches) == 1:
+            return self._call(batches[0], task_type, embed_batch)
+        futures = [
+            self._executor.submit(self._call, batch, task_type, embed_batch)
+            for batch in batches
+        ]
+        vectors = []
+        for future in futures:
+            vectors.extend(future.result())
+        return vectors
+
+
+embedding_dispatcher = EmbeddingDispatcher()
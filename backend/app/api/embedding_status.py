@@ -1,65 +1,60 @@
-from fastapi import APIRouter, HTTPException
-import asyncio
-from typing import Dict, Optional
+from fastapi import APIRouter, HTTPException, Request
+from typing import Optional
 from pydantic import BaseModel
-import time
+from starlette.concurrency import run_in_threadpool
+from .jobs import job_event_stream, job_store
 
 router = APIRouter()
 
-# In-memory storage for embedding status
-# Structure: {filename: {status, progress, start_time}}
-embedding_status: Dict[str, Dict] = {}
+# Embedding status is the state of the ingestion job for an upload, kept in
+# the job store. Lookups by filename return the most recent job for that file.
+# Every update is also pushed to clients following the job's progress events.
 
 class EmbeddingProgress(BaseModel):
-    status: str  # 'pending' | 'processing' | 'complete' | 'error'
+    status: str  # 'pending' | 'processing' | 'complete' | 'error' | 'cancelled'
     progress: int
     error_message: Optional[str] = None
 
-def init_embedding_status(filename: str):
-    """Initialize embedding status for a file"""
-    embedding_status[filename] = {
-        'status': 'pending',
-        'progress': 0,
-        'start_time': time.time(),
-        'error_message': None
-    }
-
-def update_embedding_status(filename: str, status: str, progress: int, error_message: Optional[str] = None):
-    """Update embedding status for a file"""
-    if filename in embedding_status:
-        embedding_status[filename].update({
-            'status': status,
-            'progress': progress,
-            'error_message': error_message
-        })
+def init_embedding_status(filename: str) -> str:
+    """Create the ingestion job for a file and return its id"""
+    return job_store.create(filename)
 
-def cleanup_old_status():
-    """Remove status entries older than 1 hour"""
-    current_time = time.time()
-    to_remove = []
-    for filename, status in embedding_status.items():
-        if current_time - status['start_time'] > 3600:  # 1 hour
-            to_remove.append(filename)
-    
-    for filename in to_remove:
-        del embedding_status[filename]
+def update_embedding_status(job_id: str, status: str, progress: int, error_message: Optional[str] = None, **fields):
+    """Update embedding status for an ingestion job"""
+    job_store.update(
+        job_id,
+        status=status,
+        progress=progress,
+        error_message=error_message,
+        **fields
+    )
 
 @router.get("/{filename}")
 async def get_embedding_status(filename: str):
-    cleanup_old_status()
-    
-    if filename not in embedding_status:
+    status = await run_in_threadpool(job_store.latest_for_filename, filename)
+    if status is None:
         raise HTTPException(
             status_code=404,
             detail=f"No embedding status found for file: {filename}"
         )
-    
-    status = embedding_status[filename]
+
     return {
         "status": status['status'],
         "progress": status['progress'],
-        "error_message": status['error_message']
+        "error_message": status['error_message'],
+        "job_id": status['id']
     }
 
+@router.get("/{filename}/events")
+async def get_embedding_status_events(filename: str, request: Request):
+    """Server-sent progress events for the most recent job for a file"""
+    status = await run_in_threadpool(job_store.latest_for_filename, filename)
+    if status is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No embedding status found for file: {filename}"
+        )
+    return job_event_stream(request, status['id'])
+
 # Export functions to be used by other modules
-__all__ = ['router', 'init_embedding_status', 'update_embedding_status'] 
\ No newline at end of file
+__all__ = ['router', 'init_embedding_status', 'update_embedding_status']
@@ -0,0 +1,69 @@
+import time
+import logging
+from .embedding_cache import embedding_cache
+from .embedding_dispatcher import embedding_dispatcher, estimate_tokens
+from .gemini_client import gemini
+from .metrics import tokens_total
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+# Custom embedding function for ChromaDB
+class GeminiEmbeddingFunction:
+    """
+    Embeds text with Gemini. The task type is passed per call rather than
+    stored on the instance, so concurrent ingest and chat requests can share
+    one instance without affecting each other.
+    """
+    @property
+    def client(self):
+        # The shared application client, see gemini_client
+        return gemini.get()
+
+    def embed(self, texts, task_type):
+        """
+        Embed texts, consulting the embedding cache first so that only texts
+        never seen before (with this model and task type) reach the API. The
+        misses are sent through the dispatcher, which batches them and keeps
+        several requests in flight within the configured rate limits.
+        """
+        cached = embedding_cache.get_many(EMBEDDING_MODEL, task_type, texts)
+        misses = list(dict.fromkeys(
+            text for text, vector in zip(texts, cached) if vector is None
+        ))
+        fresh = {}
+        if misses:
+            start = time.perf_counter()
+            vectors = embedding_dispatcher.embed(misses, task_type, self._embed_content)
+            embedding_cache.record_api_call(time.perf_counter() - start)
+            embedding_cache.put_many(EMBEDDING_MODEL, task_type, misses, vectors)
+            tokens_total.inc(sum(estimate_tokens(text) for text in misses), "embedding")
+            fresh = dict(zip(misses, vectors))
+        return [
+            fresh[text] if vector is None else vector.tolist()
+            for text, vector in zip(texts, cached)
+        ]
+
+    def _embed_content(self, texts, task_type):
+        response = self.client.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=texts,
+            config={"task_type": task_type},
+        )
+        return [e.values for e in response.embeddings]
+
+    def embed_documents(self, texts):
+        return self.embed(texts, "retrieval_document")
+
+    def embed_query(self, text):
+        return self.embed([text], "retrieval_query")[0]
+
+    def embed_queries(self, texts):
+        return self.embed(texts, "retrieval_query")
+
+    def __call__(self, input):
+        # Chroma only calls this for documents being added; queries are
+        # embedded explicitly with embed_query and passed as query_embeddings.
+        return self.embed_documents(input)
@@ -0,0 +1,96 @@
+import os
+import threading
+from typing import Optional
+import logging
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+if not GOOGLE_API_KEY:
+    logger.warning("GOOGLE_API_KEY not found in environment variables")
+
+# Connection pool shared by embedding and generation calls:
+#   GEMINI_MAX_CONNECTIONS  concurrent connections to the Gemini API
+#   GEMINI_MAX_KEEPALIVE    idle connections kept open for reuse
+#   GEMINI_KEEPALIVE_EXPIRY seconds an idle connection is kept
+#   GEMINI_TIMEOUT          seconds allowed per API request
+#   GEMINI_CONNECT_TIMEOUT  seconds allowed to open a connection
+#   GEMINI_BASE_URL         API endpoint override, e.g. a local stand-in for benchmarks
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "64"))
+GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", "32"))
+GEMINI_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "10"))
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+
+
+class GeminiClientProvider:
+    """
+    Owns the application's single genai.Client. Every embedding and
+    generation call goes through it, so they share one keep-alive connection
+    pool instead of each request paying for a new client and TLS handshake.
+    The client is created by start() in the app lifespan (or on first use)
+    and closed by close() on shutdown.
+    """
+    def __init__(self, max_connections: int = GEMINI_MAX_CONNECTIONS,
+                 max_keepalive: int = GEMINI_MAX_KEEPALIVE,
+                 keepalive_expiry: float = GEMINI_KEEPALIVE_EXPIRY,
+                 timeout: float = GEMINI_TIMEOUT,
+                 connect_timeout: float = GEMINI_CONNECT_TIMEOUT,
+                 base_url: Optional[str] = GEMINI_BASE_URL):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.base_url = base_url
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _create(self) -> genai.Client:
+        return genai.Client(
+            api_key=GOOGLE_API_KEY,
+            http_options=types.HttpOptions(
+                base_url=self.base_url,
+                timeout=int(self.timeout * 1000),
+                client_args={
+                    "limits": httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                },
+            ),
+        )
+
+    def get(self) -> genai.Client:
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create()
+                client = self._client
+        return client
+
+    def start(self):
+        self.get()
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        close = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Error closing Gemini client: {str(e)}")
+
+
+gemini = GeminiClientProvider()
@@ -0,0 +1,736 @@
+from abc import ABC, abstractmethod
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import queue
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from .metrics import Gauge
+from .vector_store import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Job settings:
+#   JOB_STORE            'sqlite'  SQLite file at JOB_STORE_PATH in WAL mode, shared by the
+#                                  worker processes on one host (default)
+#                        'memory'  in-process only, for development
+#                        'redis'   Redis-protocol server at JOB_STORE_URL, shared across hosts
+#   JOB_STORE_PATH       SQLite file holding job state (':memory:' keeps it in-process)
+#   JOB_STORE_URL        redis://host:port/db for JOB_STORE=redis
+#   JOB_LEASE            seconds a worker's claim on a job lasts unless renewed; jobs left
+#                        by a worker that stopped renewing are taken over by another one
+#   JOB_SPOOL_DIR        where uploaded PDFs wait until their job finishes
+#   JOB_WORKERS          ingestion jobs processed in parallel
+#   JOB_QUEUE_SIZE       queued jobs before uploads are rejected with 503
+#   JOB_MAX_ATTEMPTS     attempts per job before it is marked as failed
+#   JOB_RETRY_DELAY      base delay in seconds between attempts
+#   JOB_RETENTION        seconds finished jobs are kept for status queries
+#   JOB_SWEEP_INTERVAL   seconds between sweeps that drop finished jobs past retention
+#   JOB_EVENTS_HEARTBEAT seconds between keep-alive comments on idle progress streams
+#   JOB_EVENTS_POLL      seconds between store reads on progress streams, which pick up
+#                        updates made by other worker processes
+JOB_STORE = os.getenv("JOB_STORE", "sqlite").lower()
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+JOB_STORE_URL = os.getenv("JOB_STORE_URL", "redis://localhost:6379/0")
+JOB_LEASE = float(os.getenv("JOB_LEASE", "30"))
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join(DATA_DIR, "uploads"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "1"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "60"))
+JOB_EVENTS_HEARTBEAT = float(os.getenv("JOB_EVENTS_HEARTBEAT", "15"))
+JOB_EVENTS_POLL = float(os.getenv("JOB_EVENTS_POLL", "1"))
+
+# Job status values: 'pending' | 'processing' | 'complete' | 'error' | 'cancelled'
+ACTIVE_STATUSES = ("pending", "processing")
+
+JOB_FIELDS = (
+    "id", "filename", "status", "progress", "message", "error_message",
+    "attempts", "pages_processed", "chunks_processed", "file_path",
+    "created_at", "updated_at", "owner", "lease_expires",
+)
+# Fields only the workers need
+PRIVATE_JOB_FIELDS = ("file_path", "owner", "lease_expires")
+
+# Identifies this process as the owner of the jobs it creates and runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job has been cancelled."""
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures that retrying cannot fix."""
+
+
+class JobSubscription:
+    """
+    One listener's view of a job. Only the latest state is kept, so a slow
+    client skips intermediate progress instead of queueing it.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.latest: Optional[Dict] = None
+        self.changed = asyncio.Event()
+
+    def _deliver(self, job: Dict):
+        self.latest = job
+        self.changed.set()
+
+    async def next(self, timeout: float) -> Optional[Dict]:
+        """Wait for the next job state; None if nothing changed within timeout."""
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.changed.clear()
+        return self.latest
+
+
+class JobEvents:
+    """
+    Pushes job updates to subscribers as they happen. publish() is called
+    from worker threads; each subscription is woken on its own event loop.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, List[JobSubscription]] = {}
+
+    def subscribe(self, job_id: str) -> JobSubscription:
+        subscription = JobSubscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(job_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, job_id: str, subscription: JobSubscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(job_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(job_id, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, job: Dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(job["id"], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, job)
+            except RuntimeError:
+                # The subscriber's event loop has closed
+                self.unsubscribe(job["id"], subscription)
+
+
+class BaseJobStore(ABC):
+    """
+    Job state shared by the API and the ingestion workers. Backends store
+    the records; every change is published to local progress subscribers.
+
+    Each worker process holds the jobs it creates or queues and renews a
+    lease on them while they wait or run, so several processes (or hosts, with a shared
+    backend) can share one store without running a job twice; jobs whose
+    lease lapses are taken over by another worker.
+    """
+    def __init__(self, retention: float = JOB_RETENTION):
+        self.retention = retention
+        self.events = JobEvents()
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+
+    @abstractmethod
+    def create(self, filename: str, owner: str = WORKER_ID, lease: float = JOB_LEASE) -> str:
+        """Create a pending job held by owner and return its id."""
+
+    @abstractmethod
+    def _update(self, job_id: str, fields: Dict) -> bool:
+        """Write fields unless the job is cancelled or gone; returns whether it did."""
+
+    @abstractmethod
+    def cancel(self, job_id: str) -> bool:
+        """Mark an active job as cancelled; returns False if it already finished."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict]:
+        """The job's record, or None if there is no such job."""
+
+    @abstractmethod
+    def latest_for_filename(self, filename: str) -> Optional[Dict]:
+        """The most recently created job for filename, or None."""
+
+    @abstractmethod
+    def active_jobs(self) -> List[Dict]:
+        """Jobs that are pending or processing."""
+
+    @abstractmethod
+    def count_active(self) -> int:
+        """Number of jobs that are pending or processing."""
+
+    @abstractmethod
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """
+        Take an active job for owner unless another owner holds an unexpired
+        lease on it; returns whether owner now holds it.
+        """
+
+    @abstractmethod
+    def renew(self, owner: str, lease: float) -> int:
+        """Extend the lease on every active job held by owner; returns how many."""
+
+    @abstractmethod
+    def sweep(self, retention: Optional[float] = None) -> int:
+        """Drop finished jobs not updated for retention seconds; returns how many."""
+
+    def update(self, job_id: str, **fields):
+        """Update a job's fields. Cancelled jobs are final and left untouched."""
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        fields["updated_at"] = time.time()
+        if self._update(job_id, fields):
+            job = self.get(job_id)
+            if job:
+                self.events.publish(job)
+
+    def start_sweeper(self, interval: float = JOB_SWEEP_INTERVAL):
+        """Sweep expired jobs from a background thread every interval seconds."""
+        def sweep_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    swept = self.sweep()
+                    if swept:
+                        logger.info(f"Dropped {swept} expired jobs")
+                except Exception as e:
+                    logger.error(f"Error sweeping expired jobs: {str(e)}")
+
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=sweep_forever, name="job-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def is_cancelled(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        return job is None or job["status"] == "cancelled"
+
+
+class JobStore(BaseJobStore):
+    """
+    SQLite-backed job store. On disk it runs in WAL mode, so every worker
+    process on the host can share it; ':memory:' keeps it in-process.
+    """
+    def __init__(self, path: str = JOB_STORE_PATH, retention: float = JOB_RETENTION):
+        super().__init__(retention)
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, filename TEXT NOT NULL, status TEXT NOT NULL,"
+            " progress INTEGER NOT NULL DEFAULT 0, message TEXT, error_message TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0, pages_processed INTEGER,"
+            " chunks_processed INTEGER, file_path TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " owner TEXT, lease_expires REAL)"
+        )
+        # Stores created before jobs had owners
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_expires", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_filename ON jobs (filename, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (status, updated_at)")
+        self._db.commit()
+
+    def _execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._db.execute(sql, parameters)
+            self._db.commit()
+        return cursor
+
+    def create(self, filename: str, owner: str = WORKER_ID, lease: float = JOB_LEASE) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, filename, status, created_at, updated_at, owner, lease_expires)"
+            " VALUES (?, ?, 'pending', ?, ?, ?, ?)",
+            (job_id, filename, now, now, owner, now + lease)
+        )
+        return job_id
+
+    def _update(self, job_id: str, fields: Dict) -> bool:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        cursor = self._execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND status != 'cancelled'",
+            (*fields.values(), job_id)
+        )
+        return cursor.rowcount > 0
+
+    def cancel(self, job_id: str) -> bool:
+        cursor = self._execute(
+            "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (time.time(), job_id, *ACTIVE_STATUSES)
+        )
+        if cursor.rowcount:
+            self.events.publish(self.get(job_id))
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_for_filename(self, filename: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE filename = ? ORDER BY created_at DESC LIMIT 1",
+                (filename,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def active_jobs(self) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                ACTIVE_STATUSES
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_active(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchone()[0]
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE jobs SET owner = ?, lease_expires = ? WHERE id = ? AND status IN (?, ?)"
+            " AND (owner IS NULL OR owner = ? OR lease_expires < ?)",
+            (owner, now + lease, job_id, *ACTIVE_STATUSES, owner, now)
+        )
+        return cursor.rowcount > 0
+
+    def renew(self, owner: str, lease: float) -> int:
+        cursor = self._execute(
+            "UPDATE jobs SET lease_expires = ? WHERE owner = ? AND status IN (?, ?)",
+            (time.time() + lease, owner, *ACTIVE_STATUSES)
+        )
+        return cursor.rowcount
+
+    def sweep(self, retention: Optional[float] = None) -> int:
+        retention = self.retention if retention is None else retention
+        cursor = self._execute(
+            "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+            (*ACTIVE_STATUSES, time.time() - retention)
+        )
+        return cursor.rowcount
+
+
+class RedisJobStore(BaseJobStore):
+    """
+    Job store on Redis or any server speaking its protocol, shared across
+    hosts. Each job is a hash; changes run in WATCH/MULTI transactions so
+    concurrent workers never overwrite each other, and finished jobs are
+    given a TTL of retention seconds instead of being swept.
+    """
+    INT_FIELDS = ("progress", "attempts", "pages_processed", "chunks_processed")
+    FLOAT_FIELDS = ("created_at", "updated_at", "lease_expires")
+
+    def __init__(self, client, retention: float = JOB_RETENTION, prefix: str = "rag:jobs:"):
+        import redis
+        super().__init__(retention)
+        self._redis = client
+        self._prefix = prefix
+        self._watch_error = redis.WatchError
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisJobStore":
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("JOB_STORE=redis needs the redis package") from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self._prefix}job:{job_id}"
+
+    def _latest_key(self, filename: str) -> str:
+        return f"{self._prefix}latest:{filename}"
+
+    @property
+    def _active_key(self) -> str:
+        return f"{self._prefix}active"
+
+    def _decode(self, values: Dict) -> Optional[Dict]:
+        if not values:
+            return None
+        job = dict.fromkeys(JOB_FIELDS)
+        for name, value in values.items():
+            name = name.decode()
+            value = value.decode()
+            if name in self.INT_FIELDS:
+                value = int(value)
+            elif name in self.FLOAT_FIELDS:
+                value = float(value)
+            job[name] = value
+        return job
+
+    def _write(self, pipe, job_id: str, fields: Dict):
+        values = {name: value for name, value in fields.items() if value is not None}
+        cleared = [name for name, value in fields.items() if value is None]
+        if values:
+            pipe.hset(self._job_key(job_id), mapping=values)
+        if cleared:
+            pipe.hdel(self._job_key(job_id), *cleared)
+
+    def _modify(self, job_id: str, change: Callable[[Dict], Optional[Dict]]) -> bool:
+        """
+        Atomically apply change(job), which returns the fields to write or
+        None to leave the job alone. Retries if another writer got there
+        first; returns whether the job was written.
+        """
+        key = self._job_key(job_id)
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    job = self._decode(pipe.hgetall(key))
+                    fields = change(job) if job else None
+                    if fields is None:
+                        pipe.unwatch()
+                        return False
+                    latest_key = self._latest_key(job["filename"])
+                    pipe.watch(latest_key)
+                    latest = pipe.get(latest_key)
+                    pipe.multi()
+                    self._write(pipe, job_id, fields)
+                    if fields.get("status", job["status"]) not in ACTIVE_STATUSES:
+                        # Finished jobs expire on their own
+                        pipe.srem(self._active_key, job_id)
+                        pipe.expire(key, int(self.retention))
+                        if latest is not None and latest.decode() == job_id:
+                            pipe.expire(latest_key, int(self.retention))
+                    pipe.execute()
+                    return True
+                except self._watch_error:
+                    continue
+
+    def create(self, filename: str, owner: str = WORKER_ID, lease: float = JOB_LEASE) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._redis.pipeline() as pipe:
+            self._write(pipe, job_id, {
+                "id": job_id, "filename": filename, "status": "pending", "progress": 0,
+                "attempts": 0, "created_at": now, "updated_at": now,
+                "owner": owner, "lease_expires": now + lease,
+            })
+            pipe.set(self._latest_key(filename), job_id)
+            pipe.sadd(self._active_key, job_id)
+            pipe.execute()
+        return job_id
+
+    def _update(self, job_id: str, fields: Dict) -> bool:
+        return self._modify(job_id, lambda job: None if job["status"] == "cancelled" else fields)
+
+    def cancel(self, job_id: str) -> bool:
+        cancelled = self._modify(
+            job_id,
+            lambda job: {"status": "cancelled", "updated_at": time.time()}
+            if job["status"] in ACTIVE_STATUSES else None
+        )
+        if cancelled:
+            self.events.publish(self.get(job_id))
+        return cancelled
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self._decode(self._redis.hgetall(self._job_key(job_id)))
+
+    def latest_for_filename(self, filename: str) -> Optional[Dict]:
+        job_id = self._redis.get(self._latest_key(filename))
+        return self.get(job_id.decode()) if job_id else None
+
+    def active_jobs(self) -> List[Dict]:
+        job_ids = [job_id.decode() for job_id in self._redis.smembers(self._active_key)]
+        with self._redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hgetall(self._job_key(job_id))
+            jobs = [self._decode(values) for values in pipe.execute()]
+        jobs = [job for job in jobs if job and job["status"] in ACTIVE_STATUSES]
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+    def count_active(self) -> int:
+        return self._redis.scard(self._active_key)
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        def change(job):
+            now = time.time()
+            if job["status"] not in ACTIVE_STATUSES:
+                return None
+            if job["owner"] not in (None, owner) and (job["lease_expires"] or 0) >= now:
+                return None
+            return {"owner": owner, "lease_expires": now + lease}
+        return self._modify(job_id, change)
+
+    def renew(self, owner: str, lease: float) -> int:
+        renewed = 0
+        for job in self.active_jobs():
+            if job["owner"] == owner and self._modify(
+                job["id"],
+                lambda current: {"lease_expires": time.time() + lease}
+                if current["owner"] == owner and current["status"] in ACTIVE_STATUSES else None
+            ):
+                renewed += 1
+        return renewed
+
+    def sweep(self, retention: Optional[float] = None) -> int:
+        """Finished jobs expire through their TTL; only drop ids left in the active set."""
+        stale = [
+            job_id for job_id in self._redis.smembers(self._active_key)
+            if not self._redis.exists(self._job_key(job_id.decode()))
+        ]
+        if stale:
+            self._redis.srem(self._active_key, *stale)
+        return len(stale)
+
+
+def create_job_store() -> BaseJobStore:
+    """Create the job store selected by JOB_STORE."""
+    if JOB_STORE == "memory":
+        return JobStore(":memory:")
+    if JOB_STORE == "sqlite":
+        return JobStore(JOB_STORE_PATH)
+    if JOB_STORE == "redis":
+        logger.info(f"Using Redis job store at {JOB_STORE_URL}")
+        return RedisJobStore.from_url(JOB_STORE_URL)
+    raise ValueError(f"Unknown JOB_STORE setting: {JOB_STORE}")
+
+
+class JobQueue:
+    """
+    Bounded queue of job ids drained by a pool of worker threads.
+
+    The handler is called with the job record and must raise JobCancelled or
+    PermanentJobError to stop without retrying; any other exception is retried
+    with jittered exponential backoff up to JOB_MAX_ATTEMPTS. on_finished is
+    called with the final job record once the job is no longer active.
+
+    Jobs are held in the store under this queue's worker id and their lease
+    is renewed in the background. recover() takes over jobs no
+    live worker holds; on_recovered is asked first whether such a job can
+    still run.
+    """
+    def __init__(self, store: BaseJobStore, handler: Callable[[Dict], None],
+                 on_finished: Optional[Callable[[Dict], None]] = None,
+                 on_recovered: Optional[Callable[[Dict], bool]] = None,
+                 workers: int = JOB_WORKERS, max_size: int = JOB_QUEUE_SIZE,
+                 lease: float = JOB_LEASE, worker_id: str = WORKER_ID):
+        self.store = store
+        self.handler = handler
+        self.on_finished = on_finished
+        self.on_recovered = on_recovered
+        self.workers = workers
+        self.lease = lease
+        self.worker_id = worker_id
+        self._queue = queue.Queue(maxsize=max_size)
+        self._threads = []
+        self._lease_keeper = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work, name=f"ingest-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            if self._lease_keeper is None:
+                self._lease_keeper = threading.Thread(target=self._keep_leases, name="job-leases", daemon=True)
+                self._lease_keeper.start()
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, job_id: str):
+        """
+        Claim and queue a job, raising queue.Full when the backlog is at
+        capacity. Jobs another live worker holds are left to it.
+        """
+        self.start()
+        if not self.store.claim(job_id, self.worker_id, self.lease):
+            logger.info(f"Job {job_id} is held by another worker")
+            return
+        self._queue.put_nowait(job_id)
+
+    def recover(self) -> int:
+        """Claim and queue active jobs no live worker holds a lease on; returns how many."""
+        recovered = 0
+        for job in self.store.active_jobs():
+            if job["owner"] == self.worker_id or not self.store.claim(job["id"], self.worker_id, self.lease):
+                continue
+            if self.on_recovered and not self.on_recovered(job):
+                continue
+            try:
+                self._queue.put_nowait(job["id"])
+                recovered += 1
+            except queue.Full:
+                self.store.update(job["id"], status="error", error_message="Job queue is full")
+                if self.on_finished:
+                    self.on_finished(self.store.get(job["id"]))
+        if recovered:
+            logger.info(f"Recovered {recovered} jobs left by other workers")
+        return recovered
+
+    def _keep_leases(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                self.store.renew(self.worker_id, self.lease)
+                self.recover()
+            except Exception as e:
+                logger.error(f"Error renewing job leases: {str(e)}")
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logger.error(f"Unexpected error in job {job_id}: {str(e)}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str):
+        try:
+            self._attempt(job_id)
+        finally:
+            job = self.store.get(job_id)
+            if job and job["status"] not in ACTIVE_STATUSES and self.on_finished:
+                self.on_finished(job)
+
+    def _attempt(self, job_id: str):
+        job = self.store.get(job_id)
+        while job and job["status"] in ACTIVE_STATUSES:
+            attempt = job["attempts"] + 1
+            self.store.update(job_id, status="processing", attempts=attempt)
+            try:
+                self.handler({**job, "status": "processing", "attempts": attempt})
+                return
+            except JobCancelled:
+                logger.info(f"Job {job_id} cancelled")
+                return
+            except PermanentJobError as e:
+                self.store.update(job_id, status="error", error_message=str(e))
+                return
+            except Exception as e:
+                logger.error(f"Job {job_id} attempt {attempt} failed: {str(e)}")
+                if attempt >= JOB_MAX_ATTEMPTS:
+                    self.store.update(job_id, status="error", error_message=str(e))
+                    return
+                delay = JOB_RETRY_DELAY * 2 ** (attempt - 1)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+            job = self.store.get(job_id)
+
+
+job_store = create_job_store()
+
+Gauge("rag_jobs_in_flight", "Ingestion jobs pending or processing", job_store.count_active)
+
+
+def public_job(job: Dict) -> Dict:
+    return {name: value for name, value in job.items() if name not in PRIVATE_JOB_FIELDS}
+
+
+async def job_events(request: Request, job_id: str, heartbeat: float = JOB_EVENTS_HEARTBEAT,
+                     poll: float = JOB_EVENTS_POLL):
+    """
+    Server-sent `progress` events for a job: its current state straight
+    away, then each change as it is recorded, ending once the job is no
+    longer active. Changes made in this process arrive at once; the store is
+    also read every poll seconds for changes made by other worker processes.
+    Idle streams get a comment every heartbeat seconds.
+    """
+    subscription = job_store.events.subscribe(job_id)
+    try:
+        # Read after subscribing so no update can fall between the two
+        job = await run_in_threadpool(job_store.get, job_id)
+        sent = None
+        last_write = time.monotonic()
+        while job is not None:
+            state = (job["status"], job["progress"], job["message"], job["error_message"])
+            if state != sent:
+                sent = state
+                last_write = time.monotonic()
+                yield f"event: progress\ndata: {json.dumps(public_job(job))}\n\n"
+            if job["status"] not in ACTIVE_STATUSES:
+                return
+            update = await subscription.next(min(poll, heartbeat))
+            if await request.is_disconnected():
+                return
+            if update is None:
+                job = await run_in_threadpool(job_store.get, job_id)
+                if time.monotonic() - last_write >= heartbeat:
+                    last_write = time.monotonic()
+                    yield ": keep-alive\n\n"
+            else:
+                job = update
+    finally:
+        job_store.events.unsubscribe(job_id, subscription)
+
+
+def job_event_stream(request: Request, job_id: str) -> StreamingResponse:
+    return StreamingResponse(
+        job_events(request, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+Gauge("rag_job_event_subscribers", "Clients listening for job progress events", job_store.events.subscriber_count)
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return public_job(job)
+
+
+@router.get("/{job_id}/events")
+async def get_job_events(job_id: str, request: Request):
+    """Push a job's progress as server-sent events instead of being polled."""
+    if not await run_in_threadpool(job_store.get, job_id):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job_event_stream(request, job_id)
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    if not await run_in_threadpool(job_store.get, job_id):
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    if not await run_in_threadpool(job_store.cancel, job_id):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' has already finished")
+    return {"message": f"Job '{job_id}' cancelled"}
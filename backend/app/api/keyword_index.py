@@ -0,0 +1,229 @@
+from array import array
+from collections import Counter
+from typing import Dict, List, Tuple
+import os
+import re
+import threading
+import logging
+import numpy as np
+from .vector_store import db
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Words, numbers and identifiers such as "AB-1234" or "v2.3.1"
+TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+
+# Rebuild postings once this share of the indexed chunks has been deleted
+COMPACT_RATIO = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+
+class KeywordIndex:
+    """
+    In-process BM25 inverted index over chunk texts.
+
+    Chunks get dense integer ids; each term's postings are two growable
+    uint32 arrays (chunk numbers and term frequencies), so the index holds
+    no per-posting Python objects and a query scores a term's whole posting
+    list with numpy. Deletes leave a tombstone and postings are compacted
+    once enough chunks have been removed.
+    """
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # Cleared while a rebuild is filling the index; searches should not
+        # rely on it until it is set again
+        self.ready = threading.Event()
+        self.ready.set()
+        self._removed_during_build = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._terms: Dict[str, int] = {}
+            self._postings: List[Tuple[array, array]] = []
+            self._chunk_numbers: Dict[str, int] = {}
+            self._chunk_ids: List[str] = []
+            self._lengths = array("I")
+            self._live = bytearray()
+            self._live_count = 0
+            self._total_length = 0
+
+    def __len__(self):
+        return self._live_count
+
+    def _add(self, chunk_id: str, text: str):
+        if chunk_id in self._chunk_numbers:
+            self._remove(chunk_id)
+        number = len(self._chunk_ids)
+        self._chunk_numbers[chunk_id] = number
+        self._chunk_ids.append(chunk_id)
+
+        counts = Counter(tokenize(text))
+        for token, count in counts.items():
+            term = self._terms.get(token)
+            if term is None:
+                term = self._terms[token] = len(self._postings)
+                self._postings.append((array("I"), array("I")))
+            numbers, frequencies = self._postings[term]
+            numbers.append(number)
+            frequencies.append(count)
+
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self._live.append(1)
+        self._live_count += 1
+        self._total_length += length
+
+    def _remove(self, chunk_id: str):
+        if self._removed_during_build is not None:
+            self._removed_during_build.add(chunk_id)
+        number = self._chunk_numbers.pop(chunk_id, None)
+        if number is None or not self._live[number]:
+            return
+        self._live[number] = 0
+        self._live_count -= 1
+        self._total_length -= self._lengths[number]
+
+    def add_chunks(self, ids: List[str], texts: List[str]):
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                self._add(chunk_id, text)
+
+    def add_existing_chunks(self, ids: List[str], texts: List[str]):
+        """Add chunks read from the collection by a rebuild, skipping any deleted meanwhile."""
+        with self._lock:
+            removed = self._removed_during_build or ()
+            for chunk_id, text in zip(ids, texts):
+                if chunk_id not in removed:
+                    self._add(chunk_id, text)
+
+    def begin_rebuild(self):
+        with self._lock:
+            self.ready.clear()
+            self._removed_during_build = set()
+        self.clear()
+
+    def end_rebuild(self):
+        with self._lock:
+            self._removed_during_build = None
+        self.ready.set()
+
+    def remove_chunks(self, ids: List[str]):
+        with self._lock:
+            for chunk_id in ids:
+                self._remove(chunk_id)
+            if len(self._chunk_ids) - self._live_count > COMPACT_RATIO * len(self._chunk_ids):
+                self._compact()
+
+    def _compact(self):
+        """Drop deleted chunks from the postings and renumber the rest."""
+        live = np.frombuffer(bytes(self._live), dtype=np.uint8).astype(bool)
+        renumber = np.cumsum(live, dtype=np.int64) - 1
+        postings = []
+        terms = {}
+        for token, term in self._terms.items():
+            numbers = np.frombuffer(self._postings[term][0], dtype=np.uint32)
+            frequencies = np.frombuffer(self._postings[term][1], dtype=np.uint32)
+            keep = live[numbers]
+            if not keep.any():
+                continue
+            terms[token] = len(postings)
+            postings.append((
+                array("I", renumber[numbers[keep]].astype(np.uint32).tobytes()),
+                array("I", frequencies[keep].tobytes()),
+            ))
+        self._terms = terms
+        self._postings = postings
+        self._chunk_ids = [chunk_id for chunk_id, alive in zip(self._chunk_ids, self._live) if alive]
+        self._chunk_numbers = {chunk_id: number for number, chunk_id in enumerate(self._chunk_ids)}
+        self._lengths = array("I", np.frombuffer(self._lengths, dtype=np.uint32)[live].tobytes())
+        self._live = bytearray(b"\x01" * len(self._chunk_ids))
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """
+        Return up to n_results (chunk id, BM25 score) pairs, best first. Work
+        is proportional to the postings of the query terms, not the number
+        of indexed chunks.
+        """
+        with self._lock:
+            if not self._live_count:
+                return []
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            live = np.frombuffer(self._live, dtype=np.uint8)
+            average_length = self._total_length / self._live_count or 1.0
+            matches, contributions = [], []
+            for token in set(tokenize(query)):
+                term = self._terms.get(token)
+                if term is None:
+                    continue
+                numbers = np.frombuffer(self._postings[term][0], dtype=np.uint32)
+                frequencies = np.frombuffer(self._postings[term][1], dtype=np.uint32)
+                alive = live[numbers].astype(bool)
+                numbers, frequencies = numbers[alive], frequencies[alive].astype(np.float32)
+                if not len(numbers):
+                    continue
+                idf = np.log(1 + (self._live_count - len(numbers) + 0.5) / (len(numbers) + 0.5))
+                norms = self.k1 * (1 - self.b + self.b * lengths[numbers] / average_length)
+                matches.append(numbers)
+                contributions.append(idf * frequencies * (self.k1 + 1) / (frequencies + norms))
+            del lengths, live
+
+            if not matches:
+                return []
+            # Sum each chunk's contributions across the query terms
+            numbers, inverse = np.unique(np.concatenate(matches), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(contributions))
+            if len(numbers) > n_results:
+                top = np.argpartition(-scores, n_results - 1)[:n_results]
+            else:
+                top = np.arange(len(numbers))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self._chunk_ids[numbers[i]], float(scores[i])) for i in top]
+
+
+keyword_index = KeywordIndex()
+
+
+def _index_collection(page_size: int):
+    try:
+        total = db.count()
+        for offset in range(0, total, page_size):
+            results = db.get(include=["documents"], limit=page_size, offset=offset)
+            keyword_index.add_existing_chunks(results["ids"], [text or "" for text in results["documents"]])
+        if total:
+            logger.info(f"Keyword index built over {len(keyword_index)} chunks")
+    except Exception as e:
+        logger.error(f"Error building keyword index: {str(e)}")
+    finally:
+        keyword_index.end_rebuild()
+
+
+def rebuild_keyword_index(page_size: int = 5000):
+    """
+    Index every chunk already in the collection, e.g. after a restart.
+    Chunks added or deleted while this runs are kept up to date by the
+    regular add and delete paths.
+    """
+    keyword_index.begin_rebuild()
+    _index_collection(page_size)
+
+
+def start_rebuild(page_size: int = 5000):
+    """
+    Build the keyword index on a background thread, so startup does not
+    wait for a pass over the whole collection. Hybrid retrieval uses vector
+    search alone until the index is ready.
+    """
+    keyword_index.begin_rebuild()
+    threading.Thread(
+        target=_index_collection, args=(page_size,), name="keyword-index-rebuild", daemon=True
+    ).start()
@@ -0,0 +1,189 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# METRICS_OTEL_SPANS=true also records every timed stage as an OpenTelemetry
+# span. Exporters are configured the usual OpenTelemetry way (e.g. the
+# OTEL_* environment variables with opentelemetry-instrument).
+METRICS_OTEL_SPANS = os.getenv("METRICS_OTEL_SPANS", "false").lower() == "true"
+
+# Upper bounds in seconds, from cache hits to slow generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry: List["Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonic count, one series per label combination."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in sorted(values.items())]
+
+
+class Gauge(Metric):
+    """Current value, read from a callback when /metrics is scraped."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            return [f"{self.name} {_number(self.callback())}"]
+        except Exception as e:
+            logger.warning(f"Could not read gauge {self.name}: {str(e)}")
+            return []
+
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets, plus their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        lines = []
+        bucket_labels = self.labelnames + ("le",)
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(bucket_labels, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "rag_stage_seconds", "Time spent in each stage of the upload and chat pipelines",
+    ("pipeline", "stage")
+)
+tokens_total = Counter(
+    "rag_tokens_total", "Estimated tokens sent to or received from Gemini", ("kind",)
+)
+chunks_total = Counter(
+    "rag_chunks_total", "Chunks added to or deleted from the collection", ("operation",)
+)
+pages_total = Counter("rag_pages_extracted_total", "PDF pages extracted during ingestion")
+chat_stream_ttfb_seconds = Histogram(
+    "rag_chat_stream_ttfb_seconds", "Time from a streamed chat request to its first answer token"
+)
+chat_requests_total = Counter(
+    "rag_chat_requests_total", "Chat questions answered, by endpoint and outcome", ("endpoint", "outcome")
+)
+
+
+_tracer = None
+if METRICS_OTEL_SPANS:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("rag-qna")
+    except ImportError:
+        logger.warning("METRICS_OTEL_SPANS is set but opentelemetry-api is not installed")
+
+
+@contextmanager
+def timed(pipeline: str, stage: str, span_attributes: Optional[Dict] = None):
+    """Time a block into rag_stage_seconds (and an OpenTelemetry span if enabled)."""
+    if _tracer is None:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage_seconds.observe(time.perf_counter() - start, pipeline, stage)
+        return
+
+    with _tracer.start_as_current_span(f"{pipeline}.{stage}", attributes=span_attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage_seconds.observe(time.perf_counter() - start, pipeline, stage)
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
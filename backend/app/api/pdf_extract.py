@@ -0,0 +1,162 @@
+import os
+import mmap
+import tempfile
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+# Extraction settings:
+#   PDF_EXTRACTOR               'pypdf' (default) or 'pymupdf' (faster)
+#   PDF_EXTRACT_WORKERS         processes used for large documents
+#   PDF_EXTRACT_PAGES_PER_TASK  pages handed to a worker at a time
+#   PDF_PARALLEL_MIN_PAGES      documents shorter than this are extracted inline
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pypdf").lower()
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "16"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+
+EXTRACTORS = ("pypdf", "pymupdf")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PdfExtractionError(Exception):
+    """Raised when a PDF cannot be opened by the selected extractor."""
+
+
+def _open(source, extractor):
+    """Open a PDF from bytes or a file path with the given extractor."""
+    if extractor == "pymupdf":
+        import fitz
+        if isinstance(source, (bytes, bytearray)):
+            return fitz.open(stream=bytes(source), filetype="pdf")
+        return fitz.open(source)
+    if isinstance(source, (bytes, bytearray)):
+        return PdfReader(BytesIO(source))
+    # pypdf would read a path into memory in full; a read-only mapping lets
+    # it seek through the file with pages loaded by the OS on demand
+    with open(source, "rb") as pdf_file:
+        return PdfReader(mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _pages(document, extractor):
+    return document if extractor == "pymupdf" else document.pages
+
+
+def _page_text(page, extractor):
+    return page.get_text() if extractor == "pymupdf" else page.extract_text()
+
+
+def _extract_pages(document, start, end, extractor):
+    """Yield (page_num, text, error) for pages [start, end) of an open document."""
+    pages = _pages(document, extractor)
+    for page_num in range(start, end):
+        try:
+            yield page_num, _page_text(pages[page_num], extractor), None
+        except Exception as e:
+            yield page_num, None, str(e)
+
+
+def _extract_range(source, start, end, extractor):
+    """
+    Extract pages [start, end). Runs inside worker processes, so failures on
+    individual pages are returned rather than raised.
+    """
+    return list(_extract_pages(_open(source, extractor), start, end, extractor))
+
+
+def _get_pool():
+    global _pool
+    # Ingestion workers call this concurrently; only one of them may create the pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers only import this module, not the app and its clients
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the extraction worker processes, if they were started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def count_pages(source, extractor=PDF_EXTRACTOR):
+    """Open the PDF to validate it and return its page count."""
+    if extractor not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF_EXTRACTOR setting: {extractor}")
+    try:
+        document = _open(source, extractor)
+        return len(_pages(document, extractor))
+    except Exception as e:
+        raise PdfExtractionError(str(e)) from e
+
+
+def iter_page_texts(source, page_count, extractor=PDF_EXTRACTOR):
+    """
+    Yield (page_num, text) in page order as soon as each page is extracted.
+
+    Large documents are split into page ranges that are extracted in a
+    process pool, so callers can start chunking and embedding the first
+    pages while later ones are still being parsed. Pages that fail to
+    extract are logged and skipped.
+    """
+    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS <= 1:
+        document = _open(source, extractor)
+        yield from _texts([_extract_pages(document, 0, page_count, extractor)])
+        return
+
+    # Workers read the PDF from a temporary file instead of each receiving
+    # a pickled copy of its bytes
+    temp_path = None
+    if isinstance(source, (bytes, bytearray)):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+            temp_file.write(source)
+            temp_path = source = temp_file.name
+
+    try:
+        pool = _get_pool()
+        futures = [
+            pool.submit(_extract_range, source, start, min(start + PDF_EXTRACT_PAGES_PER_TASK, page_count), extractor)
+            for start in range(0, page_count, PDF_EXTRACT_PAGES_PER_TASK)
+        ]
+        try:
+            yield from _texts(future.result() for future in futures)
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        if temp_path:
+            os.unlink(temp_path)
+
+
+def extract_pdf(source, extractor=PDF_EXTRACTOR):
+    """
+    Open and extract a whole PDF in the calling process; returns its page
+    count and the (page_num, text) of the pages that extracted. Meant for
+    callers that already spread whole documents over worker processes.
+    """
+    page_count = count_pages(source, extractor)
+    document = _open(source, extractor)
+    return page_count, list(_texts([_extract_pages(document, 0, page_count, extractor)]))
+
+
+def _texts(ranges):
+    for results in ranges:
+        for page_num, text, error in results:
+            if error is not None:
+                logger.error(f"Error processing page {page_num + 1}: {error}")
+                continue
+            yield page_num, text
@@ -1,16 +1,27 @@
 import os
-import glob
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-import chromadb
-from pypdf import PdfReader
-from pypdf.errors import PdfStreamError
-from dotenv import load_dotenv
-from google import genai
+import hashlib
+import queue
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from dataclasses import dataclass
+from itertools import zip_longest
+from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+import time
 import uuid
 import logging
-from io import BytesIO
 from .embedding_status import init_embedding_status, update_embedding_status
+from .jobs import JOB_SPOOL_DIR, JobCancelled, JobQueue, PermanentJobError, job_store
+from .embeddings import GeminiEmbeddingFunction
+from .pdf_extract import PdfExtractionError, count_pages, iter_page_texts
+from .chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_STRATEGY, chunk_text, iter_chunks
+from .vector_store import chroma_client, db, embed_fn
+from .document_index import DocumentDeleted, chunk_metadata, content_hash, delete_chunks, document_index
+from .keyword_index import keyword_index
+from .documents import delete_document
+from .answer_cache import answer_cache
+from .metrics import Gauge, chunks_total, pages_total, stage_seconds, timed
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -18,218 +29,455 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Load environment variables
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    logger.warning("GOOGLE_API_KEY not found in environment variables")
-
-
-# Custom embedding function for ChromaDB
-class GeminiEmbeddingFunction:
-    def __init__(self):
-        self.client = genai.Client(api_key=GOOGLE_API_KEY)
-        self.document_mode = True
-        
-    def __call__(self, input):
-        embedding_task = "retrieval_document" if self.document_mode else "retrieval_query"
-        response = self.client.models.embed_content(
-            model="models/text-embedding-004",
-            contents=input,
-            config={"task_type": embedding_task},
+# Chunks collected before they are embedded and written to the store together
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# Used when the app does not set app.state.max_upload_size
+DEFAULT_MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+# Allowance for multipart boundaries and part headers when checking Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+@dataclass
+class IngestResult:
+    chunks: int                          # chunks in the document's new live version
+    embedded: int                        # of which had to be embedded for this upload
+    pages_changed: Optional[int] = None  # pages that differ from the previous version, if any
+
+    @property
+    def changed(self) -> bool:
+        return self.embedded > 0 or self.pages_changed != 0
+
+    def summary(self) -> Optional[str]:
+        if self.pages_changed is None:
+            return None
+        if not self.changed:
+            return "Document unchanged"
+        return f"{self.pages_changed} pages changed, {self.embedded} of {self.chunks} chunks embedded"
+
+
+def document_fingerprint(source) -> str:
+    """Hash of a PDF and the chunking settings; equal fingerprints give identical chunks."""
+    digest = hashlib.sha256(f"{CHUNK_STRATEGY}:{CHUNK_MAX_TOKENS}:{CHUNK_OVERLAP_TOKENS}\n".encode())
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+    else:
+        with open(source, "rb") as pdf:
+            for block in iter(lambda: pdf.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def ingest_pdf(job_id, filename, source, page_count, batch_size=INGEST_BATCH_SIZE, page_texts=None):
+    """
+    Chunk and embed a PDF's pages as they come out of the extractor.
+
+    Once batch_size chunks are ready they are embedded through the
+    dispatcher (several API requests in flight) and written to Chroma in
+    one bulk add, while later pages are still being extracted. Chunks are
+    tagged with the job id so a failed or cancelled attempt can be rolled
+    back.
+
+    When the document was uploaded before, chunks whose text the live
+    version already has keep their stored vectors, so only changed pages
+    are embedded, and an identical file is not processed at all. New chunks
+    stay hidden until the whole version is swapped in at the end.
+
+    page_texts, if given, are the document's (page_num, text) pairs already
+    extracted elsewhere; otherwise pages are extracted from source here.
+    """
+    fingerprint = document_fingerprint(source)
+    previous = document_index.document(filename)
+    if previous and previous["fingerprint"] == fingerprint and previous["chunk_count"]:
+        update_embedding_status(job_id, 'processing', 95, message="Document unchanged")
+        document_index.settle_version(filename)
+        return IngestResult(previous["chunk_count"], 0, 0)
+
+    # Content hash -> ids of live chunks an unchanged page can keep
+    reusable = document_index.live_chunk_hashes(filename)
+    reused_ids = []
+    reused_metadatas = []
+    page_hashes = []
+
+    documents = []
+    metadatas = []
+    total_added = 0
+    # Chunk numbers restart on every page, as in "name (Page N, Chunk M)"
+    page_chunks = {}
+    # Seconds spent producing pages, so chunking time can be told apart
+    page_seconds = [0.0]
+
+    def add_batch(batch_docs, batch_metadatas):
+        new_docs, new_metadatas = [], []
+        for document, metadata in zip(batch_docs, batch_metadatas):
+            matches = reusable.get(metadata["content_hash"])
+            if matches:
+                reused_ids.append(matches.pop())
+                reused_metadatas.append(metadata)
+            else:
+                new_docs.append(document)
+                new_metadatas.append(metadata)
+        if not new_docs:
+            return 0
+        with timed("upload", "embed"):
+            embeddings = embed_fn.embed_documents(new_docs)
+        with timed("upload", "add"):
+            for start in range(0, len(new_docs), chroma_client.max_batch_size):
+                end = start + chroma_client.max_batch_size
+                ids = [str(uuid.uuid4()) for _ in new_docs[start:end]]
+                db.add(
+                    documents=new_docs[start:end],
+                    embeddings=embeddings[start:end],
+                    ids=ids,
+                    metadatas=new_metadatas[start:end]
+                )
+                document_index.add_chunks(ids, new_metadatas[start:end], live=False)
+                keyword_index.add_chunks(ids, new_docs[start:end])
+        chunks_total.inc(len(new_docs), "added")
+        return len(new_docs)
+
+    def pages():
+        extracted = iter(iter_page_texts(source, page_count) if page_texts is None else page_texts)
+        while True:
+            resumed = time.perf_counter()
+            with timed("upload", "extract"):
+                page = next(extracted, None)
+            if page is None:
+                page_seconds[0] += time.perf_counter() - resumed
+                return
+            page_num, text = page
+            pages_total.inc()
+            page_hashes.append(content_hash(text or ""))
+
+            if job_store.is_cancelled(job_id):
+                raise JobCancelled(job_id)
+
+            # Update progress based on page processing
+            progress = 10 + int((page_num + 1) / page_count * 85)
+            update_embedding_status(job_id, 'processing', progress, message="Creating embeddings")
+
+            page_seconds[0] += time.perf_counter() - resumed
+            if text and not text.isspace():
+                yield page_num + 1, text
+
+    def observe_chunking(started, pages_before):
+        # Time between batches, less the time spent extracting pages
+        stage_seconds.observe(
+            time.perf_counter() - started - (page_seconds[0] - pages_before), "upload", "chunk"
         )
-        return [e.values for e in response.embeddings]
 
+    batch_started, pages_before = time.perf_counter(), page_seconds[0]
+    for chunk in iter_chunks(pages()):
+        page_chunks[chunk.page_start] = page_chunks.get(chunk.page_start, 0) + 1
+        documents.append(chunk.text)
+        metadatas.append(chunk_metadata(
+            filename, chunk.page_start, page_chunks[chunk.page_start], job_id,
+            page_end=chunk.page_end, text_hash=content_hash(chunk.text)
+        ))
+
+        # Embed and store in bulk as soon as enough chunks are ready
+        if len(documents) >= batch_size:
+            observe_chunking(batch_started, pages_before)
+            total_added += add_batch(documents, metadatas)
+            documents = []
+            metadatas = []
+            batch_started, pages_before = time.perf_counter(), page_seconds[0]
+
+    observe_chunking(batch_started, pages_before)
+    if documents:
+        total_added += add_batch(documents, metadatas)
 
-# Create ChromaDB client and collection
-chroma_client = chromadb.Client()
-embed_fn = GeminiEmbeddingFunction()
-db = chroma_client.get_or_create_collection(name="document_db", embedding_function=embed_fn)
+    if job_store.is_cancelled(job_id):
+        raise JobCancelled(job_id)
+    total = total_added + len(reused_ids)
+    if total == 0:
+        return IngestResult(0, 0)
+
+    with timed("upload", "swap"):
+        size = len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+        stale = document_index.commit_version(filename, job_id, reused_ids, fingerprint, page_hashes, size)
+        chunks_total.inc(len(reused_ids), "reused")
+        # The new version is live; what follows only tidies up after it
+        try:
+            for start in range(0, len(reused_ids), chroma_client.max_batch_size):
+                end = start + chroma_client.max_batch_size
+                # Kept chunks may have moved to other pages
+                db.update(ids=reused_ids[start:end], metadatas=reused_metadatas[start:end])
+            delete_chunks(stale)
+        except Exception as e:
+            logger.error(f"Error removing the previous version of {filename}: {str(e)}")
 
+    pages_changed = None
+    if previous is not None:
+        pages_changed = sum(old != new for old, new in zip_longest(previous["page_hashes"], page_hashes))
+    return IngestResult(total, total_added, pages_changed)
 
 
-def chunk_text(text, max_length=500, overlap=50):
+def rollback_job(job_id):
+    """Remove any chunks written by an earlier or cancelled attempt of a job."""
+    delete_chunks(document_index.job_chunk_ids(job_id))
+
+
+class MultipartSpooler:
     """
-    Splits text into chunks with optional overlap.
+    Feeds a multipart/form-data request body through python-multipart's
+    streaming parser and writes the `file` part straight into a spool file,
+    so the upload is never buffered in memory or copied through a second
+    temporary file. Other form fields are ignored.
     """
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = words[i:i + max_length]
-        chunks.append(' '.join(chunk))
-        i += max_length - overlap
-    return chunks
+    def __init__(self, boundary: bytes, path: str, max_size: int, field: str = "file"):
+        self.path = path
+        self.max_size = max_size
+        self.field = field.encode()
+        self.filename = None
+        self.size = 0
+        self._spool_file = None
+        self._in_file = False
+        self._headers = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda data, start, end: self._header_field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: self._header_value.extend(data[start:end]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
 
+    def write(self, data: bytes):
+        self.parser.write(data)
 
+    def close(self):
+        if self._spool_file is not None:
+            self._spool_file.close()
 
+    def _on_part_begin(self):
+        self._headers = {}
 
-# Define a POST endpoint /api/upload/ that accepts a PDF file.
-@router.post("")
-async def upload_pdf(file: UploadFile = File(...)):
-    # Initialize embedding status
-    init_embedding_status(file.filename)
-    update_embedding_status(file.filename, 'processing', 0)
+    def _on_header_end(self):
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
 
-    try:
-        # Get the maximum file size from app state
-        max_size = 50 * 1024 * 1024  # 50MB default if not set in app state
-        
-        # Validate that the uploaded file ends in .pdf first
-        if not file.filename.endswith('.pdf'):
-            update_embedding_status(file.filename, 'error', 0, "Only PDF files are allowed")
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        # Only the first file field is kept
+        if options.get(b"name") != self.field or self.filename is not None:
+            return
+        self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        # Reject other file types before any of their content is read
+        if not self.filename.endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-        
+        self._spool_file = open(self.path, "wb")
+        self._in_file = True
+
+    def _on_part_data(self, data, start, end):
+        if not self._in_file:
+            return
+        self.size += end - start
+        if self.size > self.max_size:
+            raise HTTPException(status_code=413, detail=too_large_detail(self.max_size))
+        self._spool_file.write(memoryview(data)[start:end])
+
+    def _on_part_end(self):
+        self._in_file = False
+
+
+def too_large_detail(max_size):
+    return f"File too large. Maximum size allowed is {max_size // (1024 * 1024)}MB"
+
+
+def process_upload_job(job, page_texts=None):
+    """Job handler: ingest a spooled PDF, record the outcome and return it."""
+    job_id = job["id"]
+    try:
+        rollback_job(job_id)
+        document_index.begin_version(job["filename"], job_id)
+        update_embedding_status(job_id, 'processing', 10, message="Reading PDF pages")
+        result = ingest_pdf(
+            job_id, job["filename"], job["file_path"], job["pages_processed"], page_texts=page_texts
+        )
+    except DocumentDeleted as e:
+        # Trying again would bring the deleted document back
+        rollback_job(job_id)
+        raise PermanentJobError(str(e))
+    except Exception:
+        rollback_job(job_id)
+        document_index.settle_version(job["filename"])
+        raise
+    if result.chunks == 0:
+        document_index.settle_version(job["filename"])
+        raise PermanentJobError("No text content could be extracted from PDF")
+    # Answers based on an earlier upload of this document are now stale
+    if result.changed:
+        answer_cache.invalidate_documents([job["filename"]])
+    update_embedding_status(
+        job_id, 'complete', 100,
+        message=result.summary(),
+        chunks_processed=result.chunks
+    )
+    return result
+
+
+def remove_spool_file(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def recover_upload(job):
+    """Whether a job taken over from a stopped worker can run: its spooled upload must be here."""
+    if not job["file_path"] or not os.path.exists(job["file_path"]):
+        update_embedding_status(job["id"], 'error', job["progress"], "Upload was lost during restart")
+        return False
+    update_embedding_status(job["id"], 'pending', 0)
+    return True
+
+
+ingestion_queue = JobQueue(
+    job_store,
+    process_upload_job,
+    on_finished=lambda job: remove_spool_file(job["file_path"]),
+    on_recovered=recover_upload
+)
+
+
+Gauge("rag_ingestion_queue_depth", "Uploads waiting for an ingestion worker", lambda: ingestion_queue.depth())
+
+
+def resume_jobs():
+    """
+    Re-queue jobs left unfinished by a previous run of the server, or by
+    another worker that stopped renewing its lease. Runs again in the
+    background as leases lapse.
+    """
+    ingestion_queue.start()
+    ingestion_queue.recover()
+
+
+# DELETE /api/upload/{document_name} mirrors DELETE /api/documents/{document_name}
+router.delete("/{document_name}")(delete_document)
+
+
+# The upload endpoint reads its multipart body itself, so document it here
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+
+# Define a POST endpoint /api/upload/ that accepts a PDF file. The request
+# body is streamed straight into a spool file and validated, then ingested
+# by a background job; the response carries the job id to follow progress.
+@router.post("", status_code=202, openapi_extra=UPLOAD_OPENAPI)
+async def upload_pdf(request: Request):
+    # Get the maximum file size from app state
+    max_size = getattr(request.app.state, "max_upload_size", DEFAULT_MAX_UPLOAD_SIZE)
+
+    # Turn away uploads that announce they are too large before reading them
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=too_large_detail(max_size))
+
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data upload with a file field")
+
+    # Stream the body into a spool file as it arrives, so memory use does
+    # not grow with the file size; the job reads it from there
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    spool_path = os.path.join(JOB_SPOOL_DIR, f"upload-{uuid.uuid4()}.part")
+    spooler = MultipartSpooler(options[b"boundary"], spool_path, max_size)
+    try:
+        with timed("upload", "spool"):
+            async for data in request.stream():
+                await run_in_threadpool(spooler.write, data)
+    except HTTPException:
+        remove_spool_file(spool_path)
+        raise
+    except Exception as e:
+        logger.error(f"Error reading upload: {str(e)}")
+        remove_spool_file(spool_path)
+        raise HTTPException(
+            status_code=500,
+            detail="Error during file upload. Please try again."
+        )
+    finally:
+        spooler.close()
+
+    if spooler.filename is None:
+        raise HTTPException(status_code=422, detail="No file field in the upload")
+
+    # Create the ingestion job, which also backs the embedding status
+    job_id = await run_in_threadpool(init_embedding_status, spooler.filename)
+    file_path = os.path.join(JOB_SPOOL_DIR, f"{job_id}.pdf")
+    try:
+        os.replace(spool_path, file_path)
+
+        if spooler.size == 0:
+            await run_in_threadpool(update_embedding_status, job_id, 'error', 0, "Empty file uploaded")
+            raise HTTPException(
+                status_code=400,
+                detail="Empty file uploaded"
+            )
+
         try:
-            # Read file in chunks to avoid memory issues
-            contents = bytearray()
-            file_size = 0
-            chunk_size = 1024 * 1024  # 1MB chunks
-            
-            while True:
-                try:
-                    chunk = await file.read(chunk_size)
-                    if not chunk:
-                        break
-                    file_size += len(chunk)
-                    if file_size > max_size:
-                        update_embedding_status(file.filename, 'error', 0, "File too large")
-                        raise HTTPException(
-                            status_code=413,
-                            detail=f"File too large. Maximum size allowed is 50MB"
-                        )
-                    contents.extend(chunk)
-                except Exception as e:
-                    logger.error(f"Error reading chunk: {str(e)}")
-                    update_embedding_status(file.filename, 'error', 0, str(e))
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Error during file upload. Please try again."
-                    )
-            
-            if file_size == 0:
-                update_embedding_status(file.filename, 'error', 0, "Empty file uploaded")
+            # Open the spooled PDF to validate it and count its pages
+            with timed("upload", "validate"):
+                page_count = await run_in_threadpool(count_pages, file_path)
+            if page_count == 0:
+                await run_in_threadpool(update_embedding_status, job_id, 'error', 0, "PDF file contains no pages")
                 raise HTTPException(
                     status_code=400,
-                    detail="Empty file uploaded"
-                )
-            
-            # Create BytesIO object from contents
-            pdf_stream = BytesIO(contents)
-            
-            try:
-                # Try to read the PDF
-                pdf_reader = PdfReader(pdf_stream)
-                if len(pdf_reader.pages) == 0:
-                    update_embedding_status(file.filename, 'error', 0, "PDF file contains no pages")
-                    raise HTTPException(
-                        status_code=400,
-                        detail="PDF file contains no pages"
-                    )
-                
-                documents = []
-                document_sources = []
-                
-                # Update status to show PDF reading progress
-                update_embedding_status(file.filename, 'processing', 10, "Reading PDF pages")
-                
-                # Process each page
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        text = page.extract_text()
-                        if text and not text.isspace():
-                            # Chunk the text
-                            chunks = chunk_text(text)
-                            documents.extend(chunks)
-                            document_sources.extend([
-                                f"{file.filename} (Page {page_num+1}, Chunk {i+1})" 
-                                for i in range(len(chunks))
-                            ])
-                            
-                            # Update progress based on page processing (40% of total progress)
-                            progress = 10 + int((page_num + 1) / len(pdf_reader.pages) * 40)
-                            update_embedding_status(file.filename, 'processing', progress, "Processing PDF pages")
-                            
-                    except Exception as e:
-                        logger.error(f"Error processing page {page_num + 1}: {str(e)}")
-                        continue
-                
-                if not documents:
-                    update_embedding_status(file.filename, 'error', 0, "No text content could be extracted")
-                    raise HTTPException(
-                        status_code=400,
-                        detail="No text content could be extracted from PDF"
-                    )
-                
-                # Add to vector database in smaller batches
-                batch_size = 50  # Reduced batch size
-                total_added = 0
-                
-                while total_added < len(documents):
-                    batch_end = min(total_added + batch_size, len(documents))
-                    batch_docs = documents[total_added:batch_end]
-                    batch_sources = document_sources[total_added:batch_end]
-                    
-                    try:
-                        db.add(
-                            documents=batch_docs,
-                            ids=[str(uuid.uuid4()) for _ in batch_docs],
-                            metadatas=[{"source": source} for source in batch_sources]
-                        )
-                        
-                        # Update progress based on embedding progress (50% of total progress)
-                        progress = 50 + int((total_added + len(batch_docs)) / len(documents) * 50)
-                        update_embedding_status(file.filename, 'processing', progress, "Creating embeddings")
-                        
-                    except Exception as e:
-                        logger.error(f"Error adding batch to database: {str(e)}")
-                        update_embedding_status(file.filename, 'error', progress, str(e))
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Database error: {str(e)}"
-                        )
-                    
-                    total_added = batch_end
-                
-                # Update status to complete
-                update_embedding_status(file.filename, 'complete', 100)
-                
-                return {
-                    "filename": file.filename,
-                    "pages_processed": len(pdf_reader.pages),
-                    "chunks_processed": len(documents)
-                }
-                
-            except PdfStreamError as e:
-                logger.error(f"Error reading PDF: {str(e)}")
-                update_embedding_status(file.filename, 'error', 0, str(e))
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid PDF file: {str(e)}"
-                )
-            except Exception as e:
-                logger.error(f"Error processing PDF: {str(e)}")
-                update_embedding_status(file.filename, 'error', 0, str(e))
-                if "PDF" in str(e) or "pdf" in str(e):
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Invalid PDF file: {str(e)}"
-                    )
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error processing PDF: {str(e)}"
+                    detail="PDF file contains no pages"
                 )
-                
         except HTTPException:
             raise
-        except Exception as e:
-            logger.error(f"Error processing upload: {str(e)}", exc_info=True)
-            update_embedding_status(file.filename, 'error', 0, str(e))
+        except PdfExtractionError as e:
+            logger.error(f"Error reading PDF: {str(e)}")
+            await run_in_threadpool(update_embedding_status, job_id, 'error', 0, str(e))
             raise HTTPException(
-                status_code=500,
-                detail=str(e)
+                status_code=400,
+                detail=f"Invalid PDF file: {str(e)}"
             )
-    except Exception as e:
-        # Ensure status is updated even if an unexpected error occurs
-        update_embedding_status(file.filename, 'error', 0, str(e))
+
+        await run_in_threadpool(
+            update_embedding_status, job_id, 'pending', 0, file_path=file_path, pages_processed=page_count
+        )
+
+        try:
+            ingestion_queue.submit(job_id)
+        except queue.Full:
+            await run_in_threadpool(update_embedding_status, job_id, 'error', 0, "Ingestion queue is full")
+            remove_spool_file(file_path)
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "Too many uploads in progress. Please try again later."},
+                headers={"Retry-After": "30"}
+            )
+
+        return {
+            "job_id": job_id,
+            "filename": spooler.filename,
+            "status": "pending",
+            "pages_processed": page_count
+        }
+
+    except HTTPException:
+        remove_spool_file(file_path)
         raise
+    except Exception as e:
+        logger.error(f"Error processing upload: {str(e)}", exc_info=True)
+        remove_spool_file(file_path)
+        await run_in_threadpool(update_embedding_status, job_id, 'error', 0, str(e))
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
@@ -0,0 +1,246 @@
+from typing import Callable, Dict, List, Optional
+import importlib
+import os
+import numpy as np
+from .vector_store import db
+from .keyword_index import keyword_index
+from .document_index import document_index
+from .embedding_dispatcher import estimate_tokens
+from .metrics import timed
+
+# Retrieval settings:
+#   RETRIEVAL_MODE        'hybrid' fuses BM25 keyword hits with vector hits, 'dense' uses vectors only
+#   RETRIEVAL_CANDIDATES  candidates fetched from each retriever before re-ranking
+#   RRF_K                 reciprocal rank fusion constant; larger values flatten rank differences
+#   RERANKER              'mmr' (relevance with diversity), 'cosine' (relevance only), 'none'
+#                         (keep retrieval order) or 'package.module:function' for a custom scorer
+#   MMR_LAMBDA            weight of relevance against diversity in 'mmr'
+#   RETRIEVAL_TOP_K       most chunks put into the prompt
+#   CONTEXT_TOKEN_BUDGET  estimated tokens of context put into the prompt
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+RERANKER = os.getenv("RERANKER", "mmr")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+if RETRIEVAL_MODE not in ("hybrid", "dense"):
+    raise ValueError(f"Unknown RETRIEVAL_MODE setting: {RETRIEVAL_MODE}")
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+    """Merge ranked id lists, scoring each id by the sum of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
+
+
+def rrf_scores(rankings: List[List[str]], ids: List[str], k: int = RRF_K) -> np.ndarray:
+    positions = [{item: rank for rank, item in enumerate(ranking, start=1)} for ranking in rankings]
+    return np.array([
+        sum(1.0 / (k + ranks[item]) for ranks in positions if item in ranks)
+        for item in ids
+    ])
+
+
+def load_reranker(name: str) -> Optional[Callable]:
+    """
+    Resolve a 'package.module:function' scorer. It is called with the
+    question and the candidate texts and returns one score per text,
+    higher meaning more relevant (e.g. a CPU cross-encoder's predict).
+    """
+    if name in ("mmr", "cosine", "none"):
+        return None
+    module, _, function = name.partition(":")
+    if not function:
+        raise ValueError(f"Unknown RERANKER setting: {name}")
+    return getattr(importlib.import_module(module), function)
+
+
+custom_reranker = load_reranker(RERANKER)
+
+
+def normalize(scores: np.ndarray) -> np.ndarray:
+    """Scale scores to [0, 1] so scores from different scorers can be blended."""
+    low, high = scores.min(), scores.max()
+    if high - low < 1e-12:
+        return np.ones_like(scores, dtype=np.float64)
+    return (scores - low) / (high - low)
+
+
+def unit_rows(matrix) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def mmr(relevance: np.ndarray, embeddings: np.ndarray, k: int, weight: float = MMR_LAMBDA) -> List[int]:
+    """
+    Maximal marginal relevance: repeatedly pick the candidate maximising
+    weight * relevance - (1 - weight) * (similarity to the closest pick).
+    embeddings must be unit rows; returns candidate positions in pick order.
+    """
+    count = len(relevance)
+    k = min(k, count)
+    similarity = embeddings @ embeddings.T
+    closest = np.full(count, -np.inf)
+    available = np.ones(count, dtype=bool)
+    picked = []
+    for _ in range(k):
+        penalty = np.where(np.isfinite(closest), closest, 0.0)
+        score = np.where(available, weight * relevance - (1 - weight) * penalty, -np.inf)
+        best = int(np.argmax(score))
+        picked.append(best)
+        available[best] = False
+        closest = np.maximum(closest, similarity[:, best])
+    return picked
+
+
+def rerank(question: str, query_embedding, documents: List[str], embeddings,
+           retrieval_scores: Optional[np.ndarray] = None, method: str = RERANKER,
+           scorer: Optional[Callable] = custom_reranker) -> List[int]:
+    """
+    Order candidates for the prompt, best first; returns the positions of
+    all of them, so pack_context can pass over chunks that do not fit the
+    token budget and take lower-ranked ones instead.
+
+    Relevance is the cosine similarity to the question, or the custom
+    scorer's output, blended with retrieval_scores (e.g. fused keyword and
+    vector ranks) when given. 'mmr' then trades relevance against
+    redundancy with the chunks already picked.
+    """
+    count = len(documents)
+    if method == "none" or count <= 1:
+        return list(range(count))
+
+    vectors = unit_rows(embeddings)
+    if scorer is not None:
+        relevance = normalize(np.asarray(scorer(question, documents), dtype=np.float64))
+    else:
+        relevance = vectors @ unit_rows(query_embedding)
+    if retrieval_scores is not None:
+        relevance = (normalize(relevance) + normalize(retrieval_scores)) / 2
+
+    if method == "cosine" or scorer is not None and method != "mmr":
+        return [int(i) for i in np.argsort(-relevance, kind="stable")]
+    return mmr(relevance, vectors, count)
+
+
+def pack_context(order: List[int], documents: List[str], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 top_k: int = RETRIEVAL_TOP_K) -> List[int]:
+    """
+    Take chunks in rank order while they fit the token budget, skipping
+    any that would overflow it. The best chunk is always kept.
+    """
+    packed = []
+    used = 0
+    for position in order:
+        if len(packed) >= top_k:
+            break
+        tokens = estimate_tokens(documents[position])
+        if packed and used + tokens > token_budget:
+            continue
+        packed.append(position)
+        used += tokens
+    return packed
+
+
+def search(query_embedding, query_text: str, n_results: int = RETRIEVAL_TOP_K,
+           mode: str = RETRIEVAL_MODE, candidates: int = RETRIEVAL_CANDIDATES,
+           reranker: str = RERANKER, token_budget: int = CONTEXT_TOKEN_BUDGET) -> Dict:
+    """
+    Find the chunks to answer a question from. Over-fetches candidates from
+    the vector store (and the keyword index in hybrid mode), re-ranks them
+    locally and packs the best into the token budget. Returns a Chroma
+    query result (ids, documents, metadatas) for the single query, in
+    prompt order.
+    """
+    return search_many(
+        [query_embedding], [query_text], n_results, mode, candidates, reranker, token_budget
+    )[0]
+
+
+def search_many(query_embeddings: List, query_texts: List[str], n_results: int = RETRIEVAL_TOP_K,
+                mode: str = RETRIEVAL_MODE, candidates: int = RETRIEVAL_CANDIDATES,
+                reranker: str = RERANKER, token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict]:
+    """
+    search() for several questions at once: one multi-query vector search
+    and at most one fetch of keyword-only chunks for all of them. Returns
+    one single-query result per question.
+    """
+    if not query_embeddings:
+        return []
+    with timed("chat", "query"):
+        fetch = max(n_results, candidates)
+        dense = db.query(
+            query_embeddings=list(query_embeddings),
+            n_results=fetch,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        chunks = {}
+        for i in range(len(query_embeddings)):
+            chunks.update(
+                (chunk_id, (document, metadata, embedding))
+                for chunk_id, document, metadata, embedding in zip(
+                    dense["ids"][i], dense["documents"][i], dense["metadatas"][i], dense["embeddings"][i]
+                )
+            )
+
+        rankings = [[list(dense["ids"][i])] for i in range(len(query_embeddings))]
+        if mode == "hybrid" and not keyword_index.ready.is_set():
+            # The keyword index is still being built after a restart
+            mode = "dense"
+        if mode == "hybrid":
+            for ranking, query_text in zip(rankings, query_texts):
+                ranking.append([chunk_id for chunk_id, _ in keyword_index.search(query_text, fetch)])
+        # Skip chunks of a new document version that is not swapped in yet,
+        # and of an old one that has just been replaced
+        hidden = document_index.hidden_chunk_ids(
+            {chunk_id for ranking in rankings for ids in ranking for chunk_id in ids}
+        )
+        if hidden:
+            rankings = [
+                [[chunk_id for chunk_id in ids if chunk_id not in hidden] for ids in ranking]
+                for ranking in rankings
+            ]
+        if mode == "hybrid":
+            # Chunks found only by keyword still need their text, metadata and vector
+            missing = list({
+                chunk_id for ranking in rankings for chunk_id in ranking[1] if chunk_id not in chunks
+            })
+            if missing:
+                fetched = db.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+                chunks.update(
+                    (chunk_id, (document, metadata, embedding))
+                    for chunk_id, document, metadata, embedding in zip(
+                        fetched["ids"], fetched["documents"], fetched["metadatas"], fetched["embeddings"]
+                    )
+                )
+
+    with timed("chat", "rerank"):
+        results = []
+        for query_embedding, query_text, ranking in zip(query_embeddings, query_texts, rankings):
+            retrieval_scores = None
+            ids = ranking[0]
+            if mode == "hybrid":
+                ids = [chunk_id for chunk_id in reciprocal_rank_fusion(ranking) if chunk_id in chunks]
+                retrieval_scores = rrf_scores(ranking, ids)
+
+            documents = [chunks[chunk_id][0] for chunk_id in ids]
+            if ids:
+                order = rerank(
+                    query_text, query_embedding, documents,
+                    [chunks[chunk_id][2] for chunk_id in ids],
+                    retrieval_scores, method=reranker
+                )
+                ids = [ids[position] for position in pack_context(order, documents, token_budget, n_results)]
+
+            results.append({
+                "ids": [ids],
+                "documents": [[chunks[chunk_id][0] for chunk_id in ids]],
+                "metadatas": [[chunks[chunk_id][1] for chunk_id in ids]],
+            })
+    return results
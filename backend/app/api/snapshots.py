@@ -0,0 +1,258 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import numpy as np
+from .answer_cache import answer_cache
+from .document_index import delete_chunks, document_index
+from .embeddings import EMBEDDING_MODEL
+from .keyword_index import keyword_index
+from .vector_store import DATA_DIR, chroma_client, db
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Snapshot settings:
+#   SNAPSHOT_DIR         where snapshots are written, and looked up by name
+#   SNAPSHOT_BLOCK_SIZE  chunks per block file
+#   SNAPSHOT_LOAD        snapshot (a name in SNAPSHOT_DIR or a path) loaded at
+#                        startup when the collection is empty
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(DATA_DIR, "snapshots"))
+SNAPSHOT_BLOCK_SIZE = int(os.getenv("SNAPSHOT_BLOCK_SIZE", "50000"))
+SNAPSHOT_LOAD = os.getenv("SNAPSHOT_LOAD")
+
+# A snapshot is a directory holding, per block of chunks, the vectors as a
+# float32 .npy matrix (memory-mapped when loaded) and a JSON table of their
+# ids, texts and metadata in the same order; documents.json holds the
+# document catalog and manifest.json lists the blocks.
+SNAPSHOT_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+CATALOG_FILE = "documents.json"
+SNAPSHOT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+# Only one snapshot is written or loaded at a time
+_busy = threading.Lock()
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot cannot be loaded into this node."""
+
+
+def snapshot_path(name: str) -> str:
+    if not SNAPSHOT_NAME.match(name):
+        raise ValueError(f"Invalid snapshot name: {name}")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def read_manifest(path: str) -> Dict:
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def export_snapshot(path: str, block_size: int = SNAPSHOT_BLOCK_SIZE) -> Dict:
+    """
+    Write the collection's live chunks (ids, vectors, texts, metadata) and
+    the document catalog to a snapshot directory at path; returns its
+    manifest. Chunks staged by an unfinished upload are left out. The
+    snapshot appears at path only once it is complete.
+    """
+    start = time.perf_counter()
+    partial = f"{path}.partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+
+    blocks = []
+    dimensions = None
+    for offset in range(0, db.count(), block_size):
+        page = db.get(include=["embeddings", "documents", "metadatas"], limit=block_size, offset=offset)
+        hidden = document_index.hidden_chunk_ids(page["ids"])
+        keep = [i for i, chunk_id in enumerate(page["ids"]) if chunk_id not in hidden]
+        if not keep:
+            continue
+        vectors = np.asarray([page["embeddings"][i] for i in keep], dtype=np.float32)
+        dimensions = vectors.shape[1]
+        number = len(blocks)
+        block = {"vectors": f"vectors-{number:05d}.npy", "chunks": f"chunks-{number:05d}.json", "count": len(keep)}
+        np.save(os.path.join(partial, block["vectors"]), vectors)
+        with open(os.path.join(partial, block["chunks"]), "w", encoding="utf-8") as chunks_file:
+            json.dump({
+                "ids": [page["ids"][i] for i in keep],
+                "documents": [page["documents"][i] for i in keep],
+                "metadatas": [page["metadatas"][i] for i in keep],
+            }, chunks_file)
+        blocks.append(block)
+
+    # Versions still being ingested are not in the snapshot
+    documents = [
+        {**document, "status": "ready", "job_id": None}
+        for document in document_index.catalog() if document["chunk_count"]
+    ]
+    with open(os.path.join(partial, CATALOG_FILE), "w", encoding="utf-8") as catalog_file:
+        json.dump(documents, catalog_file)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "name": os.path.basename(path),
+        "created_at": time.time(),
+        "embedding_model": EMBEDDING_MODEL,
+        "dimensions": dimensions,
+        "chunks": sum(block["count"] for block in blocks),
+        "documents": len(documents),
+        "blocks": blocks,
+    }
+    with open(os.path.join(partial, MANIFEST_FILE), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.rename(partial, path)
+    logger.info(
+        f"Wrote snapshot {path} ({manifest['chunks']} chunks, {len(documents)} documents)"
+        f" in {time.perf_counter() - start:.1f}s"
+    )
+    return manifest
+
+
+def load_snapshot(path: str, index_keywords: bool = True) -> Dict:
+    """
+    Bulk-load a snapshot into the empty collection, along with the document
+    index and catalog (and the keyword index, unless it is rebuilt from
+    the collection afterwards anyway). No embedding calls are made.
+    Returns the snapshot's manifest.
+    """
+    manifest = read_manifest(path)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format: {manifest.get('format')}")
+    if manifest["embedding_model"] != EMBEDDING_MODEL:
+        raise SnapshotError(
+            f"Snapshot vectors are from {manifest['embedding_model']}, this node uses {EMBEDDING_MODEL}"
+        )
+    if db.count():
+        raise SnapshotError("The collection is not empty")
+
+    start = time.perf_counter()
+    added = []
+    try:
+        for block in manifest["blocks"]:
+            vectors = np.load(os.path.join(path, block["vectors"]), mmap_mode="r")
+            with open(os.path.join(path, block["chunks"]), encoding="utf-8") as chunks_file:
+                chunks = json.load(chunks_file)
+            ids, documents, metadatas = chunks["ids"], chunks["documents"], chunks["metadatas"]
+            if not len(ids) == len(documents) == len(metadatas) == len(vectors):
+                raise SnapshotError(f"Block {block['chunks']} does not match {block['vectors']}")
+            for first in range(0, len(ids), chroma_client.max_batch_size):
+                last = first + chroma_client.max_batch_size
+                added += ids[first:last]
+                db.add(
+                    ids=ids[first:last],
+                    embeddings=np.asarray(vectors[first:last]),
+                    documents=documents[first:last],
+                    metadatas=metadatas[first:last],
+                )
+                document_index.add_chunks(ids[first:last], metadatas[first:last])
+                if index_keywords:
+                    keyword_index.add_chunks(ids[first:last], documents[first:last])
+
+        with open(os.path.join(path, CATALOG_FILE), encoding="utf-8") as catalog_file:
+            catalog = json.load(catalog_file)
+        document_index.restore_catalog(catalog)
+    except Exception:
+        # Leave the collection empty again, so the load can be retried
+        logger.error(f"Loading snapshot {path} failed, removing the {len(added)} chunks it added")
+        delete_chunks(added)
+        raise
+    answer_cache.clear()
+    logger.info(
+        f"Loaded snapshot {path} ({manifest['chunks']} chunks, {manifest['documents']} documents)"
+        f" in {time.perf_counter() - start:.1f}s"
+    )
+    return manifest
+
+
+def list_snapshots() -> List[Dict]:
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(SNAPSHOT_DIR)):
+        path = os.path.join(SNAPSHOT_DIR, name)
+        if SNAPSHOT_NAME.match(name) and os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            snapshots.append(snapshot_summary(read_manifest(path)))
+    return snapshots
+
+
+def snapshot_summary(manifest: Dict) -> Dict:
+    return {name: manifest[name] for name in ("name", "created_at", "chunks", "documents", "dimensions")}
+
+
+def load_on_startup(source: Optional[str] = SNAPSHOT_LOAD):
+    """Load the SNAPSHOT_LOAD snapshot if it is set and the collection is still empty."""
+    if not source:
+        return
+    if db.count():
+        logger.info(f"Collection already has chunks, not loading snapshot {source}")
+        return
+    path = source if os.sep in source else snapshot_path(source)
+    with _busy:
+        load_snapshot(path, index_keywords=False)
+
+
+def hold_snapshot_lock():
+    if not _busy.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A snapshot is already being written or loaded")
+
+
+class SnapshotRequest(BaseModel):
+    name: Optional[str] = None
+
+
+@router.get("")
+async def get_snapshots():
+    return {"snapshots": await run_in_threadpool(list_snapshots)}
+
+
+# Write a snapshot of this node's collection into SNAPSHOT_DIR; other nodes
+# can then load it by name instead of re-embedding every document
+@router.post("", status_code=201)
+async def create_snapshot(request: Optional[SnapshotRequest] = None):
+    name = request.name if request and request.name else time.strftime("snapshot-%Y%m%d-%H%M%S")
+    try:
+        path = snapshot_path(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if os.path.exists(path):
+        raise HTTPException(status_code=409, detail=f"Snapshot '{name}' already exists")
+    hold_snapshot_lock()
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        manifest = await run_in_threadpool(export_snapshot, path)
+    finally:
+        _busy.release()
+    return snapshot_summary(manifest)
+
+
+@router.post("/{name}/load")
+async def load_named_snapshot(name: str):
+    try:
+        path = snapshot_path(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        raise HTTPException(status_code=404, detail=f"Snapshot '{name}' not found")
+    if db.count():
+        raise HTTPException(
+            status_code=409, detail="The collection already has chunks; delete its documents first"
+        )
+    hold_snapshot_lock()
+    try:
+        start = time.perf_counter()
+        manifest = await run_in_threadpool(load_snapshot, path)
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        _busy.release()
+    return {**snapshot_summary(manifest), "seconds": time.perf_counter() - start}
@@ -0,0 +1,119 @@
+import os
+import threading
+import logging
+import chromadb
+from .embeddings import GeminiEmbeddingFunction
+from .metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+# Vector store configuration:
+#   VECTOR_STORE=memory      in-process only, lost on restart (default)
+#   VECTOR_STORE=persistent  on-disk store under CHROMA_PERSIST_DIR
+#   VECTOR_STORE=http        remote Chroma server at CHROMA_HOST:CHROMA_PORT
+#   DATA_DIR                 on-disk state kept by the app itself (jobs, spooled uploads)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "memory").lower()
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "chroma_db")
+CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+DATA_DIR = os.getenv("DATA_DIR", "data")
+VECTOR_STORE_WARMUP = os.getenv("VECTOR_STORE_WARMUP", "false").lower() == "true"
+
+# HNSW index settings of the collection (defaults are Chroma's own):
+#   HNSW_SPACE            distance metric: l2, cosine or ip
+#   HNSW_M                links per vector; higher improves recall, costs memory and build time
+#   HNSW_EF_CONSTRUCTION  candidate list size while adding; higher builds a better graph, slower
+#   HNSW_EF_SEARCH        candidate list size while querying; higher improves recall, slower.
+#                         Queries never search fewer than the n_results they ask for.
+# They are fixed when the collection is created; an existing store keeps the
+# settings it was built with until it is rebuilt.
+HNSW_SPACE = os.getenv("HNSW_SPACE", "l2").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "10"))
+
+# Chroma's defaults, which collections created without settings were built with
+HNSW_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+
+if HNSW_SPACE not in ("l2", "cosine", "ip"):
+    raise ValueError(f"Unknown HNSW_SPACE setting: {HNSW_SPACE}")
+
+COLLECTION_NAME = "document_db"
+
+
+def create_chroma_client():
+    """Create the Chroma client selected by VECTOR_STORE."""
+    if VECTOR_STORE == "memory":
+        return chromadb.Client()
+    if VECTOR_STORE == "persistent":
+        logger.info(f"Using persistent vector store at {CHROMA_PERSIST_DIR}")
+        return chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+    if VECTOR_STORE == "http":
+        logger.info(f"Using Chroma server at {CHROMA_HOST}:{CHROMA_PORT}")
+        return chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    raise ValueError(f"Unknown VECTOR_STORE setting: {VECTOR_STORE}")
+
+
+def hnsw_metadata():
+    """Collection metadata carrying the HNSW_* index settings."""
+    return {
+        "hnsw:space": HNSW_SPACE,
+        "hnsw:M": HNSW_M,
+        "hnsw:construction_ef": HNSW_EF_CONSTRUCTION,
+        "hnsw:search_ef": HNSW_EF_SEARCH,
+    }
+
+
+def open_collection(client, name=COLLECTION_NAME, embedding_function=None):
+    """
+    Open the collection, creating it with the HNSW_* settings if it does not
+    exist. An existing collection is opened as it is: Chroma cannot change
+    the index of a built collection (and get_or_create_collection would only
+    overwrite its metadata), so differing settings are logged instead.
+    """
+    settings = hnsw_metadata()
+    try:
+        collection = client.get_collection(name=name, embedding_function=embedding_function)
+    except Exception:
+        # Missing (a remote server reports it as a plain error); any other
+        # failure is raised again by the create call
+        return client.get_or_create_collection(
+            name=name, embedding_function=embedding_function, metadata=settings
+        )
+    built = {**HNSW_DEFAULTS, **(collection.metadata or {})}
+    changed = {key: value for key, value in settings.items() if built[key] != value}
+    if changed:
+        logger.warning(
+            f"Collection {name} was built with other index settings than configured "
+            f"({', '.join(f'{key}={built[key]}' for key in changed)}); rebuild the store to apply them"
+        )
+    return collection
+
+
+# Opening the collection only reads its catalog entry. A persistent HNSW index
+# is loaded from disk on first use, so startup time does not grow with corpus
+# size; warm_up() can pay that cost in the background instead of on the first
+# user query.
+chroma_client = create_chroma_client()
+embed_fn = GeminiEmbeddingFunction()
+db = open_collection(chroma_client, embedding_function=embed_fn)
+
+Gauge("rag_collection_chunks", "Chunks stored in the vector collection", db.count)
+
+
+def warm_up():
+    """Load the vector index into memory by running a throwaway query."""
+    try:
+        sample = db.peek(limit=1)
+        if not sample["embeddings"]:
+            return
+        db.query(query_embeddings=[sample["embeddings"][0]], n_results=1, include=[])
+        logger.info(f"Vector store warmed up ({db.count()} chunks)")
+    except Exception as e:
+        logger.error(f"Error warming up vector store: {str(e)}")
+
+
+def start_warm_up():
+    """Warm up the vector index on a background thread if enabled."""
+    if VECTOR_STORE_WARMUP and VECTOR_STORE != "memory":
+        threading.Thread(target=warm_up, name="vector-store-warmup", daemon=True).start()
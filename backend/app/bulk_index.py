@@ -0,0 +1,263 @@
+"""
+Offline bulk indexer: ingest a directory of PDFs straight into the vector
+store, without going through POST /api/upload.
+
+    cd backend
+    VECTOR_STORE=persistent python -m app.bulk_index ../pdfs --workers 8
+
+PDFs are parsed in a pool of worker processes. Several documents are then
+chunked, embedded and written at once by the same ingest code the upload
+jobs run. Their embedding requests share the dispatcher's
+EMBEDDING_CONCURRENCY and rate limits, like concurrent uploads do. Each
+file gets an ingestion job, so its progress shows in the job API.
+
+Finished files are appended to a manifest (by default .bulk-index.jsonl in
+the directory). A later run skips files whose size and modification time
+still match their entry, so an interrupted run resumes where it stopped.
+Files that failed are tried again.
+
+The indexer writes the vector store, document index and job store
+directly, so the server must be stopped while it runs: a running server's
+keyword index and answer cache would not see the new chunks, and a
+persistent Chroma store is not safe to share between processes. The two
+take the store lock (STORE_LOCK_PATH, next to the document index) in
+conflicting modes, so neither starts while the other holds it. Start the
+server again afterwards; it rebuilds its keyword index from the store.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from app.api.pdf_extract import EXTRACTORS, PDF_EXTRACTOR, extract_pdf
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".bulk-index.jsonl"
+
+
+def find_pdfs(root: Path) -> List[Path]:
+    """PDF files under root, in a stable order."""
+    found = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        found += [Path(directory) / name for name in sorted(files) if name.lower().endswith(".pdf")]
+    return found
+
+
+class Manifest:
+    """
+    Append-only JSON-lines record of the files a bulk run has finished,
+    keyed by their path relative to the indexed directory; the last entry
+    for a path wins.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as manifest:
+                for line in manifest:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short when an earlier run was killed
+                        continue
+                    self.entries[entry["path"]] = entry
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not path.read_bytes().endswith(b"\n"):
+            self._file.write("\n")
+
+    def is_done(self, relative: str, stat: os.stat_result) -> bool:
+        entry = self.entries.get(relative)
+        return (
+            entry is not None and entry["status"] == "done"
+            and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+        )
+
+    def record(self, relative: str, stat: os.stat_result, status: str, **fields):
+        entry = {"path": relative, "size": stat.st_size, "mtime": stat.st_mtime, "status": status, **fields}
+        with self._lock:
+            self.entries[relative] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+@dataclass
+class BulkIndexStats:
+    files: int = 0     # files indexed by this run
+    chunks: int = 0    # chunks in their documents
+    embedded: int = 0  # of which had to be embedded
+    skipped: int = 0   # files the manifest already had
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Indexed {self.files} files ({self.chunks} chunks, {self.embedded} embedded) in {self.seconds:.1f}s: "
+            f"{self.files_per_second:.2f} files/s, {self.chunks_per_second:.1f} chunks/s; "
+            f"{self.skipped} already indexed, {self.failed} failed"
+        )
+
+
+def bulk_index(root, manifest_path: Optional[Path] = None, workers: int = os.cpu_count() or 1,
+               ingests: Optional[int] = None, extractor: str = PDF_EXTRACTOR) -> BulkIndexStats:
+    """
+    Index every PDF under root that the manifest does not have yet.
+    workers processes extract PDFs while up to ingests documents (default
+    EMBEDDING_CONCURRENCY) are chunked, embedded and written at once. The
+    caller must keep servers off the stores meanwhile (see main).
+    """
+    # The app's modules open the stores and API clients; they are imported
+    # here so that the spawned extraction workers, which import this
+    # module, do not
+    from app.api.embedding_dispatcher import EMBEDDING_CONCURRENCY
+    from app.api.embedding_status import init_embedding_status, update_embedding_status
+    from app.api.jobs import JOB_LEASE, WORKER_ID, job_store
+    from app.api.pdf_upload import process_upload_job
+
+    root = Path(root)
+    ingests = ingests or EMBEDDING_CONCURRENCY
+    manifest = Manifest(Path(manifest_path) if manifest_path else root / MANIFEST_NAME)
+    stats = BulkIndexStats()
+    stats_lock = threading.Lock()
+
+    pending = []
+    names = {}
+    for path in find_pdfs(root):
+        relative, stat = path.relative_to(root).as_posix(), path.stat()
+        if manifest.is_done(relative, stat):
+            stats.skipped += 1
+        elif path.name in names:
+            # Documents are named by their file name, as uploads are
+            logger.error(f"Skipping {relative}: {names[path.name]} has the same name")
+            manifest.record(relative, stat, "error", error=f"Same name as {names[path.name]}")
+            stats.failed += 1
+        else:
+            names[path.name] = relative
+            pending.append((path, relative, stat))
+    duplicates = stats.failed
+
+    def ingest(path, relative, stat, extraction):
+        started = time.perf_counter()
+        job_id = init_embedding_status(path.name)
+        try:
+            page_count, page_texts = extraction.result()
+            job_store.update(job_id, status="processing", attempts=1, pages_processed=page_count)
+            result = process_upload_job(
+                {**job_store.get(job_id), "file_path": str(path)}, page_texts
+            )
+        except Exception as e:
+            logger.error(f"Error indexing {relative}: {str(e)}")
+            update_embedding_status(job_id, "error", 0, str(e))
+            manifest.record(relative, stat, "error", error=str(e))
+            with stats_lock:
+                stats.failed += 1
+            return
+        manifest.record(
+            relative, stat, "done", filename=path.name, job_id=job_id, chunks=result.chunks,
+            embedded=result.embedded, seconds=round(time.perf_counter() - started, 3)
+        )
+        with stats_lock:
+            stats.files += 1
+            stats.chunks += result.chunks
+            stats.embedded += result.embedded
+            done = stats.files + stats.failed - duplicates
+        logger.info(f"[{done}/{len(pending)}] {relative}: {result.chunks} chunks, {result.embedded} embedded")
+
+    # Jobs are held under this process's worker id; keep their leases so
+    # that a running server does not take them over
+    stopped = threading.Event()
+
+    def keep_leases():
+        while not stopped.wait(JOB_LEASE / 3):
+            try:
+                job_store.renew(WORKER_ID, JOB_LEASE)
+            except Exception as e:
+                logger.error(f"Error renewing job leases: {str(e)}")
+
+    # Extracted documents waiting for an ingest slot are held in memory, so
+    # only a few are extracted ahead
+    ahead = threading.BoundedSemaphore(workers + ingests)
+    start = time.perf_counter()
+    lease_keeper = threading.Thread(target=keep_leases, name="bulk-index-leases", daemon=True)
+    lease_keeper.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool, \
+                ThreadPoolExecutor(max_workers=ingests, thread_name_prefix="bulk-ingest") as ingest_pool:
+            for path, relative, stat in pending:
+                ahead.acquire()
+                extraction = pool.submit(extract_pdf, str(path), extractor)
+                ingest_pool.submit(ingest, path, relative, stat, extraction).add_done_callback(
+                    lambda _: ahead.release()
+                )
+    finally:
+        stopped.set()
+        manifest.close()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path, help="Directory searched for PDFs, including subdirectories")
+    parser.add_argument("--manifest", type=Path, help=f"Manifest file (default: DIRECTORY/{MANIFEST_NAME})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="PDF extraction processes")
+    parser.add_argument("--ingests", type=int, help="Documents embedded and written at once "
+                                                    "(default: EMBEDDING_CONCURRENCY)")
+    parser.add_argument("--extractor", choices=EXTRACTORS, default=PDF_EXTRACTOR)
+    parser.add_argument("--verbose", action="store_true", help="Log the app's debug output too")
+    args = parser.parse_args(argv)
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+
+    # Before the app's modules, which would configure debug logging
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    from app.api import vector_store
+    from app.api.document_index import StoreInUse, lock_store, rebuild_document_index
+    from app.api.gemini_client import gemini
+
+    if vector_store.VECTOR_STORE == "memory":
+        parser.error("VECTOR_STORE=memory would lose the index on exit; use persistent or http")
+    try:
+        store_lock = lock_store(exclusive=True)
+    except StoreInUse as e:
+        parser.error(str(e))
+
+    gemini.start()
+    try:
+        # As at server startup, so the document index matches the store
+        rebuild_document_index()
+        stats = bulk_index(args.directory, args.manifest, args.workers, args.ingests, args.extractor)
+    finally:
+        gemini.close()
+        if store_lock:
+            store_lock.close()
+    print(stats.summary())
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
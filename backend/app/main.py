@@ -1,6 +1,10 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import chat, pdf_upload, documents, embedding_status
+from app.api import chat, pdf_upload, documents, document_index, embedding_status, embedding_cache, answer_cache, jobs, keyword_index, snapshots, vector_store
+from app.api.gemini_client import gemini
+from app.api import metrics
+from app.api.pdf_extract import shutdown_pool
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 
@@ -10,7 +14,24 @@ class CustomHeaderMiddleware(BaseHTTPMiddleware):
         response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
         return response
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Refuse to start while the bulk indexer is writing the stores
+    store_lock = document_index.lock_store(exclusive=False)
+    gemini.start()
+    snapshots.load_on_startup()
+    vector_store.start_warm_up()
+    document_index.rebuild_document_index()
+    keyword_index.start_rebuild()
+    pdf_upload.resume_jobs()
+    jobs.job_store.start_sweeper()
+    yield
+    gemini.close()
+    shutdown_pool()
+    if store_lock:
+        store_lock.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure for larger file uploads
 app.add_middleware(CustomHeaderMiddleware)
@@ -32,6 +53,11 @@ app.include_router(chat.router, prefix="/api/chat")
 app.include_router(pdf_upload.router, prefix="/api/upload")
 app.include_router(documents.router, prefix="/api/documents")
 app.include_router(embedding_status.router, prefix="/api/embedding-status")
+app.include_router(embedding_cache.router, prefix="/api/embedding-cache")
+app.include_router(answer_cache.router, prefix="/api/answer-cache")
+app.include_router(jobs.router, prefix="/api/jobs")
+app.include_router(snapshots.router, prefix="/api/admin/snapshots")
+app.include_router(metrics.router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,246 @@
+"""
+Vector index recall, latency and memory benchmark.
+
+Generates clustered synthetic embeddings, finds each query's exact top k by
+brute force, then measures for every index setting:
+
+  * HNSW (the hnswlib build Chroma's collection index uses) for each M and
+    ef_construction, queried at each ef_search
+  * a flat scan over compact float16 or int8 (per-vector scale) copies of
+    the vectors, re-scoring the best candidates exactly with the full
+    precision vectors, which are read from a memory-mapped .npy file
+
+and reports recall@k, single-query p50/p95 latency, build time and the
+anonymous memory the index holds (file-backed pages of the memory-mapped
+vectors are left out). Every index is built in a forked child process so
+memory does not carry over between settings.
+
+Usage:
+    python benchmarks/bench_ann.py --sizes 100000 1000000 --m 16 32 --ef-search 10 50 100
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import hnswlib
+import numpy as np
+
+EMBEDDING_DIM = 768
+BLOCK_SIZE = 65536
+CLUSTERS = 1000
+
+
+def rss_anon_mb():
+    """Anonymous resident memory of this process (Linux), or 0 if unknown."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def unit_rows(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def synthetic_vectors(path, size, centers, rng):
+    """Unit vectors scattered around cluster centers, written to a .npy file."""
+    vectors = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(size, EMBEDDING_DIM))
+    for start in range(0, size, BLOCK_SIZE):
+        count = min(BLOCK_SIZE, size - start)
+        block = centers[rng.integers(0, len(centers), count)]
+        block += rng.standard_normal((count, EMBEDDING_DIM), dtype=np.float32) * 0.05
+        vectors[start:start + count] = unit_rows(block)
+    vectors.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def exact_top_k(vectors, queries, k):
+    """Ids of each query's k most similar vectors, by blocks."""
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(vectors), BLOCK_SIZE):
+        scores = queries @ np.asarray(vectors[start:start + BLOCK_SIZE]).T
+        top = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+        best_scores = np.hstack([best_scores, np.take_along_axis(scores, top, 1)])
+        best_ids = np.hstack([best_ids, top + start])
+        keep = np.argpartition(-best_scores, min(k, best_scores.shape[1]) - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(best_scores, keep, 1)
+        best_ids = np.take_along_axis(best_ids, keep, 1)
+    return best_ids
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def latency(run, queries):
+    """Run each query on its own; returns the results and p50/p95 in ms."""
+    results, times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(run(query))
+        times.append((time.perf_counter() - start) * 1000)
+    return results, float(np.percentile(times, 50)), float(np.percentile(times, 95))
+
+
+class CompactVectors:
+    """
+    Flat index over float16 or int8 copies of the vectors. int8 keeps one
+    float32 scale per vector (symmetric, max |x| maps to 127). A search
+    scores every vector approximately and re-scores the best candidates
+    with the exact vectors.
+    """
+
+    def __init__(self, vectors, dtype):
+        self.vectors = vectors
+        self.dtype = dtype
+        self.codes = np.empty(vectors.shape, dtype=np.float16 if dtype == "float16" else np.int8)
+        self.scales = np.ones(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), BLOCK_SIZE):
+            block = np.asarray(vectors[start:start + BLOCK_SIZE])
+            if dtype == "int8":
+                scales = np.abs(block).max(axis=1) / 127
+                scales[scales == 0] = 1
+                self.scales[start:start + len(block)] = scales
+                block = np.round(block / scales[:, None])
+            self.codes[start:start + len(block)] = block
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.dtype == "int8" else 0)
+
+    def search(self, query, k, candidates):
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), BLOCK_SIZE):
+            block = self.codes[start:start + BLOCK_SIZE].astype(np.float32)
+            scores[start:start + len(block)] = block @ query
+        if self.dtype == "int8":
+            scores *= self.scales
+        candidates = min(candidates, len(scores))
+        shortlist = np.sort(np.argpartition(-scores, candidates - 1)[:candidates])
+        exact = np.asarray(self.vectors[shortlist]) @ query
+        return shortlist[np.argsort(-exact)[:k]]
+
+
+def measure_hnsw(path, queries, truth, args, m, ef_construction, pipe):
+    vectors = np.load(path, mmap_mode="r")
+    before = rss_anon_mb()
+    start = time.perf_counter()
+    index = hnswlib.Index(space=args.space, dim=EMBEDDING_DIM)
+    index.init_index(max_elements=len(vectors), ef_construction=ef_construction, M=m)
+    for offset in range(0, len(vectors), BLOCK_SIZE):
+        block = np.asarray(vectors[offset:offset + BLOCK_SIZE])
+        index.add_items(block, np.arange(offset, offset + len(block)))
+    build_s = time.perf_counter() - start
+    memory_mb = rss_anon_mb() - before
+
+    rows = []
+    for ef_search in args.ef_search:
+        index.set_ef(ef_search)
+        found, p50, p95 = latency(lambda query: index.knn_query(query, k=args.k)[0][0], queries)
+        rows.append({
+            "index": "hnsw", "M": m, "ef_construction": ef_construction, "ef_search": ef_search,
+            "recall": recall(found, truth), "p50_ms": p50, "p95_ms": p95,
+            "build_s": build_s, "memory_mb": memory_mb,
+        })
+    pipe.send(rows)
+
+
+def measure_compact(path, queries, truth, args, dtype, pipe):
+    vectors = np.load(path, mmap_mode="r")
+    before = rss_anon_mb()
+    start = time.perf_counter()
+    index = CompactVectors(vectors, dtype)
+    build_s = time.perf_counter() - start
+    memory_mb = rss_anon_mb() - before
+
+    rows = []
+    for candidates in args.rescore:
+        found, p50, p95 = latency(lambda query: index.search(query, args.k, candidates), queries)
+        rows.append({
+            "index": dtype, "rescore": candidates,
+            "recall": recall(found, truth), "p50_ms": p50, "p95_ms": p95,
+            "build_s": build_s, "memory_mb": memory_mb, "codes_mb": index.nbytes / 2 ** 20,
+        })
+    pipe.send(rows)
+
+
+def in_child(target, *args):
+    """Run target in a forked process; it sends its result rows down a pipe."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context("fork").Process(target=target, args=(*args, sender))
+    process.start()
+    sender.close()
+    rows = receiver.recv()
+    process.join()
+    return rows
+
+
+def describe(row):
+    if row["index"] == "hnsw":
+        setting = f"M={row['M']:<3} ef_construction={row['ef_construction']:<4} ef_search={row['ef_search']:<4}"
+    else:
+        setting = f"re-score top {row['rescore']:<5}"
+    return f"{row['index']:<8} {setting:<48}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"], default="cosine")
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--quantization", nargs="*", choices=["float16", "int8"], default=["float16", "int8"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[50, 200],
+                        help="Candidates re-scored exactly by the compact indexes")
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = unit_rows(rng.standard_normal((CLUSTERS, EMBEDDING_DIM), dtype=np.float32))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"vectors-{size}.npy")
+            vectors = synthetic_vectors(path, size, centers, rng)
+            queries = unit_rows(
+                centers[rng.integers(0, CLUSTERS, args.queries)]
+                + rng.standard_normal((args.queries, EMBEDDING_DIM), dtype=np.float32) * 0.05
+            )
+            truth = exact_top_k(vectors, queries, args.k)
+            print(f"{size} vectors, {size * EMBEDDING_DIM * 4 / 2 ** 20:.0f} MB at float32")
+
+            rows = []
+            for m in args.m:
+                for ef_construction in args.ef_construction:
+                    rows += in_child(measure_hnsw, path, queries, truth, args, m, ef_construction)
+            for dtype in args.quantization:
+                rows += in_child(measure_compact, path, queries, truth, args, dtype)
+            for row in rows:
+                row["vectors"] = size
+                results.append(row)
+                print(
+                    f"  {describe(row)} recall@{args.k} {row['recall']:.3f}  "
+                    f"p50 {row['p50_ms']:7.2f}ms  p95 {row['p95_ms']:7.2f}ms  "
+                    f"build {row['build_s']:7.1f}s  memory {row['memory_mb']:8.0f}MB"
+                )
+            del vectors
+            os.remove(path)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Chat load benchmark with a stubbed Gemini.
+
+Embedding and generation calls are replaced by stubs that sleep for a fixed
+latency, so the numbers reflect how the chat pipeline schedules blocking work
+rather than network conditions. For each concurrency level the benchmark fires
+that many simultaneous /api/chat requests (repeated for several rounds) while
+probing /health, and reports p50/p99 latencies for both.
+
+Usage:
+    python benchmarks/bench_chat.py --levels 1 2 4 8 16 32 --gen-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark_key")
+os.environ.setdefault("JOB_STORE_PATH", ":memory:")
+# Measure the pipeline itself rather than embedding cache hits
+os.environ.setdefault("EMBEDDING_CACHE_SIZE", "0")
+os.environ.setdefault("ANSWER_CACHE_SIZE", "0")
+
+import httpx
+
+EMBEDDING_DIM = 768
+
+
+class StubEmbeddingFunction:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __call__(self, texts, task_type):
+        time.sleep(self.latency)
+        return [[1.0] * EMBEDDING_DIM for _ in texts]
+
+
+class StubGenerateResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, model, contents):
+        time.sleep(self.latency)
+        return StubGenerateResponse("Stubbed answer.")
+
+
+class StubGeminiClient:
+    def __init__(self, latency):
+        self.models = StubModels(latency)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def timed_request(client, method, url, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def probe_health(client, stop, latencies):
+    while not stop.is_set():
+        latencies.append(await timed_request(client, "GET", "/health"))
+        await asyncio.sleep(0.01)
+
+
+async def run_level(client, concurrency, rounds):
+    chat_latencies = []
+    health_latencies = []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe_health(client, stop, health_latencies))
+
+    for _ in range(rounds):
+        chat_latencies.extend(await asyncio.gather(*[
+            timed_request(client, "POST", "/api/chat", json={"query": "What is this about?"})
+            for _ in range(concurrency)
+        ]))
+
+    stop.set()
+    await prober
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(chat_latencies),
+        "chat_p50_ms": percentile(chat_latencies, 50) * 1000,
+        "chat_p99_ms": percentile(chat_latencies, 99) * 1000,
+        "chat_mean_ms": statistics.mean(chat_latencies) * 1000,
+        "health_p50_ms": percentile(health_latencies, 50) * 1000,
+        "health_p99_ms": percentile(health_latencies, 99) * 1000,
+    }
+
+
+async def run_benchmark(args):
+    from app.main import app
+    from app.api.pdf_upload import db
+
+    db.add(
+        documents=[f"Benchmark chunk {i}" for i in range(10)],
+        ids=[f"bench-{i}" for i in range(10)],
+        metadatas=[{"source": f"bench.pdf (Page 1, Chunk {i + 1})"} for i in range(10)],
+    )
+
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for level in args.levels:
+            results.append(await run_level(client, level, args.rounds))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--gen-latency", type=float, default=0.5)
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with patch("google.genai.Client", return_value=StubGeminiClient(args.gen_latency)), \
+            patch("app.api.pdf_upload.GeminiEmbeddingFunction._embed_content",
+                  new=StubEmbeddingFunction(args.embed_latency)):
+        results = asyncio.run(run_benchmark(args))
+
+    print(f"{'conc':>5} {'reqs':>5} {'chat p50':>10} {'chat p99':>10} {'health p50':>11} {'health p99':>11}")
+    for row in results:
+        print(
+            f"{row['concurrency']:>5} {row['requests']:>5} "
+            f"{row['chat_p50_ms']:>8.1f}ms {row['chat_p99_ms']:>8.1f}ms "
+            f"{row['health_p50_ms']:>9.1f}ms {row['health_p99_ms']:>9.1f}ms"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
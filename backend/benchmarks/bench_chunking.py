@@ -0,0 +1,117 @@
+"""
+Chunking throughput benchmark.
+
+Generates synthetic page text and measures chunks/s and MB/s for the
+page-by-page chunk_text, each iter_chunks strategy, and a per-word loop that
+packs the same token budgets as the 'tokens' strategy without cumsum/searchsorted.
+Throughput is also reported relative to chunk_text, the original function.
+
+Usage:
+    python benchmarks/bench_chunking.py --pages 500 --words-per-page 800
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark_key")
+
+from app.api.chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, chunk_text, iter_chunks
+
+
+def loop_pack_tokens(pages, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Token-budget packing one word at a time, for comparison with UnitPacker."""
+    words, costs = [], []
+    chunks = 0
+    for _, text in pages:
+        for word in text.split():
+            cost = max(1, (len(word) + 3) // 4)
+            if costs and sum(costs) + cost > max_tokens:
+                ' '.join(words)
+                chunks += 1
+                carried = 0
+                keep = 0
+                while keep < len(costs) and carried + costs[-1 - keep] <= overlap_tokens:
+                    carried += costs[-1 - keep]
+                    keep += 1
+                words, costs = (words[-keep:], costs[-keep:]) if keep else ([], [])
+            words.append(word)
+            costs.append(cost)
+    return chunks + bool(words)
+
+
+def synthetic_pages(pages, words_per_page, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 11)))
+        for _ in range(5000)
+    ]
+    result = []
+    for page in range(pages):
+        lines = [f"{page + 1}.1 Section Heading"]
+        words = rng.choices(vocabulary, k=words_per_page)
+        for start in range(0, words_per_page, 12):
+            line = " ".join(words[start:start + 12])
+            lines.append(line.capitalize() + ("." if rng.random() < 0.5 else ""))
+        result.append((page + 1, "\n".join(lines)))
+    return result
+
+
+def measure(name, func, total_bytes, repeat):
+    best = float("inf")
+    chunks = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = func()
+        best = min(best, time.perf_counter() - start)
+    return {
+        "method": name,
+        "chunks": chunks,
+        "seconds": best,
+        "chunks_per_second": chunks / best,
+        "mb_per_second": total_bytes / best / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--words-per-page", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.pages, args.words_per_page)
+    total_bytes = sum(len(text) for _, text in pages)
+
+    methods = [
+        ("chunk_text", lambda: sum(len(chunk_text(text)) for _, text in pages)),
+        ("iter_chunks words", lambda: sum(1 for _ in iter_chunks(pages, "words"))),
+        ("iter_chunks tokens", lambda: sum(1 for _ in iter_chunks(pages, "tokens"))),
+        ("iter_chunks sentences", lambda: sum(1 for _ in iter_chunks(pages, "sentences"))),
+        ("per-word token loop", lambda: loop_pack_tokens(pages)),
+    ]
+    results = [measure(name, func, total_bytes, args.repeat) for name, func in methods]
+
+    baseline = results[0]["mb_per_second"]
+    for row in results:
+        row["vs_chunk_text"] = row["mb_per_second"] / baseline
+
+    print(f"{args.pages} pages, {total_bytes / 1e6:.1f} MB of text")
+    for row in results:
+        print(
+            f"{row['method']:<26} {row['chunks']:>7} chunks  "
+            f"{row['chunks_per_second']:>10.0f} chunks/s  {row['mb_per_second']:>7.1f} MB/s  "
+            f"{row['vs_chunk_text']:>5.2f}x chunk_text"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Embedding dispatcher throughput benchmark.
+
+Embeds a synthetic document's chunks through the EmbeddingDispatcher with a
+stubbed embedding call that sleeps for a fixed latency per request and can
+inject 429 responses, and reports chunks/s for each concurrency setting.
+
+Usage:
+    python benchmarks/bench_embed.py --chunks 5000 --concurrency 1 2 4 8 16
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark_key")
+
+from app.api.embedding_dispatcher import EmbeddingDispatcher
+
+EMBEDDING_DIM = 768
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class StubEmbedder:
+    def __init__(self, latency, error_rate):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts, task_type):
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            if random.random() < self.error_rate:
+                self.rejected += 1
+                raise RateLimited("429 Resource exhausted")
+        return [[0.0] * EMBEDDING_DIM for _ in texts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--words-per-chunk", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per embedding request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rpm", type=float, default=1_000_000)
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    chunk = " ".join(["word"] * args.words_per_chunk)
+    texts = [f"{i} {chunk}" for i in range(args.chunks)]
+
+    results = []
+    for concurrency in args.concurrency:
+        stub = StubEmbedder(args.latency, args.error_rate)
+        dispatcher = EmbeddingDispatcher(
+            concurrency=concurrency,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=1e12,
+            retry_delay=0.01,
+        )
+        start = time.perf_counter()
+        vectors = dispatcher.embed(texts, "retrieval_document", stub)
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == len(texts)
+
+        row = {
+            "concurrency": concurrency,
+            "chunks": len(texts),
+            "requests": stub.requests,
+            "rejected": stub.rejected,
+            "seconds": elapsed,
+            "chunks_per_second": len(texts) / elapsed,
+        }
+        results.append(row)
+        print(
+            f"concurrency {concurrency:>3}: {row['chunks_per_second']:9.1f} chunks/s "
+            f"({row['requests']} requests, {row['rejected']} rejected, {elapsed:.2f}s)"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Re-ranking cost benchmark.
+
+Times the local re-rank stage of chat retrieval (cosine and MMR over the
+over-fetched candidates, plus packing into the token budget) per query, and
+compares prompt context size with the previous fixed top 3 chunks.
+
+Usage:
+    python benchmarks/bench_rerank.py --candidates 20 50 100 --queries 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark_key")
+
+from app.api.embedding_dispatcher import estimate_tokens
+from app.api.retrieval import CONTEXT_TOKEN_BUDGET, RETRIEVAL_TOP_K, pack_context, rerank
+
+EMBEDDING_DIM = 768
+
+
+def synthetic_candidates(count, rng):
+    """
+    Candidate chunks shaped like the default 500-word chunks (with some short
+    end-of-page chunks), with vectors clustered around the query.
+    """
+    query = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    embeddings = query + rng.standard_normal((count, EMBEDDING_DIM)).astype(np.float32) * 1.5
+    words = [int(rng.integers(50, 500)) if rng.random() < 0.2 else 500 for _ in range(count)]
+    documents = [" ".join("x" * int(n) for n in rng.integers(2, 10, size=length)) for length in words]
+    retrieval_scores = 1.0 / (60 + np.arange(1, count + 1))
+    return query, documents, embeddings, retrieval_scores
+
+
+def measure(method, candidates, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = [synthetic_candidates(candidates, rng) for _ in range(queries)]
+    rerank_seconds = []
+    packed_tokens = []
+    top3_tokens = []
+    for query, documents, embeddings, retrieval_scores in samples:
+        start = time.perf_counter()
+        order = rerank("question", query, documents, embeddings, retrieval_scores, method=method)
+        packed = pack_context(order, documents)
+        rerank_seconds.append(time.perf_counter() - start)
+        packed_tokens.append(sum(estimate_tokens(documents[i]) for i in packed))
+        top3_tokens.append(sum(estimate_tokens(document) for document in documents[:3]))
+    return {
+        "method": method,
+        "candidates": candidates,
+        "rerank_us_p50": float(np.percentile(rerank_seconds, 50) * 1e6),
+        "rerank_us_p99": float(np.percentile(rerank_seconds, 99) * 1e6),
+        "context_tokens_top3": float(np.mean(top3_tokens)),
+        "context_tokens_packed": float(np.mean(packed_tokens)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = [
+        measure(method, candidates, args.queries)
+        for candidates in args.candidates
+        for method in ("cosine", "mmr")
+    ]
+
+    print(f"top_k={RETRIEVAL_TOP_K} budget={CONTEXT_TOKEN_BUDGET} tokens, {args.queries} queries")
+    print(f"{'method':>7} {'cands':>6} {'p50':>10} {'p99':>10} {'top-3 tokens':>13} {'packed tokens':>14}")
+    for row in results:
+        print(
+            f"{row['method']:>7} {row['candidates']:>6} {row['rerank_us_p50']:>8.0f}us "
+            f"{row['rerank_us_p99']:>8.0f}us {row['context_tokens_top3']:>13.0f} {row['context_tokens_packed']:>14.0f}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Snapshot load benchmark.
+
+Writes synthetic snapshots of increasing size in the app's snapshot format,
+then loads each into an empty vector store in a fresh interpreter, as a new
+node bootstrapping from SNAPSHOT_LOAD would. Reports the time to read the
+snapshot (memory-mapped vector blocks and chunk tables) on its own, the
+full load into the collection, document and keyword indexes, chunks/s,
+and the first query afterwards. Loading makes no embedding calls.
+
+HNSW_* settings are passed through to the loading process, so the effect
+of e.g. a lower HNSW_EF_CONSTRUCTION on load time can be compared.
+
+Usage:
+    python benchmarks/bench_snapshot.py --sizes 10000 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+EMBEDDING_DIM = 768
+BLOCK_SIZE = 50000
+WORDS_PER_CHUNK = 500
+
+PROBE = """
+import json, os, sys, time
+import numpy as np
+start = time.perf_counter()
+from app.api import snapshots
+from app.api.vector_store import db
+imported = time.perf_counter()
+
+path = sys.argv[1]
+manifest = snapshots.read_manifest(path)
+for block in manifest["blocks"]:
+    np.asarray(np.load(os.path.join(path, block["vectors"]), mmap_mode="r")).sum()
+    with open(os.path.join(path, block["chunks"])) as chunks_file:
+        json.load(chunks_file)
+read = time.perf_counter()
+
+snapshots.load_snapshot(path)
+loaded = time.perf_counter()
+db.query(query_embeddings=[[0.1] * %(dim)d], n_results=5, include=["metadatas"])
+queried = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "read_s": read - imported,
+    "load_s": loaded - read,
+    "first_query_s": queried - loaded,
+    "chunks": db.count(),
+}))
+"""
+
+
+def write_snapshot(path, size, rng):
+    """A snapshot of size synthetic chunks spread over documents of 100 chunks."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark_key")
+    from app.api.document_index import chunk_metadata, content_hash, document_id
+    from app.api.embeddings import EMBEDDING_MODEL
+    from app.api.snapshots import CATALOG_FILE, MANIFEST_FILE, SNAPSHOT_FORMAT
+
+    path.mkdir(parents=True)
+    text = " ".join(["lorem"] * WORDS_PER_CHUNK)
+    blocks = []
+    for start in range(0, size, BLOCK_SIZE):
+        count = min(BLOCK_SIZE, size - start)
+        number = len(blocks)
+        block = {"vectors": f"vectors-{number:05d}.npy", "chunks": f"chunks-{number:05d}.json", "count": count}
+        np.save(path / block["vectors"], rng.random((count, EMBEDDING_DIM), dtype=np.float32))
+        documents = [f"{text} {start + i}" for i in range(count)]
+        (path / block["chunks"]).write_text(json.dumps({
+            "ids": [f"chunk-{start + i}" for i in range(count)],
+            "documents": documents,
+            "metadatas": [
+                chunk_metadata(f"doc-{(start + i) // 100}.pdf", (start + i) % 100 + 1, 1,
+                               text_hash=content_hash(document))
+                for i, document in enumerate(documents)
+            ],
+        }))
+        blocks.append(block)
+
+    now = time.time()
+    catalog = [
+        {"filename": f"doc-{n}.pdf", "doc_id": document_id(f"doc-{n}.pdf"), "fingerprint": None,
+         "page_hashes": None, "job_id": None, "chunk_count": min(100, size - n * 100), "updated_at": now,
+         "status": "ready", "pages": 100, "bytes": None, "created_at": now}
+        for n in range((size + 99) // 100)
+    ]
+    (path / CATALOG_FILE).write_text(json.dumps(catalog))
+    (path / MANIFEST_FILE).write_text(json.dumps({
+        "format": SNAPSHOT_FORMAT, "name": path.name, "created_at": now, "embedding_model": EMBEDDING_MODEL,
+        "dimensions": EMBEDDING_DIM, "chunks": size, "documents": len(catalog), "blocks": blocks,
+    }))
+
+
+def probe_load(snapshot, store, data_dir):
+    env = dict(
+        os.environ,
+        VECTOR_STORE=store,
+        CHROMA_PERSIST_DIR=str(data_dir / "chroma"),
+        DATA_DIR=str(data_dir),
+        GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY", "benchmark_key"),
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE % {"dim": EMBEDDING_DIM}, str(snapshot)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--store", choices=["memory", "persistent"], default="memory")
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            snapshot = Path(tmp) / f"snapshot-{size}"
+            write_snapshot(snapshot, size, rng)
+            disk_mb = sum(f.stat().st_size for f in snapshot.iterdir()) / 2 ** 20
+            row = {"chunks": size, "disk_mb": disk_mb, **probe_load(snapshot, args.store, Path(tmp) / f"node-{size}")}
+            results.append(row)
+            print(
+                f"{size:>9} chunks ({disk_mb:7.0f} MB): read {row['read_s']:6.2f}s  "
+                f"load {row['load_s']:7.1f}s ({size / row['load_s']:7.0f} chunks/s)  "
+                f"first query {row['first_query_s'] * 1000:6.1f}ms"
+            )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
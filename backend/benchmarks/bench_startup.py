@@ -0,0 +1,125 @@
+"""
+Persistent vector store startup benchmark.
+
+Builds persistent Chroma stores of increasing size from random vectors, then
+starts a fresh interpreter per store and measures how long it takes to open
+the store (importing the app's vector_store module), to run the app's
+lifespan startup hook, to answer the first query and a second, warm query,
+and until the keyword index, built in the background, is ready. Each store
+is started twice: the first start also builds the document index once, the
+restart is what a redeployed server pays.
+
+Usage:
+    python benchmarks/bench_startup.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+EMBEDDING_DIM = 768
+BATCH_SIZE = 5000
+
+PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+from app.api.vector_store import db
+opened = time.perf_counter()
+from app.main import app
+from app.api.keyword_index import keyword_index
+imported = time.perf_counter()
+
+async def serve():
+    # Run the app's real startup hook, then query as the first request would
+    async with app.router.lifespan_context(app):
+        serving = time.perf_counter()
+        query = [[0.1] * %(dim)d]
+        db.query(query_embeddings=query, n_results=3, include=["metadatas"])
+        first = time.perf_counter()
+        db.query(query_embeddings=query, n_results=3, include=["metadatas"])
+        warm = time.perf_counter()
+        await asyncio.to_thread(keyword_index.ready.wait)
+        ready = time.perf_counter()
+    return serving, first, warm, ready
+
+serving, first, warm, ready = asyncio.run(serve())
+print(json.dumps({
+    "open_s": opened - start,
+    "lifespan_s": serving - imported,
+    "first_query_s": first - serving,
+    "warm_query_s": warm - first,
+    "keyword_index_ready_s": ready - serving,
+}))
+"""
+
+
+def build_store(path, size, rng):
+    client = chromadb.PersistentClient(path=str(path))
+    collection = client.get_or_create_collection(name="document_db")
+    for start in range(0, size, BATCH_SIZE):
+        count = min(BATCH_SIZE, size - start)
+        collection.add(
+            ids=[f"chunk-{start + i}" for i in range(count)],
+            embeddings=rng.random((count, EMBEDDING_DIM), dtype=np.float32).tolist(),
+            documents=[f"Synthetic chunk {start + i}" for i in range(count)],
+            metadatas=[{"source": f"bench.pdf (Page {start + i + 1}, Chunk 1)"} for i in range(count)],
+        )
+
+
+def probe_startup(path):
+    env = dict(
+        os.environ,
+        VECTOR_STORE="persistent",
+        CHROMA_PERSIST_DIR=str(path),
+        DATA_DIR=str(path / "data"),
+        GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY", "benchmark_key"),
+    )
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE % {"dim": EMBEDDING_DIM}],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    total = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_total_s"] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = Path(tmp) / f"store-{size}"
+            build_store(path, size, rng)
+            for start in ("first start", "restart"):
+                row = {"chunks": size, "start": start, **probe_startup(path)}
+                results.append(row)
+                print(
+                    f"{size:>9} chunks, {start:<11}: open {row['open_s'] * 1000:7.1f}ms  "
+                    f"lifespan {row['lifespan_s'] * 1000:8.1f}ms  "
+                    f"first query {row['first_query_s'] * 1000:8.1f}ms  "
+                    f"warm query {row['warm_query_s'] * 1000:6.1f}ms  "
+                    f"keyword index {row['keyword_index_ready_s']:6.2f}s  "
+                    f"process total {row['process_total_s']:6.2f}s"
+                )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+Offline end-to-end benchmark and load-test suite.
+
+Starts the local Gemini stand-in (fake_gemini.py) and the app under uvicorn
+on localhost, then talks to both over real HTTP, so the google-genai client,
+the connection pool, the job workers and the ASGI stack are all part of the
+measurement. No network access or API key is needed.
+
+Scenarios (all on by default, pick with --scenarios):
+    ingest  upload synthetic PDFs of --pages pages, report pages/s and chunks/s
+    chat    /api/chat at each --levels concurrency, report p50/p95/p99 and errors
+    delete  grow the collection to each --delete-sizes chunks, time document deletes
+
+Every scenario also records the process RSS high-water mark while it ran.
+Results are written as JSON (--json) together with the commit and settings,
+and --compare takes an earlier results file and reports metrics that got
+worse by more than --threshold percent (exiting 1 if any did).
+
+Usage:
+    python benchmarks/bench_suite.py --json results.json
+    python benchmarks/bench_suite.py --pages 10 100 1000 --levels 1 8 32 --gen-latency 0.5
+    python benchmarks/bench_suite.py --error-rate 0.05 --rpm 3000 --json new.json --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import httpx
+import numpy as np
+
+from fake_gemini import EMBEDDING_DIM, FakeGemini
+
+QUESTIONS = [
+    "What does the document say about the system design?",
+    "Summarise the main findings.",
+    "Which results are reported for the second experiment?",
+    "How is the data collected and processed?",
+    "What limitations are mentioned?",
+]
+
+# Metrics compared by --compare, and whether a larger value is better
+COMPARED = {
+    "ingest": ("pages", {"pages_per_s": True, "chunks_per_s": True, "rss_peak_mb": False}),
+    "chat": ("concurrency", {"p50_ms": False, "p95_ms": False, "p99_ms": False, "rss_peak_mb": False}),
+    "delete": ("corpus_chunks", {"p50_ms": False, "max_ms": False}),
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # No procfs (e.g. macOS): fall back to the lifetime peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+class MemoryHighWater:
+    """Sample RSS in the background; peak_mb is the largest value seen."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.start_mb = self.peak_mb = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def report(self):
+        return {"rss_start_mb": round(self.start_mb, 1), "rss_peak_mb": round(self.peak_mb, 1)}
+
+
+def synthetic_pdf(pages, words_per_page, seed=0):
+    """A PDF of pseudo-random prose, so chunking and BM25 see realistic vocabularies."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+        for _ in range(3000)
+    ]
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    for page in range(pages):
+        words = rng.choices(vocabulary, k=words_per_page)
+        y = 760
+        for start in range(0, len(words), 14):
+            pdf.drawString(40, y, " ".join(words[start:start + 14]))
+            y -= 12
+            if y < 40:
+                break
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+class AppServer:
+    """Run the FastAPI app under uvicorn in a background thread."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        self.url = "http://127.0.0.1:%d" % self.socket.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+        self.server.install_signal_handlers = lambda: None
+        self.thread = threading.Thread(target=self.server.run, kwargs={"sockets": [self.socket]}, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def wait_for_job(client, job_id, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        job = (await client.get(f"/api/jobs/{job_id}")).json()
+        if job["status"] in ("complete", "error", "cancelled"):
+            return job
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
+
+
+async def bench_ingest(client, args):
+    results = []
+    for pages in args.pages:
+        contents = synthetic_pdf(pages, args.words_per_page, seed=pages)
+        with MemoryHighWater() as memory:
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/upload", files={"file": (f"bench-{pages}.pdf", contents, "application/pdf")}
+            )
+            response.raise_for_status()
+            job = await wait_for_job(client, response.json()["job_id"], args.job_timeout)
+            elapsed = time.perf_counter() - start
+        chunks = job.get("chunks_processed") or 0
+        results.append({
+            "pages": pages,
+            "status": job["status"],
+            "pdf_mb": round(len(contents) / 2 ** 20, 2),
+            "chunks": chunks,
+            "seconds": round(elapsed, 3),
+            "pages_per_s": round(pages / elapsed, 2),
+            "chunks_per_s": round(chunks / elapsed, 2),
+            **memory.report(),
+        })
+    return results
+
+
+async def timed_chat(client, question):
+    start = time.perf_counter()
+    try:
+        response = await client.post("/api/chat", json={"query": question})
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+async def bench_chat(client, args):
+    results = []
+    for level in args.levels:
+        latencies = []
+        errors = 0
+        with MemoryHighWater() as memory:
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                outcomes = await asyncio.gather(*[
+                    timed_chat(client, random.choice(QUESTIONS)) for _ in range(level)
+                ])
+                latencies.extend(latency for latency, _ in outcomes)
+                errors += sum(not ok for _, ok in outcomes)
+            elapsed = time.perf_counter() - start
+        results.append({
+            "concurrency": level,
+            "requests": len(latencies),
+            "errors": errors,
+            "requests_per_s": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            **memory.report(),
+        })
+    return results
+
+
+def add_synthetic_documents(count, chunks_per_document, rng):
+    """Write documents straight to the store, the way ingest_pdf does, minus embedding."""
+    from app.api.document_index import chunk_metadata, document_index
+    from app.api.keyword_index import keyword_index
+    from app.api.vector_store import db
+
+    names = []
+    for _ in range(count):
+        name = f"synthetic-{uuid.uuid4().hex[:12]}.pdf"
+        ids = [str(uuid.uuid4()) for _ in range(chunks_per_document)]
+        documents = [f"{name} synthetic chunk {i} " + " ".join(map(str, rng.integers(0, 5000, 40)))
+                     for i in range(chunks_per_document)]
+        metadatas = [chunk_metadata(name, i // 4 + 1, i % 4 + 1, "benchmark") for i in range(chunks_per_document)]
+        db.add(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=rng.standard_normal((chunks_per_document, EMBEDDING_DIM), dtype=np.float32).tolist(),
+        )
+        document_index.add_chunks(ids, metadatas)
+        keyword_index.add_chunks(ids, documents)
+        names.append(name)
+    return names
+
+
+async def bench_delete(client, args):
+    from app.api.vector_store import db
+
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sorted(args.delete_sizes):
+        missing = size - db.count()
+        if missing > 0:
+            await asyncio.to_thread(
+                add_synthetic_documents, -(-missing // args.delete_doc_chunks), args.delete_doc_chunks, rng
+            )
+        # Documents removed by the measurement are put back before the next size
+        names = await asyncio.to_thread(
+            add_synthetic_documents, args.delete_samples, args.delete_doc_chunks, rng
+        )
+        corpus = db.count()
+        latencies = []
+        with MemoryHighWater() as memory:
+            for name in names:
+                start = time.perf_counter()
+                response = await client.delete(f"/api/documents/{name}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        results.append({
+            "corpus_chunks": corpus,
+            "document_chunks": args.delete_doc_chunks,
+            "deletes": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+            **memory.report(),
+        })
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current, threshold):
+    """Return a line per compared metric that got worse by more than threshold percent."""
+    regressions = []
+    for scenario, (key, metrics) in COMPARED.items():
+        before = {row[key]: row for row in previous.get(scenario, [])}
+        for row in current.get(scenario, []):
+            old = before.get(row[key])
+            if old is None:
+                continue
+            for metric, higher_is_better in metrics.items():
+                if not old.get(metric) or metric not in row:
+                    continue
+                change = (row[metric] - old[metric]) / old[metric] * 100
+                worse = -change if higher_is_better else change
+                if worse > threshold:
+                    regressions.append(
+                        f"{scenario} {key}={row[key]} {metric}: {old[metric]} -> {row[metric]} ({change:+.1f}%)"
+                    )
+    return regressions
+
+
+async def run_suite(args, base_url):
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=None,
+                                 limits=httpx.Limits(max_connections=None)) as client:
+        if "ingest" in args.scenarios:
+            results["ingest"] = await bench_ingest(client, args)
+        if "chat" in args.scenarios:
+            if not results.get("ingest"):
+                # Chat needs something to retrieve from
+                await asyncio.to_thread(add_synthetic_documents, 20, 50, np.random.default_rng(1))
+            results["chat"] = await bench_chat(client, args)
+        if "delete" in args.scenarios:
+            results["delete"] = await bench_delete(client, args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=["ingest", "chat", "delete"],
+                        default=["ingest", "chat", "delete"])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--job-timeout", type=float, default=600)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--delete-sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--delete-doc-chunks", type=int, default=50, help="Chunks per deleted document")
+    parser.add_argument("--delete-samples", type=int, default=5, help="Documents deleted per corpus size")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per fake embedding request")
+    parser.add_argument("--gen-latency", type=float, default=0.5, help="Seconds per fake generation")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake requests answered with 503")
+    parser.add_argument("--rpm", type=float, default=0, help="Fake requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change reported as a regression")
+    args = parser.parse_args()
+
+    fake = FakeGemini(embed_latency=args.embed_latency, gen_latency=args.gen_latency, jitter=args.jitter,
+                      error_rate=args.error_rate, rpm=args.rpm).start()
+
+    # Settings are read at import time, so they go in before the app is loaded
+    os.environ["GEMINI_BASE_URL"] = fake.url
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark_key")
+    os.environ.setdefault("VECTOR_STORE", "memory")
+    os.environ.setdefault("JOB_STORE_PATH", ":memory:")
+    os.environ.setdefault("EMBEDDING_RETRY_DELAY", "0.05")
+    # Measure the pipeline itself rather than cache hits
+    os.environ.setdefault("EMBEDDING_CACHE_SIZE", "0")
+    os.environ.setdefault("ANSWER_CACHE_SIZE", "0")
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from app.main import app
+
+    random.seed(0)
+    with AppServer(app) as server:
+        results = asyncio.run(run_suite(args, server.url))
+    fake.stop()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+            "fake_gemini": fake.stats(),
+        },
+        **results,
+    }
+
+    for scenario, rows in results.items():
+        print(f"\n{scenario}")
+        for row in rows:
+            print("  " + "  ".join(f"{key}={value}" for key, value in row.items()))
+    print(f"\nfake gemini: {fake.stats()}")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), report, args.threshold)
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold}% against {args.compare}")
+        for line in regressions:
+            print("  " + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
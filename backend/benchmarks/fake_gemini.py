@@ -0,0 +1,219 @@
+"""
+Local stand-in for the Gemini REST API.
+
+Serves the endpoints the app calls (embedContent, batchEmbedContents,
+generateContent and streamGenerateContent) on localhost, so the real
+google-genai client and the whole HTTP path can be exercised without
+network access. Point the app at it with GEMINI_BASE_URL.
+
+Latency, errors and rate limits can be injected:
+    embed_latency / gen_latency   seconds per request (plus up to `jitter`)
+    error_rate                    fraction of requests answered with 503
+    rpm                           requests per minute before answering 429
+
+Embeddings are derived from a hash of the text, so the same text always gets
+the same vector and different texts get different ones.
+
+Usage (standalone):
+    python benchmarks/fake_gemini.py --port 8765 --gen-latency 0.5 --rpm 600
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+EMBEDDING_DIM = 768
+ANSWER = "This is a generated answer from the local Gemini stand-in, based on the provided context."
+
+_ROUTE = re.compile(r"^/[^/]+/models/([^:/]+):(\w+)")
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> list:
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    vector = rng.standard_normal(dim, dtype=np.float32)
+    vector /= np.linalg.norm(vector)
+    return np.round(vector, 5).tolist()
+
+
+class FakeGemini:
+    """A threaded fake Gemini server; use as a context manager or start()/stop()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, embed_latency: float = 0.05,
+                 gen_latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0,
+                 rpm: float = 0, stream_chunks: int = 8, seed: int = 0):
+        self.embed_latency = embed_latency
+        self.gen_latency = gen_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+        self.counts = {"requests": 0, "embedded_texts": 0, "generations": 0, "errors": 0, "rate_limited": 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def _admit(self):
+        """Return an (HTTP status, API status) pair to fail the request with, or None."""
+        with self._lock:
+            self.counts["requests"] += 1
+            now = time.monotonic()
+            if self.rpm > 0:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm:
+                    self.counts["rate_limited"] += 1
+                    return 429, "RESOURCE_EXHAUSTED"
+                self._recent.append(now)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return 503, "UNAVAILABLE"
+        return None
+
+    def _sleep(self, latency):
+        if self.jitter:
+            with self._lock:
+                latency += self.random.uniform(0, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                match = _ROUTE.match(self.path)
+                if not match:
+                    return self.send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}", "status": "NOT_FOUND"}})
+
+                failure = fake._admit()
+                if failure:
+                    status, reason = failure
+                    return self.send_json(status, {"error": {"code": status, "message": reason, "status": reason}})
+
+                method = match.group(2)
+                if method in ("embedContent", "batchEmbedContents"):
+                    self.embed(method, body)
+                elif method == "generateContent":
+                    self.generate()
+                elif method == "streamGenerateContent":
+                    self.stream()
+                else:
+                    self.send_json(404, {"error": {"code": 404, "message": method, "status": "NOT_FOUND"}})
+
+            def embed(self, method, body):
+                requests = body.get("requests") or [body]
+                texts = [
+                    " ".join(part.get("text", "") for part in request.get("content", {}).get("parts", []))
+                    for request in requests
+                ]
+                fake._sleep(fake.embed_latency)
+                with fake._lock:
+                    fake.counts["embedded_texts"] += len(texts)
+                embeddings = [{"values": fake_embedding(text)} for text in texts]
+                if method == "embedContent":
+                    return self.send_json(200, {"embedding": embeddings[0]})
+                self.send_json(200, {"embeddings": embeddings})
+
+            def generate(self):
+                fake._sleep(fake.gen_latency)
+                with fake._lock:
+                    fake.counts["generations"] += 1
+                self.send_json(200, candidate(ANSWER))
+
+            def stream(self):
+                with fake._lock:
+                    fake.counts["generations"] += 1
+                words = ANSWER.split(" ")
+                pieces = max(1, min(fake.stream_chunks, len(words)))
+                step = -(-len(words) // pieces)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for start in range(0, len(words), step):
+                    fake._sleep(fake.gen_latency / pieces)
+                    text = " ".join(words[start:start + step]) + " "
+                    self.wfile.write(f"data: {json.dumps(candidate(text))}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+
+        return Handler
+
+
+def candidate(text: str) -> dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(text.split())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--gen-latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=float, default=0, help="Requests per minute before 429s (0 = unlimited)")
+    args = parser.parse_args()
+
+    fake = FakeGemini(args.host, args.port, args.embed_latency, args.gen_latency,
+                      args.jitter, args.error_rate, args.rpm)
+    print(f"Fake Gemini listening on {fake.url}; set GEMINI_BASE_URL={fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
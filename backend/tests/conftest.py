@@ -17,9 +17,15 @@ TEST_EMBEDDING_DIM = 768
 # Load test environment variables
 os.environ["GOOGLE_API_KEY"] = "test_key_for_testing"
 os.environ["ENVIRONMENT"] = "test"
+# Job state stays in-process and uploads are spooled to a throwaway directory
+os.environ["JOB_STORE_PATH"] = ":memory:"
+os.environ["JOB_SPOOL_DIR"] = str(TEST_DATA_DIR / "uploads")
 
 # Import after setting environment variables
 from app.api.pdf_upload import db, GeminiEmbeddingFunction
+from app.api.document_index import document_index
+from app.api.answer_cache import answer_cache
+from app.api.keyword_index import keyword_index
 
 class MockEmbeddingResponse:
     def __init__(self, embedding):
@@ -50,11 +56,17 @@ class MockGeminiClient:
             else:
                 return MockGenerateResponse("This document appears to be about testing RAG functionality with various content types.")
         
+        def generate_content_stream_mock(*args, **kwargs):
+            # Stream the same answer a word at a time
+            text = generate_content_mock(*args, **kwargs).text
+            for word in text.split(" "):
+                yield MockGenerateResponse(word + " ")
+
         self.models.generate_content = generate_content_mock
+        self.models.generate_content_stream = generate_content_stream_mock
 
 class MockEmbeddingFunction:
     def __init__(self):
-        self.document_mode = True
         self.client = MockGeminiClient()
         # Create deterministic but different embeddings for different content
         self.content_embeddings = {
@@ -63,14 +75,14 @@ class MockEmbeddingFunction:
             "chunking and embedding": np.ones(TEST_EMBEDDING_DIM) * 0.8
         }
     
-    def __call__(self, input):
+    def __call__(self, input, task_type="retrieval_document"):
         if isinstance(input, str):
             # Return content-specific embedding if available
             for content, embedding in self.content_embeddings.items():
                 if content.lower() in input.lower():
                     return [embedding.tolist()]
             return [np.ones(TEST_EMBEDDING_DIM).tolist()]
-        return [self.__call__(text)[0] for text in input]
+        return [self.__call__(text, task_type)[0] for text in input]
 
 @pytest.fixture(scope="session", autouse=True)
 def test_env_setup():
@@ -85,7 +97,7 @@ def test_env_setup():
 def mock_gemini():
     """Mock both embedding and text generation"""
     with patch('google.genai.Client', return_value=MockGeminiClient()) as client_mock:
-        with patch('app.api.pdf_upload.GeminiEmbeddingFunction.__call__', new_callable=MockEmbeddingFunction) as embed_mock:
+        with patch('app.api.pdf_upload.GeminiEmbeddingFunction._embed_content', new_callable=MockEmbeddingFunction) as embed_mock:
             yield (embed_mock, client_mock)
 
 @pytest.fixture(scope="session")
@@ -96,18 +108,17 @@ def test_db():
 @pytest.fixture(scope="function")
 def clean_db(test_db):
     """Clean the database before and after each test"""
-    try:
-        results = test_db.get()
-        if results and results['ids']:
-            test_db.delete(ids=results['ids'])
-    except Exception:
-        pass
-    
+    def clean():
+        try:
+            results = test_db.get()
+            if results and results['ids']:
+                test_db.delete(ids=results['ids'])
+        except Exception:
+            pass
+        document_index.clear()
+        answer_cache.clear()
+        keyword_index.clear()
+
+    clean()
     yield test_db
-    
-    try:
-        results = test_db.get()
-        if results and results['ids']:
-            test_db.delete(ids=results['ids'])
-    except Exception:
-        pass 
\ No newline at end of file
+    clean() 
\ No newline at end of file
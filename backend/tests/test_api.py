@@ -1,4 +1,6 @@
 import os
+import sys
+import threading
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
@@ -8,6 +10,7 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from io import BytesIO
 import asyncio
+import time
 import pytest_asyncio
 from concurrent.futures import ThreadPoolExecutor
 
@@ -43,6 +46,28 @@ def sample_pdf():
     
     return TEST_PDF
 
+def wait_for_job(job_id, timeout=10):
+    """Poll an ingestion job until it finishes"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "processing"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish within {timeout}s")
+
+def upload_and_wait(pdf_path, filename="test.pdf"):
+    """Upload a PDF and wait for its ingestion job to complete"""
+    with open(pdf_path, "rb") as pdf:
+        response = client.post(
+            "/api/upload",
+            files={"file": (filename, pdf, "application/pdf")}
+        )
+    assert response.status_code == 202
+    job = wait_for_job(response.json()["job_id"])
+    assert job["status"] == "complete"
+    return job
+
 def test_health_check():
     """Test the health check endpoint"""
     response = client.get("/health")
@@ -57,12 +82,21 @@ def test_pdf_upload(clean_db, sample_pdf, mock_gemini):
             "/api/upload",
             files={"file": ("test.pdf", pdf, "application/pdf")}
         )
-        assert response.status_code == 200
+        assert response.status_code == 202
         data = response.json()
         assert "filename" in data
         assert data["filename"] == "test.pdf"
         assert data["pages_processed"] == 1
-        assert data["chunks_processed"] > 0
+
+    job = wait_for_job(data["job_id"])
+    assert job["status"] == "complete"
+    assert job["pages_processed"] == 1
+    assert job["chunks_processed"] > 0
+
+    # Embedding status reflects the finished job
+    status = client.get("/api/embedding-status/test.pdf").json()
+    assert status["status"] == "complete"
+    assert status["progress"] == 100
 
     # Test with invalid file type
     with open(sample_pdf, "rb") as pdf:
@@ -73,15 +107,119 @@ def test_pdf_upload(clean_db, sample_pdf, mock_gemini):
         assert response.status_code == 400
         assert "detail" in response.json()
 
+def test_reupload_embeds_only_changed_pages(clean_db, mock_gemini):
+    """Test that re-uploading a revised PDF embeds only changed pages and swaps versions atomically"""
+    from unittest.mock import patch
+    from app.api import pdf_upload
+    from app.api.document_index import document_index
+    from app.api.metrics import chunks_total
+    from app.api.retrieval import search
+
+    def write_manual(path, edited_page=None):
+        pdf = canvas.Canvas(str(path), pagesize=letter)
+        for page in range(1, 11):
+            text = f"Manual page {page} explains procedure {page} in detail."
+            if page == edited_page:
+                text = f"Manual page {page} now explains a revised procedure."
+            pdf.drawString(100, 750, text)
+            pdf.showPage()
+        pdf.save()
+        return path
+
+    TEST_DATA_DIR.mkdir(exist_ok=True)
+    original = write_manual(TEST_DATA_DIR / "manual-v1.pdf")
+    revised = write_manual(TEST_DATA_DIR / "manual-v2.pdf", edited_page=4)
+
+    added = chunks_total.value("added")
+    upload_and_wait(original, "manual.pdf")
+    first_version = set(document_index.chunk_ids("manual.pdf"))
+    assert len(first_version) == 10 and chunks_total.value("added") - added == 10
+
+    # An identical upload changes nothing
+    added = chunks_total.value("added")
+    job = upload_and_wait(original, "manual.pdf")
+    assert job["message"] == "Document unchanged" and job["chunks_processed"] == 10
+    assert chunks_total.value("added") == added
+    assert set(document_index.chunk_ids("manual.pdf")) == first_version
+
+    # While a revision is staged, queries only see the old version
+    seen_while_staged = []
+    commit_version = document_index.commit_version
+    def commit_after_query(*args):
+        query = search([1.0] * 768, "revised procedure", n_results=20)
+        seen_while_staged.extend(query["ids"][0])
+        return commit_version(*args)
+
+    with patch.object(pdf_upload.document_index, "commit_version", side_effect=commit_after_query):
+        job = upload_and_wait(revised, "manual.pdf")
+    assert set(seen_while_staged) == first_version
+
+    # Only the edited page was embedded; the old chunk for it is gone
+    assert chunks_total.value("added") - added == 1
+    assert job["message"] == "1 pages changed, 1 of 10 chunks embedded"
+    second_version = set(document_index.chunk_ids("manual.pdf"))
+    assert len(second_version) == 10 and len(second_version - first_version) == 1
+    assert len(clean_db.get(where={"filename": "manual.pdf"})["ids"]) == 10
+    query = search([1.0] * 768, "revised procedure", n_results=20)
+    assert set(query["ids"][0]) <= second_version
+    assert any("revised procedure" in document for document in query["documents"][0])
+
+def test_document_catalog(clean_db, sample_pdf, mock_gemini):
+    """Test that the document catalog follows ingest and delete and pages with a cursor"""
+    from unittest.mock import patch
+    from app.api import document_index as document_index_module
+    from app.api.document_index import document_index, rebuild_document_index
+
+    for name in ("b.pdf", "a.pdf", "c.pdf"):
+        upload_and_wait(sample_pdf, name)
+    blank = TEST_DATA_DIR / "blank.pdf"
+    pdf = canvas.Canvas(str(blank), pagesize=letter)
+    pdf.showPage()
+    pdf.save()
+    with open(blank, "rb") as f:
+        job_id = client.post("/api/upload", files={"file": ("blank.pdf", f, "application/pdf")}).json()["job_id"]
+    assert wait_for_job(job_id)["status"] == "error"
+
+    # Listing reads only the catalog, never the vector data
+    with patch.object(type(document_index_module.db), "get", side_effect=AssertionError("vector data read")):
+        page = client.get("/api/documents", params={"limit": 2}).json()
+        assert [d["filename"] for d in page["documents"]] == ["a.pdf", "b.pdf"]
+        entry = page["documents"][0]
+        assert entry["status"] == "ready" and entry["pages"] == 1 and entry["chunks"] > 0
+        assert entry["bytes"] == os.path.getsize(sample_pdf)
+        rest = client.get("/api/documents", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+        assert [d["filename"] for d in rest["documents"]] == ["blank.pdf", "c.pdf"]
+        assert rest["next_cursor"] is None
+
+        recent = client.get("/api/documents", params={"order": "recent", "limit": 3}).json()
+        assert [d["filename"] for d in recent["documents"]] == ["blank.pdf", "c.pdf", "a.pdf"]
+        older = client.get("/api/documents", params={"order": "recent", "cursor": recent["next_cursor"]}).json()
+        assert [d["filename"] for d in older["documents"]] == ["b.pdf"]
+
+        failed = client.get("/api/documents", params={"status": "error"}).json()["documents"]
+        assert [(d["filename"], d["chunks"]) for d in failed] == [("blank.pdf", 0)]
+        assert [d["filename"] for d in client.get("/api/documents", params={"prefix": "c"}).json()["documents"]] == ["c.pdf"]
+        assert client.get("/api/documents", params={"cursor": "not-a-cursor"}).status_code == 400
+        assert client.get("/api/documents", params={"cursor": page["next_cursor"], "order": "recent"}).status_code == 400
+        assert client.get("/api/documents", params={"limit": 1000}).status_code == 422
+
+    # Deleting a document, or a failed upload, drops its entry
+    assert client.delete("/api/documents/b.pdf").status_code == 200
+    assert client.delete("/api/documents/blank.pdf").status_code == 200
+    names = [d["filename"] for d in client.get("/api/documents").json()["documents"]]
+    assert names == ["a.pdf", "c.pdf"]
+
+    # Indexes from before the catalog existed get it filled in from their chunks
+    with document_index._lock:
+        document_index._db.execute("DELETE FROM documents")
+    rebuild_document_index()
+    names = [d["filename"] for d in client.get("/api/documents").json()["documents"]]
+    assert names == ["a.pdf", "c.pdf"]
+
 def test_chat_endpoint(clean_db, sample_pdf, mock_gemini):
     """Test the chat endpoint"""
     # Upload a document first
-    with open(sample_pdf, "rb") as pdf:
-        upload_response = client.post(
-            "/api/upload",
-            files={"file": ("test.pdf", pdf, "application/pdf")}
-        )
-        assert upload_response.status_code == 200
+    upload_and_wait(sample_pdf)
 
     # Test with valid query
     query = {"query": "What is this document about?"}
@@ -105,12 +243,7 @@ def test_chat_endpoint(clean_db, sample_pdf, mock_gemini):
 def test_context_retrieval(clean_db, sample_pdf, mock_gemini):
     """Test context retrieval functionality"""
     # Upload a document first
-    with open(sample_pdf, "rb") as pdf:
-        upload_response = client.post(
-            "/api/upload",
-            files={"file": ("test.pdf", pdf, "application/pdf")}
-        )
-        assert upload_response.status_code == 200
+    upload_and_wait(sample_pdf)
 
     # Test specific content retrieval
     queries = [
@@ -136,24 +269,15 @@ def test_concurrent_uploads(clean_db, sample_pdf, mock_gemini):
     """Test concurrent PDF uploads"""
     num_concurrent = 3
     
-    def upload_pdf():
-        with open(sample_pdf, "rb") as pdf:
-            return client.post(
-                "/api/upload",
-                files={"file": ("test.pdf", pdf, "application/pdf")}
-            )
-    
     # Run concurrent uploads
     with ThreadPoolExecutor(max_workers=num_concurrent) as executor:
-        futures = [executor.submit(upload_pdf) for _ in range(num_concurrent)]
-        responses = [future.result() for future in futures]
+        futures = [executor.submit(upload_and_wait, sample_pdf) for _ in range(num_concurrent)]
+        jobs = [future.result() for future in futures]
     
     # Verify all uploads succeeded
-    for response in responses:
-        assert response.status_code == 200
-        data = response.json()
-        assert data["pages_processed"] == 1
-        assert data["chunks_processed"] > 0
+    for job in jobs:
+        assert job["pages_processed"] == 1
+        assert job["chunks_processed"] > 0
 
 def test_error_handling(clean_db):
     """Test error handling"""
@@ -188,12 +312,7 @@ def test_error_handling(clean_db):
 def test_delete_document(clean_db, sample_pdf, mock_gemini):
     """Test document deletion functionality"""
     # First upload a document
-    with open(sample_pdf, "rb") as pdf:
-        upload_response = client.post(
-            "/api/upload",
-            files={"file": ("test.pdf", pdf, "application/pdf")}
-        )
-        assert upload_response.status_code == 200
+    upload_and_wait(sample_pdf)
 
     # Test deleting the document
     response = client.delete("/api/upload/test.pdf")
@@ -212,4 +331,1107 @@ def test_delete_document(clean_db, sample_pdf, mock_gemini):
     # Test deleting non-existent document
     response = client.delete("/api/upload/nonexistent.pdf")
     assert response.status_code == 404
-    assert "detail" in response.json() 
\ No newline at end of file
+    assert "detail" in response.json() 
+
+def test_delete_document_during_ingest(clean_db):
+    """Test that deleting a document cancels its upload, which then cannot list it again"""
+    from unittest.mock import patch
+    from app.api import pdf_upload
+    from app.api.document_index import DocumentDeleted, document_index
+    from app.api.jobs import PermanentJobError, job_store
+
+    job_id = job_store.create("inflight.pdf")
+    job_store.update(job_id, status="processing")
+    document_index.begin_version("inflight.pdf", job_id)
+
+    response = client.delete("/api/documents/inflight.pdf")
+    assert response.status_code == 200
+    assert job_store.get(job_id)["status"] == "cancelled"
+    assert document_index.document("inflight.pdf") is None
+
+    # A job that gets as far as committing its version is refused
+    with pytest.raises(DocumentDeleted):
+        document_index.commit_version("inflight.pdf", job_id, [], "fingerprint", ["page"])
+    assert document_index.document("inflight.pdf") is None
+
+    # and fails for good rather than being retried
+    def deleted_meanwhile(job_id, filename, *args, **kwargs):
+        document_index.remove_document(filename)
+        document_index.commit_version(filename, job_id, [], "fingerprint", ["page"])
+
+    job_id = job_store.create("inflight.pdf")
+    with patch.object(pdf_upload, "ingest_pdf", side_effect=deleted_meanwhile):
+        with pytest.raises(PermanentJobError):
+            pdf_upload.process_upload_job({**job_store.get(job_id), "file_path": "unused.pdf", "pages_processed": 1})
+    assert document_index.document("inflight.pdf") is None
+    job_store.update(job_id, status="error")
+def test_chat_generation_timeout(clean_db, sample_pdf, mock_gemini):
+    """Test that a slow generation stage returns 504 instead of hanging"""
+    import time
+    from unittest.mock import patch
+
+    upload_and_wait(sample_pdf)
+
+    def slow_generate(prompt):
+        time.sleep(0.5)
+        return "Too late"
+
+    with patch("app.api.chat.generate_answer", slow_generate), \
+            patch("app.api.chat.CHAT_GENERATION_TIMEOUT", 0.05):
+        response = client.post("/api/chat", json={"query": "What is this document about?"})
+    assert response.status_code == 504
+    assert "generation" in response.json()["detail"]
+
+def test_embedding_task_types_are_request_scoped(clean_db, sample_pdf, mock_gemini):
+    """Test that ingest and chat use their own task types without shared state"""
+    from unittest.mock import patch
+    from app.api.pdf_upload import GeminiEmbeddingFunction
+
+    embed_mock, _ = mock_gemini
+    task_types = []
+
+    def recording_embed(texts, task_type):
+        task_types.append(task_type)
+        return embed_mock(texts, task_type)
+
+    with patch.object(GeminiEmbeddingFunction, "embed", new=staticmethod(recording_embed)):
+        def ask():
+            return client.post("/api/chat", json={"query": "test content"})
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            uploads = [executor.submit(upload_and_wait, sample_pdf) for _ in range(2)]
+            chats = [executor.submit(ask) for _ in range(2)]
+            assert all(f.result()["status"] == "complete" for f in uploads)
+            assert all(f.result().status_code == 200 for f in chats)
+
+    assert task_types.count("retrieval_query") == 2
+    assert set(task_types) == {"retrieval_document", "retrieval_query"}
+
+def test_persistent_vector_store(tmp_path):
+    """Test that the persistent store keeps chunks across client restarts"""
+    from unittest.mock import patch
+    from app.api import vector_store
+
+    with patch.object(vector_store, "VECTOR_STORE", "persistent"), \
+            patch.object(vector_store, "CHROMA_PERSIST_DIR", str(tmp_path)):
+        collection = vector_store.create_chroma_client().get_or_create_collection("persist_test")
+        collection.add(ids=["a"], embeddings=[[0.1, 0.2]], documents=["kept"])
+
+        # A new client on the same directory sees the stored chunk
+        collection = vector_store.create_chroma_client().get_or_create_collection("persist_test")
+        assert collection.get(ids=["a"])["documents"] == ["kept"]
+
+def test_collection_index_settings(tmp_path):
+    """Test that HNSW settings apply to new collections and are kept by built ones"""
+    from unittest.mock import patch
+    from app.api import vector_store
+
+    with patch.object(vector_store, "VECTOR_STORE", "persistent"), \
+            patch.object(vector_store, "CHROMA_PERSIST_DIR", str(tmp_path)), \
+            patch.object(vector_store, "HNSW_SPACE", "cosine"), \
+            patch.object(vector_store, "HNSW_M", 32):
+        collection = vector_store.open_collection(vector_store.create_chroma_client(), "index_test")
+        assert collection.metadata["hnsw:space"] == "cosine"
+        assert collection.metadata["hnsw:M"] == 32
+        collection.add(ids=["a", "b"], embeddings=[[1.0, 0.0], [10.0, 10.0]], documents=["a", "b"])
+        # Cosine ranks by angle, not by distance
+        result = collection.query(query_embeddings=[[1.0, 1.0]], n_results=1, include=["distances"])
+        assert result["ids"] == [["b"]]
+
+    # Reopened with other settings, the collection keeps its index and says so
+    with patch.object(vector_store, "VECTOR_STORE", "persistent"), \
+            patch.object(vector_store, "CHROMA_PERSIST_DIR", str(tmp_path)), \
+            patch.object(vector_store.logger, "warning") as warning:
+        collection = vector_store.open_collection(vector_store.create_chroma_client(), "index_test")
+        assert collection.metadata["hnsw:space"] == "cosine"
+        assert collection.get(ids=["a"])["documents"] == ["a"]
+    assert "hnsw:space=cosine" in warning.call_args[0][0]
+
+def test_embedding_cache(clean_db, sample_pdf, mock_gemini, tmp_path):
+    """Test that repeated content is served from the embedding cache"""
+    from unittest.mock import patch
+    from app.api.embedding_cache import EmbeddingCache
+    from app.api.pdf_upload import GeminiEmbeddingFunction, embed_fn
+
+    embed_mock, _ = mock_gemini
+    api_batches = []
+
+    def counting_embed_content(texts, task_type):
+        api_batches.append(list(texts))
+        return embed_mock(texts, task_type)
+
+    cache = EmbeddingCache(max_entries=100, db_path=str(tmp_path / "cache.db"))
+    with patch("app.api.embeddings.embedding_cache", cache), \
+            patch.object(GeminiEmbeddingFunction, "_embed_content", new=staticmethod(counting_embed_content)):
+        # A copy under another name is new to the document index, not to the cache
+        for filename in ("test.pdf", "copy.pdf"):
+            upload_and_wait(sample_pdf, filename)
+
+        # Only the first upload reaches the API
+        assert len(api_batches) == 1
+        stats = cache.stats()
+        assert stats["hits"] == stats["misses"] == len(api_batches[0])
+
+        # The disk tier answers once the in-process tier is gone
+        cache._memory.clear()
+        assert len(embed_fn.embed(api_batches[0], "retrieval_document")) == len(api_batches[0])
+        assert len(api_batches) == 1
+        assert cache.stats()["disk_hits"] == len(api_batches[0])
+
+    response = client.get("/api/embedding-cache")
+    assert response.status_code == 200
+    assert "hit_rate" in response.json()
+
+@pytest.mark.parametrize("extractor", ["pypdf", "pymupdf"])
+def test_parallel_page_extraction(extractor):
+    """Test that pages extracted in the process pool stream back in order"""
+    from unittest.mock import patch
+    from app.api import pdf_extract
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    for page in range(7):
+        c.drawString(50, 750, f"Page marker {page + 1}")
+        c.showPage()
+    c.save()
+    contents = buffer.getvalue()
+
+    assert pdf_extract.count_pages(contents, extractor) == 7
+    with patch.object(pdf_extract, "PDF_PARALLEL_MIN_PAGES", 2), \
+            patch.object(pdf_extract, "PDF_EXTRACT_WORKERS", 2), \
+            patch.object(pdf_extract, "PDF_EXTRACT_PAGES_PER_TASK", 3):
+        pages = list(pdf_extract.iter_page_texts(contents, 7, extractor))
+
+    assert [page_num for page_num, _ in pages] == list(range(7))
+    for page_num, text in pages:
+        assert f"Page marker {page_num + 1}" in text
+
+def test_extraction_pool_created_once():
+    """Test that concurrent ingestion workers share a single extraction pool"""
+    from concurrent.futures import ThreadPoolExecutor
+    from unittest.mock import MagicMock, patch
+    from app.api import pdf_extract
+
+    created = []
+    def make_pool(*args, **kwargs):
+        time.sleep(0.05)
+        pool = MagicMock()
+        created.append(pool)
+        return pool
+
+    pdf_extract.shutdown_pool()
+    with patch.object(pdf_extract, "ProcessPoolExecutor", side_effect=make_pool):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pools = list(executor.map(lambda _: pdf_extract._get_pool(), range(4)))
+        assert len(created) == 1 and all(pool is created[0] for pool in pools)
+        pdf_extract.shutdown_pool()
+    created[0].shutdown.assert_called_once()
+    assert pdf_extract._pool is None
+
+def test_job_queue_retries_and_cancellation():
+    """Test that jobs are retried on transient errors and can be cancelled"""
+    import threading
+    from unittest.mock import patch
+    from app.api import jobs
+
+    store = jobs.JobStore(":memory:")
+    attempts = []
+    release = threading.Event()
+    finished = []
+
+    def handler(job):
+        if job["filename"] == "flaky.pdf":
+            attempts.append(job["attempts"])
+            if len(attempts) < 2:
+                raise RuntimeError("503 Service Unavailable")
+            store.update(job["id"], status="complete", progress=100)
+        else:
+            release.wait(5)
+            if store.is_cancelled(job["id"]):
+                raise jobs.JobCancelled(job["id"])
+
+    job_queue = jobs.JobQueue(store, handler, on_finished=finished.append, workers=1, max_size=1)
+    with patch.object(jobs, "JOB_RETRY_DELAY", 0.01):
+        flaky = store.create("flaky.pdf")
+        job_queue.submit(flaky)
+        job_queue._queue.join()
+        assert store.get(flaky)["status"] == "complete"
+        assert attempts == [1, 2]
+
+        # One job blocks the worker, a second fills the queue, a third is rejected
+        blocked = store.create("blocked.pdf")
+        queued = store.create("queued.pdf")
+        job_queue.submit(blocked)
+        while store.get(blocked)["status"] != "processing":
+            time.sleep(0.01)
+        job_queue.submit(queued)
+        with pytest.raises(jobs.queue.Full):
+            job_queue.submit(store.create("rejected.pdf"))
+
+        assert store.cancel(blocked)
+        assert store.cancel(queued)
+        release.set()
+        job_queue._queue.join()
+
+    assert store.get(blocked)["status"] == "cancelled"
+    assert store.get(queued)["status"] == "cancelled"
+    assert [job["id"] for job in finished] == [flaky, blocked, queued]
+
+def test_embedding_dispatcher_batches_and_retries():
+    """Test that the dispatcher keeps order across batches and retries rate limits"""
+    import threading
+    from app.api.embedding_dispatcher import EmbeddingDispatcher
+
+    class RateLimited(Exception):
+        code = 429
+
+    lock = threading.Lock()
+    calls = []
+
+    def embed_batch(texts, task_type):
+        with lock:
+            calls.append(list(texts))
+            first_try = calls.count(list(texts)) == 1
+        if texts[0] == "text 4" and first_try:
+            raise RateLimited("429 Resource exhausted")
+        return [[float(text.split()[1])] for text in texts]
+
+    dispatcher = EmbeddingDispatcher(concurrency=3, batch_size=2, retry_delay=0.01)
+    texts = [f"text {i}" for i in range(7)]
+    vectors = dispatcher.embed(texts, "retrieval_document", embed_batch)
+
+    assert vectors == [[float(i)] for i in range(7)]
+    # Four batches plus one retry
+    assert len(calls) == 5
+
+    # Errors that are not rate limits or server errors are raised immediately
+    def failing_batch(texts, task_type):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        dispatcher.embed(texts, "retrieval_document", failing_batch)
+
+def test_delete_uses_document_index_and_migrates_legacy_chunks(clean_db, sample_pdf, mock_gemini):
+    """Test that legacy chunks are migrated and deletes only touch one document"""
+    from app.api.document_index import document_index, rebuild_document_index
+
+    upload_and_wait(sample_pdf, "kept.pdf")
+
+    # Chunks written before structured metadata only carry a source string
+    clean_db.add(
+        ids=["legacy-1", "legacy-2"],
+        documents=["Legacy chunk one", "Legacy chunk two"],
+        metadatas=[
+            {"source": "legacy.pdf (Page 1, Chunk 1)"},
+            {"source": "legacy.pdf (Page 2, Chunk 1)"},
+        ]
+    )
+    rebuild_document_index()
+
+    migrated = clean_db.get(ids=["legacy-2"])["metadatas"][0]
+    assert migrated["filename"] == "legacy.pdf"
+    assert migrated["page"] == 2
+    assert migrated["chunk"] == 1
+    assert sorted(document_index.chunk_ids("legacy.pdf")) == ["legacy-1", "legacy-2"]
+
+    response = client.delete("/api/documents/legacy.pdf")
+    assert response.status_code == 200
+    assert clean_db.get(ids=["legacy-1", "legacy-2"])["ids"] == []
+
+    # The other document is untouched
+    remaining = clean_db.get(where={"filename": "kept.pdf"})
+    assert len(remaining["ids"]) > 0
+    assert sorted(document_index.chunk_ids("kept.pdf")) == sorted(remaining["ids"])
+
+def test_chunking_strategies():
+    """Test that chunk strategies respect token budgets, page spans and headings"""
+    from app.api.chunking import chunk_text, iter_chunks
+
+    words = [f"word{i}" for i in range(1200)]
+    chunks = chunk_text(" ".join(words))
+    assert chunks[0] == " ".join(words[:500])
+    assert chunks[1] == " ".join(words[450:950])
+    assert [c.text for c in iter_chunks([(1, " ".join(words))], "words")] == chunks
+    # Token counts of word windows are only worked out when asked for
+    word_chunk = next(iter_chunks([(1, " ".join(words))], "words"))
+    assert word_chunk.token_count is None and word_chunk.tokens == 500 * 2
+
+    # Token windows span pages and keep their page range
+    pages = [(1, " ".join(words[:300])), (2, " ".join(words[300:600]))]
+    token_chunks = list(iter_chunks(pages, "tokens", max_tokens=256, overlap_tokens=32))
+    assert all(c.tokens <= 256 for c in token_chunks)
+    assert any(c.page_start == 1 and c.page_end == 2 for c in token_chunks)
+    assert token_chunks[0].text.split()[0] == "word0"
+    assert token_chunks[-1].text.split()[-1] == "word599"
+    # Consecutive chunks overlap
+    assert token_chunks[1].text.split()[0] in token_chunks[0].text.split()
+
+    # A heading always starts a new chunk
+    text = "Intro sentence one. Intro sentence two.\n2. Methods\nWe measured things. It worked."
+    sentence_chunks = list(iter_chunks([(3, text)], "sentences", max_tokens=256, overlap_tokens=8))
+    assert [c.text for c in sentence_chunks] == [
+        "Intro sentence one. Intro sentence two.",
+        "2. Methods We measured things. It worked.",
+    ]
+    assert sentence_chunks[1].page_start == 3
+
+def test_chat_stream(clean_db, sample_pdf, mock_gemini):
+    """Test that the streaming chat endpoint sends sources first, then tokens"""
+    import json
+
+    upload_and_wait(sample_pdf)
+
+    response = client.post("/api/chat/stream", json={"query": "What is this document about?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for frame in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+
+    assert events[0][0] == "sources"
+    assert "test.pdf" in events[0][1]["sources"][0]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["ttfb_ms"] is not None
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    answer = "".join(tokens).lower()
+    assert "test content" in answer or "sample document" in answer
+
+    stats = client.get("/api/chat/stream/stats").json()
+    assert stats["count"] >= 1
+    assert stats["ttfb_ms_p50"] is not None
+    assert "rag_chat_stream_ttfb_seconds_count " in client.get("/metrics").text
+
+    response = client.post("/api/chat/stream", json={"query": " "})
+    assert response.status_code == 400
+
+def test_answer_cache(clean_db, sample_pdf, mock_gemini):
+    """Test that repeated questions are answered from the cache until the document changes"""
+    from unittest.mock import patch
+    from app.api import chat
+
+    upload_and_wait(sample_pdf)
+    chat.answer_cache.reset_stats()
+    calls = []
+
+    def counting_generate(prompt):
+        calls.append(prompt)
+        return "Cached answer about test content."
+
+    with patch("app.api.chat.generate_answer", counting_generate):
+        first = client.post("/api/chat", json={"query": "What is this document about?"}).json()
+        second = client.post("/api/chat", json={"query": "What is this document about?"}).json()
+        assert second == first
+        assert len(calls) == 1
+
+        stats = client.get("/api/answer-cache").json()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["saved_seconds"] > 0
+
+        # Uploading a revision of the document behind the answer invalidates it
+        revised = TEST_DATA_DIR / "revised.pdf"
+        pdf = canvas.Canvas(str(revised), pagesize=letter)
+        pdf.drawString(100, 750, "This revised sample document replaces the test content.")
+        pdf.save()
+        upload_and_wait(revised)
+        client.post("/api/chat", json={"query": "What is this document about?"})
+        assert len(calls) == 2
+        assert client.get("/api/answer-cache").json()["invalidations"] == 1
+
+    # Near-duplicates hit, dissimilar questions and expired entries miss
+    cache = chat.answer_cache.__class__(max_entries=2, threshold=0.9, ttl=60)
+    cache.put([1.0, 0.0], "A", ["a.pdf (Page 1, Chunk 1)"], ["a.pdf"], cost=1.0, version=0)
+    assert cache.lookup([0.99, 0.05]).answer == "A"
+    assert cache.lookup([0.0, 1.0]) is None
+    cache.put([0.0, 1.0], "B", [], ["b.pdf"], cost=1.0, version=0)
+    cache.put([0.7, 0.7], "C", [], ["c.pdf"], cost=1.0, version=0)
+    # "A" was least recently used and is evicted
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.lookup([0.0, 1.0]).answer == "B"
+    cache.ttl = 0
+    assert cache.lookup([0.0, 1.0]) is None
+
+def test_hybrid_retrieval(clean_db):
+    """Test that exact identifiers missed by vector search are found by BM25 and fused"""
+    from app.api.keyword_index import KeywordIndex, keyword_index
+    from app.api.retrieval import reciprocal_rank_fusion, search
+
+    texts = [f"General maintenance notes, section {i}" for i in range(5)]
+    texts.append("Replace pump part XJ-9000 when pressure drops")
+    ids = [f"chunk-{i}" for i in range(len(texts))]
+    # The chunk with the identifier is the furthest from the query vector
+    embeddings = [[1.0, float(i)] + [0.0] * 766 for i in range(len(texts))]
+    query_embedding = embeddings[0]
+    clean_db.add(ids=ids, documents=texts, embeddings=embeddings,
+                 metadatas=[{"source": f"manual.pdf (Page 1, Chunk {i + 1})"} for i in range(len(texts))])
+    keyword_index.add_chunks(ids, texts)
+
+    dense = search(query_embedding, "Which part is XJ-9000?", n_results=3, mode="dense")
+    assert "chunk-5" not in dense["ids"][0]
+
+    hybrid = search(query_embedding, "Which part is XJ-9000?", n_results=3, mode="hybrid", candidates=3)
+    assert "chunk-5" in hybrid["ids"][0]
+    position = hybrid["ids"][0].index("chunk-5")
+    assert hybrid["documents"][0][position] == texts[5]
+    assert hybrid["metadatas"][0][position]["source"] == "manual.pdf (Page 1, Chunk 6)"
+
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "b"]]) == ["c", "b", "a"]
+
+    # Deleted chunks stop matching, including after postings are compacted
+    index = KeywordIndex()
+    index.add_chunks(ids, texts)
+    assert index.search("xj-9000")[0][0] == "chunk-5"
+    index.remove_chunks(["chunk-5"])
+    assert index.search("xj-9000") == []
+    index.remove_chunks(ids[:3])
+    assert [chunk_id for chunk_id, _ in index.search("maintenance")] == ["chunk-3", "chunk-4"]
+    index.add_chunks(["chunk-5"], ["pump XJ-9000 again"])
+    assert index.search("XJ-9000")[0][0] == "chunk-5"
+
+def test_rerank_and_pack_context():
+    """Test that re-ranking trades relevance for diversity and packing respects the budget"""
+    import numpy as np
+    from app.api.retrieval import pack_context, rerank
+
+    query = [1.0, 0.3, 0.0]
+    documents = ["first", "near duplicate of first", "different angle"]
+    embeddings = np.array([[1.0, 0.0, 0.0], [1.0, 0.02, 0.0], [0.8, 0.6, 0.0]])
+
+    assert rerank("q", query, documents, embeddings, method="cosine") == [1, 0, 2]
+    # The near duplicate of the best chunk drops behind a different one
+    assert rerank("q", query, documents, embeddings, method="mmr") == [1, 2, 0]
+    assert rerank("q", query, documents, embeddings, method="none") == [0, 1, 2]
+
+    # A custom scorer replaces cosine relevance
+    def reverse_scorer(question, texts):
+        return [len(texts) - i for i in range(len(texts))][::-1]
+
+    assert rerank("q", query, documents, embeddings, method="custom:scorer", scorer=reverse_scorer) == [2, 1, 0]
+
+    # ~100, ~300 and ~50 estimated tokens: the middle one does not fit
+    sized = ["x" * 400, "y" * 1200, "z" * 200]
+    assert pack_context([0, 1, 2], sized, token_budget=200) == [0, 2]
+    assert pack_context([1, 0, 2], sized, token_budget=200) == [1]
+    assert pack_context([0, 1, 2], sized, token_budget=10000, top_k=2) == [0, 1]
+
+    # Every candidate is ranked, so an oversized chunk among the best is
+    # replaced by a lower-ranked one rather than leaving the budget unused
+    many = ["a" * 400, "b" * 4000, "c" * 400, "d" * 400]
+    vectors = np.array([[1.0, 0.0, 0.0], [0.9, 0.1, 0.0], [0.8, 0.2, 0.0], [0.7, 0.3, 0.0]])
+    for method in ("cosine", "mmr"):
+        order = rerank("q", [1.0, 0.0, 0.0], many, vectors, method=method)
+        assert sorted(order) == [0, 1, 2, 3]
+        assert sorted(pack_context(order, many, token_budget=400, top_k=3)) == [0, 2, 3]
+
+def test_chat_batch(clean_db, sample_pdf, mock_gemini):
+    """Test that a batch is embedded and searched once and reports errors per item"""
+    from unittest.mock import MagicMock, patch
+    from app.api.pdf_upload import GeminiEmbeddingFunction
+    from app.api import retrieval
+
+    upload_and_wait(sample_pdf)
+    embed_mock, _ = mock_gemini
+    embed_calls = []
+    db = MagicMock(wraps=retrieval.db)
+
+    def recording_embed(texts, task_type):
+        embed_calls.append(list(texts))
+        return embed_mock(texts, task_type)
+
+    def generate(prompt):
+        if "broken" in prompt:
+            raise RuntimeError("generation failed")
+        return "This document contains test content for RAG testing."
+
+    with patch.object(GeminiEmbeddingFunction, "embed", new=staticmethod(recording_embed)), \
+            patch("app.api.retrieval.db", db), \
+            patch("app.api.chat.generate_answer", generate), \
+            patch("app.api.chat.answer_cache.max_entries", 0):
+        response = client.post("/api/chat/batch", json={"queries": [
+            "What is this document about?",
+            "",
+            "Is this broken?",
+            "What is this document about?",
+        ]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["query"] for r in results] == [
+        "What is this document about?", "", "Is this broken?", "What is this document about?"
+    ]
+    assert "test content" in results[0]["answer"]
+    assert "test.pdf" in results[0]["sources"][0]
+    assert results[3] == results[0]
+    assert results[1]["status"] == 400
+    assert results[2]["status"] == 500
+    assert "generation failed" in results[2]["error"]
+
+    # Two distinct questions, one embedding call and one vector search
+    assert embed_calls == [["What is this document about?", "Is this broken?"]]
+    assert db.query.call_count == 1
+    assert len(db.query.call_args.kwargs["query_embeddings"]) == 2
+
+    response = client.post("/api/chat/batch", json={"queries": []})
+    assert response.status_code == 400
+
+def test_gemini_client_is_shared(mock_gemini):
+    """Test that embedding and generation share one pooled client for the app's lifetime"""
+    from unittest.mock import patch
+    from app.api.gemini_client import GeminiClientProvider
+    from app.api import chat, embeddings
+
+    provider = GeminiClientProvider(max_connections=4, max_keepalive=2)
+    with patch("app.api.gemini_client.genai.Client") as client_class, \
+            patch.object(chat, "gemini", provider), \
+            patch.object(embeddings, "gemini", provider):
+        provider.start()
+        assert client_class.call_count == 1
+        http_options = client_class.call_args.kwargs["http_options"]
+        assert http_options.client_args["limits"].max_connections == 4
+        assert http_options.client_args["limits"].max_keepalive_connections == 2
+
+        chat.generate_answer("first")
+        chat.generate_answer("second")
+        assert embeddings.GeminiEmbeddingFunction().client is provider.get()
+        assert client_class.call_count == 1
+        assert client_class.return_value.models.generate_content.call_count == 2
+
+        provider.close()
+        client_class.return_value.close.assert_called_once()
+        # A new client is only created when used again
+        provider.get()
+        assert client_class.call_count == 2
+
+def test_metrics_endpoint(clean_db, sample_pdf, mock_gemini):
+    """Test that pipeline stages, counters and gauges are exported in Prometheus format"""
+    import time
+    from app.api import metrics
+
+    upload_and_wait(sample_pdf)
+    client.post("/api/chat", json={"query": "What is this document about?"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    for stage in ("validate", "spool", "extract", "chunk", "embed", "add"):
+        assert f'rag_stage_seconds_count{{pipeline="upload",stage="{stage}"}}' in text
+    for stage in ("embed", "query", "rerank", "generate"):
+        assert f'rag_stage_seconds_count{{pipeline="chat",stage="{stage}"}}' in text
+    assert 'rag_stage_seconds_bucket{pipeline="chat",stage="generate",le="+Inf"}' in text
+    assert 'rag_tokens_total{kind="prompt"}' in text
+    assert 'rag_chunks_total{operation="added"}' in text
+    assert "# TYPE rag_collection_chunks gauge" in text
+    assert "rag_jobs_in_flight 0" in text
+    assert 'rag_chat_requests_total{endpoint="chat",outcome="answered"}' in text
+
+    # Timing a stage costs microseconds, not milliseconds
+    start = time.perf_counter()
+    for _ in range(10000):
+        with metrics.timed("test", "overhead"):
+            pass
+    assert (time.perf_counter() - start) / 10000 < 50e-6
+
+def test_metrics_otel_spans():
+    """Test that timed stages become OpenTelemetry spans when enabled"""
+    from unittest.mock import patch
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from app.api import metrics
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+    before = metrics.stage_seconds.count("chat", "generate")
+    with patch.object(metrics, "_tracer", provider.get_tracer("test")):
+        with metrics.timed("chat", "generate"):
+            pass
+    assert [span.name for span in exporter.get_finished_spans()] == ["chat.generate"]
+    assert metrics.stage_seconds.count("chat", "generate") == before + 1
+
+def test_fake_gemini_server():
+    """Test that the benchmark Gemini stand-in serves the real client, including injected rate limits"""
+    from unittest.mock import patch
+    from google import genai
+    from google.genai.client import Client
+    from app.api.gemini_client import GeminiClientProvider
+    from app.api.embedding_dispatcher import EmbeddingDispatcher
+    sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+    from fake_gemini import FakeGemini
+
+    with FakeGemini(embed_latency=0, gen_latency=0, rpm=1) as fake, \
+            patch.object(genai, "Client", Client):
+        provider = GeminiClientProvider(base_url=fake.url)
+        models = provider.get().models
+
+        def embed(texts, task_type):
+            response = models.embed_content(
+                model="models/text-embedding-004", contents=texts, config={"task_type": task_type}
+            )
+            return [e.values for e in response.embeddings]
+
+        # The first request uses up the rate limit, the retry is answered 429 again
+        assert len(embed(["warm up"], "retrieval_document")[0]) == 768
+        dispatcher = EmbeddingDispatcher(max_retries=1, retry_delay=0.01)
+        with pytest.raises(Exception) as error:
+            dispatcher.embed(["rate limited"], "retrieval_document", embed)
+        assert error.value.code == 429
+
+        fake.rpm = 0
+        vectors = dispatcher.embed(["same", "other", "same"], "retrieval_document", embed)
+        assert vectors[0] == vectors[2] != vectors[1]
+        assert "stand-in" in models.generate_content(model="gemini-2.0-flash", contents="hi").text
+        assert fake.stats()["rate_limited"] == 2
+        provider.close()
+
+def test_upload_limit_from_app_state(clean_db, sample_pdf):
+    """Test that the upload size limit comes from app.state and partial spool files are removed"""
+    from app.api import jobs
+    spooled = set(os.listdir(jobs.JOB_SPOOL_DIR)) if os.path.isdir(jobs.JOB_SPOOL_DIR) else set()
+    limit = app.state.max_upload_size
+    app.state.max_upload_size = 1024
+    try:
+        with open(sample_pdf, "rb") as pdf:
+            response = client.post("/api/upload", files={"file": ("big.pdf", pdf, "application/pdf")})
+    finally:
+        app.state.max_upload_size = limit
+    assert response.status_code == 413
+    assert "0MB" in response.json()["detail"]
+    assert set(os.listdir(jobs.JOB_SPOOL_DIR)) == spooled
+
+def test_upload_peak_memory(tmp_path):
+    """Test that an upload is streamed to its spool file instead of being held in memory"""
+    import gc
+    import itertools
+    import threading
+    import tracemalloc
+    from unittest.mock import MagicMock, patch
+    from fastapi import HTTPException
+    from starlette.requests import Request
+    from pypdf import PdfWriter
+    from app.api import pdf_upload
+
+    # A one-page PDF carrying a 32MB incompressible attachment
+    size = 32 * 1024 * 1024
+    writer = PdfWriter()
+    writer.add_blank_page(612, 792)
+    writer.add_attachment("payload.bin", os.urandom(size))
+    pdf_path = tmp_path / "large.pdf"
+    with open(pdf_path, "wb") as pdf:
+        writer.write(pdf)
+
+    def rss():
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    peak = [0]
+    stop = threading.Event()
+    def sample():
+        while not stop.wait(0.002):
+            peak[0] = max(peak[0], rss())
+
+    # Send the PDF as a multipart body, in the chunks a server would receive
+    boundary = "benchmarkboundary"
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="large.pdf"\r\n'
+            'Content-Type: application/pdf\r\n\r\n').encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    body_size = len(head) + os.path.getsize(pdf_path) + len(tail)
+
+    def make_request(pdf):
+        parts = itertools.chain([head], iter(lambda: pdf.read(64 * 1024), b""), [tail])
+
+        async def receive():
+            part = next(parts, None)
+            return {"type": "http.request", "body": part or b"", "more_body": part is not None}
+
+        app_ = MagicMock()
+        app_.state.max_upload_size = 64 * 1024 * 1024
+        return Request({
+            "type": "http", "method": "POST", "path": "/api/upload", "app": app_,
+            "headers": [
+                (b"content-type", f"multipart/form-data; boundary={boundary}".encode()),
+                (b"content-length", str(body_size).encode()),
+            ],
+        }, receive)
+
+    with open(pdf_path, "rb") as pdf, patch.object(pdf_upload.ingestion_queue, "submit") as submit:
+        request = make_request(pdf)
+        gc.collect()
+        baseline = peak[0] = rss()
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        tracemalloc.start()
+        try:
+            result = asyncio.run(pdf_upload.upload_pdf(request))
+            _, traced_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            stop.set()
+            sampler.join()
+
+    assert result["pages_processed"] == 1
+    submit.assert_called_once_with(result["job_id"])
+    job = pdf_upload.job_store.get(result["job_id"])
+    assert os.path.getsize(job["file_path"]) == os.path.getsize(pdf_path)
+    os.remove(job["file_path"])
+    pdf_upload.job_store.cancel(result["job_id"])
+    # Buffering the upload would cost at least one full copy (32MB) of it
+    assert traced_peak < 4 * 1024 * 1024
+    assert peak[0] - baseline < size / 2
+
+    # Uploads announcing a size over the limit are refused without being read
+    with open(pdf_path, "rb") as pdf:
+        request = make_request(pdf)
+        request.app.state.max_upload_size = 1024 * 1024
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(pdf_upload.upload_pdf(request))
+        assert error.value.status_code == 413
+        assert pdf.tell() == 0
+
+def test_job_progress_events():
+    """Test that job progress is pushed as server-sent events until the job finishes"""
+    import threading
+    from app.api.jobs import job_store
+    from app.api.embedding_status import init_embedding_status, update_embedding_status
+
+    job_id = init_embedding_status("events.pdf")
+
+    def ingest():
+        time.sleep(0.2)
+        for progress in (20, 50, 80):
+            update_embedding_status(job_id, 'processing', progress)
+            time.sleep(0.05)
+        update_embedding_status(job_id, 'complete', 100, chunks_processed=3)
+
+    worker = threading.Thread(target=ingest)
+    worker.start()
+    with client.stream("GET", f"/api/jobs/{job_id}/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+    worker.join()
+
+    progress = [event["progress"] for event in events]
+    assert events[0]["status"] == "pending" and progress[0] == 0
+    assert events[-1]["status"] == "complete" and events[-1]["chunks_processed"] == 3
+    assert progress == sorted(progress) and len(progress) >= 3
+    assert all("file_path" not in event for event in events)
+    assert job_store.events.subscriber_count() == 0
+
+    # A finished job's stream ends after its final state
+    with client.stream("GET", "/api/embedding-status/events.pdf/events") as response:
+        lines = [line for line in response.iter_lines() if line.startswith("data: ")]
+    assert len(lines) == 1 and json.loads(lines[0][len("data: "):])["status"] == "complete"
+    assert client.get("/api/jobs/unknown/events").status_code == 404
+
+def test_job_sweep():
+    """Test that the sweeper drops finished jobs past retention and keeps active ones"""
+    from app.api.jobs import JobStore
+    store = JobStore(":memory:")
+    finished = store.create("finished.pdf")
+    store.update(finished, status="complete", progress=100)
+    active = store.create("active.pdf")
+
+    assert store.sweep(retention=3600) == 0
+    assert store.get(finished)["status"] == "complete"
+    assert store.sweep(retention=-1) == 1
+    assert store.get(finished) is None
+    assert store.get(active)["status"] == "pending"
+
+def test_job_store_persists_on_disk(tmp_path):
+    """Test that an on-disk job store keeps unfinished jobs for the next process"""
+    from app.api.jobs import JobStore
+    path = tmp_path / "data" / "jobs.sqlite3"
+    job_id = JobStore(str(path)).create("resume.pdf")
+
+    reopened = JobStore(str(path))
+    assert [job["id"] for job in reopened.active_jobs()] == [job_id]
+
+@pytest.mark.parametrize("backend", ["sqlite", "redis"])
+def test_job_store_backends(backend, tmp_path):
+    """Test that job store backends share state between workers, with atomic claims and expiry"""
+    from app.api import jobs
+    if backend == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        first, second = (jobs.RedisJobStore(fakeredis.FakeRedis(server=server), retention=60) for _ in range(2))
+    else:
+        first, second = (jobs.JobStore(str(tmp_path / "jobs.sqlite3"), retention=60) for _ in range(2))
+
+    # A job created by one worker is visible to the other
+    job_id = first.create("shared.pdf", owner="first")
+    second.update(job_id, status="processing", progress=40)
+    job = first.get(job_id)
+    assert (job["status"], job["progress"], job["pages_processed"]) == ("processing", 40, None)
+    assert first.latest_for_filename("shared.pdf")["id"] == job_id
+    assert [job["id"] for job in second.active_jobs()] == [job_id]
+
+    # Only one worker holds a job, until its lease lapses
+    assert not second.claim(job_id, "second", 30)
+    assert first.renew("first", -1) == 1
+    assert second.claim(job_id, "second", 30)
+    assert not first.claim(job_id, "first", 30)
+
+    # Updates racing a cancellation never bring the job back
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        updates = executor.submit(lambda: [second.update(job_id, status="processing", progress=p) for p in range(100)])
+        assert first.cancel(job_id)
+        updates.result()
+    assert second.get(job_id)["status"] == "cancelled"
+    assert second.count_active() == 0 and not second.claim(job_id, "second", 30)
+
+    # Finished jobs expire after the retention period
+    if backend == "redis":
+        assert 0 < first._redis.ttl(first._job_key(job_id)) <= 60
+    else:
+        assert first.sweep(retention=-1) == 1
+        assert second.get(job_id) is None
+
+def test_job_queue_recovers_jobs_from_stopped_worker(tmp_path):
+    """Test that jobs left by a stopped worker are taken over and their progress reaches every worker"""
+    from unittest.mock import patch
+    from app.api import jobs
+    path = str(tmp_path / "jobs.sqlite3")
+    stopped, live = jobs.JobStore(path), jobs.JobStore(path)
+    orphan = stopped.create("orphan.pdf", owner="stopped", lease=-1)
+    held = stopped.create("held.pdf", owner="stopped")
+
+    release = threading.Event()
+    def handler(job):
+        release.wait(5)
+        for progress in (30, 60):
+            live.update(job["id"], progress=progress)
+            time.sleep(0.05)
+        live.update(job["id"], status="complete", progress=100)
+
+    job_queue = jobs.JobQueue(live, handler, workers=1, worker_id="live")
+    assert job_queue.recover() == 1
+    job_queue.start()
+
+    # The stopped worker's process serves the progress stream and only sees
+    # the other worker's updates through the shared store
+    with patch.object(jobs, "job_store", stopped):
+        release.set()
+        with client.stream("GET", f"/api/jobs/{orphan}/events") as response:
+            events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+    job_queue._queue.join()
+
+    assert events[-1]["status"] == "complete" and "owner" not in events[-1]
+    assert stopped.get(orphan)["owner"] == "live"
+    assert stopped.get(held)["status"] == "pending" and stopped.get(held)["owner"] == "stopped"
+
+def test_document_index_default_path():
+    """Test that the document index is only kept in memory alongside an in-memory vector store"""
+    from app.api.document_index import default_index_path
+    from app.api.vector_store import CHROMA_PERSIST_DIR, DATA_DIR
+    assert default_index_path("memory") == ":memory:"
+    assert default_index_path("persistent") == os.path.join(CHROMA_PERSIST_DIR, "documents.sqlite3")
+    assert default_index_path("http") == os.path.join(DATA_DIR, "documents.sqlite3")
+
+def test_chat_stream_slot_released_on_early_disconnect():
+    """Test that a stream abandoned before its body starts still frees its pending slot"""
+    from unittest.mock import MagicMock
+    from starlette.requests import ClientDisconnect
+    from app.api import chat
+
+    before = chat._pending_requests
+    response = asyncio.run(chat.chat_stream(chat.Query(query="Hello?"), MagicMock()))
+    assert chat._pending_requests == before + 1
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # The client is gone before the response headers can be written
+        raise OSError("connection reset")
+
+    with pytest.raises((OSError, ClientDisconnect)):
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
+    assert chat._pending_requests == before
+
+def test_keyword_index_background_rebuild(clean_db, mock_gemini):
+    """Test that hybrid search uses vectors alone until the keyword index has been rebuilt"""
+    from unittest.mock import patch
+    from app.api import keyword_index as keyword_module
+    from app.api import retrieval
+    from app.api.keyword_index import keyword_index
+
+    embeddings = [[1.0] + [0.0] * 767, [0.0, 1.0] + [0.0] * 766]
+    clean_db.add(ids=["kw-a", "kw-b"], documents=["zebra crossing rules", "apple orchard"], embeddings=embeddings,
+                 metadatas=[{"source": "a.pdf (Page 1, Chunk 1)"}, {"source": "b.pdf (Page 1, Chunk 1)"}])
+
+    started = threading.Event()
+    release = threading.Event()
+    get = clean_db.get
+    def slow_get(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return get(*args, **kwargs)
+
+    with patch.object(keyword_module, "db") as db:
+        db.count.return_value = 2
+        db.get.side_effect = slow_get
+        keyword_module.start_rebuild()
+        assert started.wait(5)
+        assert not keyword_index.ready.is_set()
+        # A chunk deleted mid-rebuild must not be resurrected by it
+        keyword_index.remove_chunks(["kw-a"])
+        with patch.object(keyword_index, "search", side_effect=AssertionError("index not ready")):
+            result = retrieval.search(embeddings[1], "zebra", n_results=2, reranker="none")
+        assert result["ids"][0][0] == "kw-b"
+        release.set()
+        assert keyword_index.ready.wait(5)
+
+    assert [chunk_id for chunk_id, _ in keyword_index.search("apple zebra")] == ["kw-b"]
+
+def test_bulk_index(clean_db, mock_gemini, tmp_path):
+    """Test that the bulk indexer ingests a directory of PDFs and resumes from its manifest"""
+    import json
+    from app.api.document_index import StoreInUse, document_index, lock_store
+    from app.api.jobs import job_store
+    from app.bulk_index import MANIFEST_NAME, bulk_index
+
+    def write_pdf(path, pages):
+        pdf = canvas.Canvas(str(path), pagesize=letter)
+        for page in range(1, pages + 1):
+            pdf.drawString(100, 750, f"{path.stem} page {page} covers topic {page}.")
+            pdf.showPage()
+        pdf.save()
+
+    (tmp_path / "reports").mkdir()
+    write_pdf(tmp_path / "guide.pdf", 3)
+    write_pdf(tmp_path / "reports" / "annual.pdf", 2)
+    (tmp_path / "notes.txt").write_text("not a PDF")
+    (tmp_path / "broken.pdf").write_bytes(b"not a PDF either")
+
+    stats = bulk_index(tmp_path, workers=2, ingests=2)
+    assert (stats.files, stats.chunks, stats.failed, stats.skipped) == (2, 5, 1, 0)
+    assert stats.files_per_second > 0 and stats.chunks_per_second > 0
+    assert document_index.document("guide.pdf")["status"] == "ready"
+    assert document_index.document("annual.pdf")["chunk_count"] == 2
+    assert job_store.latest_for_filename("annual.pdf")["status"] == "complete"
+    assert job_store.latest_for_filename("broken.pdf")["status"] == "error"
+
+    manifest = [json.loads(line) for line in (tmp_path / MANIFEST_NAME).read_text().splitlines()]
+    assert {entry["path"]: entry["status"] for entry in manifest} == {
+        "guide.pdf": "done", "reports/annual.pdf": "done", "broken.pdf": "error"
+    }
+
+    # A second run only retries the failure; a rewritten file is indexed again
+    write_pdf(tmp_path / "guide.pdf", 4)
+    stats = bulk_index(tmp_path, workers=1)
+    assert (stats.files, stats.skipped, stats.failed) == (1, 1, 1)
+    assert (stats.chunks, stats.embedded) == (4, 1)
+
+    # Server workers share the store lock; the indexer needs it to itself
+    lock_path = str(tmp_path / "store.lock")
+    workers = [lock_store(exclusive=False, path=lock_path) for _ in range(2)]
+    with pytest.raises(StoreInUse):
+        lock_store(exclusive=True, path=lock_path)
+    for worker in workers:
+        worker.close()
+    indexer = lock_store(exclusive=True, path=lock_path)
+    with pytest.raises(StoreInUse):
+        lock_store(exclusive=False, path=lock_path)
+    indexer.close()
+    assert lock_store(exclusive=True, path=None) is None
+
+def test_snapshot_export_and_load(clean_db, sample_pdf, mock_gemini, tmp_path):
+    """Test that a snapshot restores chunks, vectors and the catalog without embedding calls"""
+    from unittest.mock import patch
+    from app.api import snapshots
+    from app.api.document_index import document_index
+    from app.api.keyword_index import keyword_index
+    from app.api.pdf_upload import GeminiEmbeddingFunction
+
+    upload_and_wait(sample_pdf)
+    stored = clean_db.get(include=["embeddings", "documents", "metadatas"])
+    catalog_entry = document_index.document("test.pdf")
+
+    with patch.object(snapshots, "SNAPSHOT_DIR", str(tmp_path)):
+        response = client.post("/api/admin/snapshots", json={"name": "base"})
+        assert response.status_code == 201
+        assert response.json()["chunks"] == len(stored["ids"])
+        assert response.json()["documents"] == 1
+        assert client.post("/api/admin/snapshots", json={"name": "base"}).status_code == 409
+        assert client.post("/api/admin/snapshots", json={"name": "../base"}).status_code == 400
+        assert [s["name"] for s in client.get("/api/admin/snapshots").json()["snapshots"]] == ["base"]
+
+        # Only an empty collection can be loaded into
+        assert client.post("/api/admin/snapshots/base/load").status_code == 409
+        assert client.post("/api/admin/snapshots/missing/load").status_code == 404
+
+        clean_db.delete(ids=stored["ids"])
+        document_index.clear()
+        keyword_index.clear()
+        with patch.object(GeminiEmbeddingFunction, "_embed_content", side_effect=AssertionError("embedded")):
+            response = client.post("/api/admin/snapshots/base/load")
+        assert response.status_code == 200
+        assert response.json()["chunks"] == len(stored["ids"])
+
+    loaded = clean_db.get(ids=stored["ids"], include=["embeddings", "documents", "metadatas"])
+    order = [loaded["ids"].index(chunk_id) for chunk_id in stored["ids"]]
+    assert [loaded["documents"][i] for i in order] == stored["documents"]
+    assert [loaded["metadatas"][i] for i in order] == stored["metadatas"]
+    assert [loaded["embeddings"][i] for i in order] == stored["embeddings"]
+    assert sorted(document_index.chunk_ids("test.pdf")) == sorted(stored["ids"])
+    assert document_index.document("test.pdf") == {**catalog_entry, "job_id": None}
+    assert len(keyword_index) == len(stored["ids"])
+
+    # The restored fingerprint makes an identical re-upload a no-op
+    assert upload_and_wait(sample_pdf)["message"] == "Document unchanged"
+
+def test_rebuild_records_chunks_without_a_document(clean_db):
+    """Test that chunks naming no document do not set off a rebuild at every start"""
+    from unittest.mock import patch
+    from app.api.document_index import document_index, rebuild_document_index
+
+    clean_db.add(
+        ids=["orphan", "legacy-1"],
+        embeddings=[[0.1] * 768, [0.2] * 768],
+        documents=["No source", "Legacy chunk"],
+        metadatas=[{"source": "unknown"}, {"source": "legacy.pdf (Page 1, Chunk 1)"}]
+    )
+    rebuild_document_index()
+    assert document_index.chunk_ids("legacy.pdf") == ["legacy-1"]
+    assert document_index.skipped_count() == 1
+
+    with patch.object(document_index, "clear", side_effect=AssertionError("rebuilt again")):
+        rebuild_document_index()
+
+def test_snapshot_load_rolls_back_on_failure(clean_db, sample_pdf, mock_gemini, tmp_path):
+    """Test that a snapshot failing to load partway leaves the collection empty for a retry"""
+    from app.api import snapshots
+    from app.api.document_index import document_index
+    from app.api.keyword_index import keyword_index
+
+    upload_and_wait(sample_pdf)
+    stored = clean_db.get()["ids"]
+    path = str(tmp_path / "base")
+    snapshots.export_snapshot(path)
+
+    clean_db.delete(ids=stored)
+    document_index.clear()
+    keyword_index.clear()
+
+    # The catalog, read after every chunk has been added, was cut short
+    catalog = tmp_path / "base" / snapshots.CATALOG_FILE
+    complete = catalog.read_bytes()
+    catalog.write_bytes(complete[:len(complete) // 2])
+    with pytest.raises(ValueError):
+        snapshots.load_snapshot(path)
+    assert clean_db.count() == 0
+    assert document_index.count() == 0
+    assert document_index.document("test.pdf") is None
+    assert len(keyword_index) == 0
+
+    catalog.write_bytes(complete)
+    snapshots.load_snapshot(path)
+    assert sorted(clean_db.get()["ids"]) == sorted(stored)
+    assert document_index.document("test.pdf")["chunk_count"] == len(stored)
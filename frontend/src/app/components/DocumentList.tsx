@@ -4,14 +4,19 @@ interface Document {
   name: string;
   size: number;
   uploadedAt: string;
+  status?: string;
+  pages?: number;
+  chunks?: number;
 }
 
 interface DocumentListProps {
   documents: Document[];
   onDelete?: (document: Document) => Promise<void>;
+  hasMore?: boolean;
+  onLoadMore?: () => void;
 }
 
-export default function DocumentList({ documents, onDelete }: DocumentListProps) {
+export default function DocumentList({ documents, onDelete, hasMore, onLoadMore }: DocumentListProps) {
   const formatFileSize = (bytes: number) => {
     if (bytes === 0) return '0 Bytes';
     const k = 1024;
@@ -20,6 +25,14 @@ export default function DocumentList({ documents, onDelete }: DocumentListProps)
     return `${parseFloat((bytes / Math.pow(k, i)).toFixed(2))} ${sizes[i]}`;
   };
 
+  const describe = (doc: Document) => {
+    const parts = [formatFileSize(doc.size)];
+    if (doc.pages) parts.push(`${doc.pages} page${doc.pages === 1 ? '' : 's'}`);
+    if (doc.chunks) parts.push(`${doc.chunks} chunk${doc.chunks === 1 ? '' : 's'}`);
+    parts.push(new Date(doc.uploadedAt).toLocaleString());
+    return parts.join(' • ');
+  };
+
   if (!documents.length) return null;
 
   return (
@@ -28,9 +41,9 @@ export default function DocumentList({ documents, onDelete }: DocumentListProps)
         Your Documents
       </h3>
       <div className="space-y-2">
-        {documents.map((doc, index) => (
+        {documents.map((doc) => (
           <div
-            key={index}
+            key={doc.name}
             className="group bg-gray-50 dark:bg-gray-700/50 rounded-lg p-3 hover:bg-gray-100 dark:hover:bg-gray-700 transition-colors"
           >
             <div className="flex items-start justify-between">
@@ -53,8 +66,13 @@ export default function DocumentList({ documents, onDelete }: DocumentListProps)
                     {doc.name}
                   </p>
                   <p className="text-xs text-gray-500 dark:text-gray-400 mt-1">
-                    {formatFileSize(doc.size)} • {doc.uploadedAt}
+                    {describe(doc)}
                   </p>
+                  {doc.status && doc.status !== 'ready' && (
+                    <p className={`text-xs mt-1 ${doc.status === 'error' ? 'text-red-500' : 'text-blue-500'}`}>
+                      {doc.status}
+                    </p>
+                  )}
                 </div>
               </div>
               
@@ -80,6 +98,14 @@ export default function DocumentList({ documents, onDelete }: DocumentListProps)
           </div>
         ))}
       </div>
+      {hasMore && (
+        <button
+          onClick={onLoadMore}
+          className="mt-3 w-full text-sm text-blue-500 hover:text-blue-700 py-2 rounded-lg hover:bg-gray-50 dark:hover:bg-gray-700/50 transition-colors"
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 } 
\ No newline at end of file
@@ -7,7 +7,7 @@ interface FileUploadProps {
 }
 
 interface EmbeddingStatus {
-  status: 'pending' | 'processing' | 'complete' | 'error';
+  status: 'pending' | 'processing' | 'complete' | 'error' | 'cancelled';
   progress: number;
   fileName: string;
 }
@@ -19,18 +19,14 @@ export default function FileUpload({ onUploadSuccess }: FileUploadProps) {
   const [uploadProgress, setUploadProgress] = useState<{ [key: string]: number }>({});
   const [embeddingStatus, setEmbeddingStatus] = useState<EmbeddingStatus[]>([]);
   const fileInputRef = useRef<HTMLInputElement>(null);
-  const pollTimeoutRef = useRef<NodeJS.Timeout>();
-  const abortControllerRef = useRef<AbortController>();
+  const eventSourcesRef = useRef<Map<string, EventSource>>(new Map());
 
   // Cleanup function for unmounting
   useEffect(() => {
+    const eventSources = eventSourcesRef.current;
     return () => {
-      if (pollTimeoutRef.current) {
-        clearTimeout(pollTimeoutRef.current);
-      }
-      if (abortControllerRef.current) {
-        abortControllerRef.current.abort();
-      }
+      eventSources.forEach(events => events.close());
+      eventSources.clear();
     };
   }, []);
 
@@ -63,116 +59,44 @@ export default function FileUpload({ onUploadSuccess }: FileUploadProps) {
     fileInputRef.current?.click();
   };
 
-  const checkEmbeddingStatus = async (fileName: string) => {
-    try {
-      // Create new AbortController for this request
-      abortControllerRef.current?.abort(); // Abort any existing request
-      abortControllerRef.current = new AbortController();
+  const monitorEmbeddingProgress = (fileName: string, jobId: string) => {
+    // The server pushes a `progress` event whenever the ingestion job changes
+    eventSourcesRef.current.get(fileName)?.close();
+    const events = new EventSource(`/api/jobs/${encodeURIComponent(jobId)}/events`);
+    eventSourcesRef.current.set(fileName, events);
 
-      const response = await fetch(
-        `/api/embedding-status/${encodeURIComponent(fileName)}`,
-        { signal: abortControllerRef.current.signal }
-      );
-      
-      if (!response.ok) {
-        throw new Error('Failed to check embedding status');
+    const stop = () => {
+      events.close();
+      if (eventSourcesRef.current.get(fileName) === events) {
+        eventSourcesRef.current.delete(fileName);
       }
-      
-      const data = await response.json();
-      console.log('Embedding status response:', { fileName, data });
-      return data;
-    } catch (error) {
-      if (error instanceof Error && error.name === 'AbortError') {
-        console.log('Status check aborted');
-        return null;
-      }
-      console.error('Error checking embedding status:', error);
-      return null;
-    }
-  };
-
-  const monitorEmbeddingProgress = async (fileName: string) => {
-    console.log('Starting embedding progress monitoring for:', fileName);
-    
-    // Clear any existing timeout
-    if (pollTimeoutRef.current) {
-      clearTimeout(pollTimeoutRef.current);
-    }
-
-    setEmbeddingStatus(prev => {
-      console.log('Current embedding status:', prev);
-      return [...prev, { 
-        status: 'pending', 
-        progress: 0, 
-        fileName 
-      }];
-    });
-
-    let attempts = 0;
-    const maxAttempts = 60; // 5 minutes maximum (with 5-second intervals)
-
-    const checkStatus = async () => {
-      const status = await checkEmbeddingStatus(fileName);
-      console.log('Status check result:', { fileName, status, attempts });
-      
-      if (status) {
-        setEmbeddingStatus(prev => {
-          const newStatus = prev.map(s => 
-            s.fileName === fileName 
-              ? { 
-                  ...s, 
-                  status: status.status,
-                  progress: status.progress || s.progress 
-                }
-              : s
-          );
-          console.log('Updating embedding status:', newStatus);
-          return newStatus;
-        });
+    };
 
-        if (status.status === 'complete' || status.status === 'error') {
-          return true;
-        }
+    events.addEventListener('progress', (event) => {
+      const job = JSON.parse((event as MessageEvent).data);
+      setEmbeddingStatus(prev => prev.map(s =>
+        s.fileName === fileName
+          ? { ...s, status: job.status, progress: job.progress || s.progress }
+          : s
+      ));
+      if (job.status === 'complete' || job.status === 'error' || job.status === 'cancelled') {
+        // Close before the browser tries to reconnect to the finished stream
+        stop();
       }
+    });
 
-      attempts++;
-      if (attempts >= maxAttempts) {
-        setEmbeddingStatus(prev => prev.map(s => 
-          s.fileName === fileName 
-            ? { ...s, status: 'error' }
-            : s
+    events.onerror = () => {
+      // EventSource retries on its own; give up once it has stopped trying
+      if (events.readyState === EventSource.CLOSED) {
+        setEmbeddingStatus(prev => prev.map(s =>
+          s.fileName === fileName ? { ...s, status: 'error' } : s
         ));
-        return true;
-      }
-
-      return false;
-    };
-
-    const poll = async () => {
-      try {
-        const finished = await checkStatus();
-        if (!finished) {
-          // Store the timeout reference so we can clean it up if needed
-          pollTimeoutRef.current = setTimeout(poll, 5000);
-        } else {
-          console.log('Finished monitoring embedding progress for:', fileName);
-          pollTimeoutRef.current = undefined;
-        }
-      } catch (error) {
-        console.error('Error in polling:', error);
-        pollTimeoutRef.current = undefined;
+        stop();
       }
     };
-
-    await poll();
   };
 
   const uploadFiles = async (filesToUpload: File[]) => {
-    // Abort any ongoing status checks
-    if (abortControllerRef.current) {
-      abortControllerRef.current.abort();
-    }
-    
     setUploadStatus('uploading');
     setErrorMessage('');
     setUploadProgress({});
@@ -213,7 +137,8 @@ export default function FileUpload({ onUploadSuccess }: FileUploadProps) {
             if (xhr.status >= 200 && xhr.status < 300) {
               try {
                 const response = JSON.parse(xhr.responseText);
-                console.log('Upload success, starting embedding:', file.name);
+                // The server accepts the file (202) and ingests it in a background job
+                console.log('Upload accepted, starting embedding:', file.name, response.job_id);
                 // Update embedding status to processing
                 setEmbeddingStatus(prev => 
                   prev.map(s => s.fileName === file.name 
@@ -221,8 +146,8 @@ export default function FileUpload({ onUploadSuccess }: FileUploadProps) {
                     : s
                   )
                 );
-                // Start monitoring embedding progress
-                monitorEmbeddingProgress(file.name).catch(console.error);
+                // Follow embedding progress as the server pushes it
+                monitorEmbeddingProgress(file.name, response.job_id);
                 resolve(response);
               } catch (error) {
                 reject(new Error('Invalid response format'));
@@ -291,6 +216,7 @@ export default function FileUpload({ onUploadSuccess }: FileUploadProps) {
       case 'complete':
         return 'bg-green-500';
       case 'error':
+      case 'cancelled':
         return 'bg-red-500';
       default:
         return 'bg-gray-300';
@@ -307,6 +233,8 @@ export default function FileUpload({ onUploadSuccess }: FileUploadProps) {
         return 'Complete';
       case 'error':
         return 'Error';
+      case 'cancelled':
+        return 'Cancelled';
       default:
         return 'Unknown';
     }
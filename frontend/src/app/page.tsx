@@ -1,6 +1,6 @@
 'use client';
 
-import { useState } from 'react';
+import { useCallback, useEffect, useState } from 'react';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import FileUpload from './components/FileUpload';
@@ -11,8 +11,31 @@ interface Document {
   name: string;
   size: number;
   uploadedAt: string;
+  status?: string;
+  pages?: number;
+  chunks?: number;
 }
 
+interface CatalogEntry {
+  filename: string;
+  status: string;
+  pages: number;
+  chunks: number;
+  bytes: number;
+  updated_at: number;
+}
+
+const PAGE_SIZE = 50;
+
+const fromCatalog = (entry: CatalogEntry): Document => ({
+  name: entry.filename,
+  size: entry.bytes,
+  uploadedAt: new Date(entry.updated_at * 1000).toISOString(),
+  status: entry.status,
+  pages: entry.pages,
+  chunks: entry.chunks,
+});
+
 interface Message {
   type: 'user' | 'assistant';
   content: string;
@@ -22,11 +45,41 @@ interface Message {
 
 export default function Home() {
   const [documents, setDocuments] = useState<Document[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [messages, setMessages] = useState<Message[]>([]);
   const [isLoading, setIsLoading] = useState(false);
 
+  // Load the document catalog a page at a time; without a cursor the list starts over
+  const loadDocuments = useCallback(async (cursor?: string) => {
+    try {
+      const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`/api/documents?${params}`);
+      if (!response.ok) {
+        throw new Error(`Failed to list documents (${response.status})`);
+      }
+
+      const page = await response.json();
+      const loaded = page.documents.map(fromCatalog);
+      setDocuments(prev => {
+        if (!cursor) return loaded;
+        const names = new Set(loaded.map((doc: Document) => doc.name));
+        return [...prev.filter(doc => !names.has(doc.name)), ...loaded];
+      });
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error listing documents:', error);
+    }
+  }, []);
+
+  useEffect(() => {
+    loadDocuments();
+  }, [loadDocuments]);
+
   const handleUploadSuccess = (uploadedFiles: Document[]) => {
-    setDocuments(prev => [...prev, ...uploadedFiles]);
+    // A re-upload replaces its document rather than listing it twice
+    const names = new Set(uploadedFiles.map(doc => doc.name));
+    setDocuments(prev => [...prev.filter(doc => !names.has(doc.name)), ...uploadedFiles]);
   };
 
   const handleAskQuestion = async (question: string) => {
@@ -39,8 +92,21 @@ export default function Home() {
     };
     setMessages(prev => [...prev, userMessage]);
     
+    // Add an empty assistant message and fill it in as the answer streams
+    const assistantMessage: Message = {
+      type: 'assistant',
+      content: '',
+      sources: [],
+      timestamp: new Date().toISOString()
+    };
+    setMessages(prev => [...prev, assistantMessage]);
+
+    const updateAnswer = (update: (message: Message) => Message) => {
+      setMessages(prev => [...prev.slice(0, -1), update(prev[prev.length - 1])]);
+    };
+
     try {
-      const response = await fetch('/api/chat/', {
+      const response = await fetch('/api/chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -50,31 +116,56 @@ export default function Home() {
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         const errorData = await response.json().catch(() => ({}));
         throw new Error(errorData.detail || `Failed to get answer (${response.status})`);
       }
 
-      const data = await response.json();
-      
-      const assistantMessage: Message = {
-        type: 'assistant',
-        content: data.answer || 'No answer was generated.',
-        sources: data.sources?.map((source: string) => ({
-          text: '',
-          document: source
-        })) || [],
-        timestamp: new Date().toISOString()
-      };
-      setMessages(prev => [...prev, assistantMessage]);
+      // Read server-sent events: sources, then answer tokens, then done or error
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop() || '';
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || '{}');
+
+          if (event === 'sources') {
+            updateAnswer(message => ({
+              ...message,
+              sources: data.sources.map((source: string) => ({
+                text: '',
+                document: source
+              }))
+            }));
+          } else if (event === 'token') {
+            updateAnswer(message => ({ ...message, content: message.content + data.text }));
+          } else if (event === 'error') {
+            throw new Error(data.detail || 'Failed to get answer');
+          } else if (event === 'done') {
+            finished = true;
+          }
+        }
+      }
+
+      updateAnswer(message => ({
+        ...message,
+        content: message.content || 'No answer was generated.'
+      }));
     } catch (error) {
       console.error('Error asking question:', error);
-      const errorMessage: Message = {
-        type: 'assistant',
-        content: 'Sorry, there was an error processing your question. Please try again.',
-        timestamp: new Date().toISOString()
-      };
-      setMessages(prev => [...prev, errorMessage]);
+      updateAnswer(message => ({
+        ...message,
+        content: 'Sorry, there was an error processing your question. Please try again.'
+      }));
     } finally {
       setIsLoading(false);
     }
@@ -91,7 +182,7 @@ export default function Home() {
         throw new Error(errorData.detail || 'Failed to delete document');
       }
 
-      setDocuments(documents.filter((d) => d.name !== doc.name));
+      setDocuments(prev => prev.filter((d) => d.name !== doc.name));
     } catch (error) {
       console.error('Error deleting document:', error);
     }
@@ -128,6 +219,8 @@ export default function Home() {
               <DocumentList
                 documents={documents}
                 onDelete={handleDeleteDocument}
+                hasMore={nextCursor !== null}
+                onLoadMore={() => nextCursor && loadDocuments(nextCursor)}
               />
             </div>
           )}